@@ -1,5 +1,19 @@
 from django.contrib import admin
-from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera
+from django.db import transaction
+from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera, Job
+from .pagination import ConteoEstimadoPaginator
+from . import contadores
+from . import historial
+from . import resumenes
+from . import tareas
+
+
+class HistorialEstadoAdminMixin:
+    """Atribuye los cambios de estado hechos desde el admin al usuario (ver api/historial.py)"""
+    
+    def save_model(self, request, obj, form, change):
+        with historial.usuario_actual(request.user):
+            super().save_model(request, obj, form, change)
 
 
 @admin.register(Departamento)
@@ -21,25 +35,64 @@ class PerfilUsuarioAdmin(admin.ModelAdmin):
 
 
 @admin.register(Sensor)
-class SensorAdmin(admin.ModelAdmin):
+class SensorAdmin(HistorialEstadoAdminMixin, admin.ModelAdmin):
     list_display = ['uid', 'estado', 'departamento', 'usuario_asociado', 'fecha_creacion']
     list_filter = ['estado', 'departamento']
     search_fields = ['uid', 'usuario_asociado__username']
     readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+    
+    # Borrado lógico: los eventos se purgan en segundo plano (ver api/tareas.py)
+    def get_deleted_objects(self, objs, request):
+        """Confirmación sin recorrer los eventos relacionados, que pueden ser millones"""
+        objs = list(objs)
+        permisos = set() if self.has_delete_permission(request) else {Sensor._meta.verbose_name}
+        return [str(obj) for obj in objs], {Sensor._meta.verbose_name_plural: len(objs)}, permisos, []
+    
+    def delete_model(self, request, obj):
+        tareas.eliminar_sensores([obj], request.user)
+    
+    def delete_queryset(self, request, queryset):
+        tareas.eliminar_sensores(queryset, request.user)
 
 
 @admin.register(Evento)
 class EventoAdmin(admin.ModelAdmin):
-    list_display = ['sensor', 'tipo_evento', 'resultado', 'fecha']
-    list_filter = ['tipo_evento', 'resultado', 'fecha']
-    search_fields = ['sensor__uid', 'descripcion']
-    readonly_fields = ['fecha']
+    list_display = ['sensor', 'departamento', 'usuario', 'tipo_evento', 'resultado', 'fecha']
+    list_filter = ['tipo_evento', 'resultado', 'departamento', 'fecha']
+    search_fields = ['sensor__uid', 'detalle__texto']
+    readonly_fields = ['fecha', 'descripcion']
     date_hierarchy = 'fecha'
+    list_select_related = ['sensor', 'departamento', 'usuario']
+    # Evitar COUNT(*) exactos sobre la tabla completa en cada página
+    paginator = ConteoEstimadoPaginator
+    show_full_result_count = False
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            contadores.ajustar([obj], -1)
+            super().delete_model(request, obj)
+        resumenes.ajustar([obj], -1)
+    
+    def delete_queryset(self, request, queryset):
+        eventos = list(queryset.only('tipo_evento', 'resultado', 'fecha', 'departamento'))
+        super().delete_queryset(request, queryset)
+        contadores.ajustar(eventos, -1)
+        resumenes.ajustar(eventos, -1)
 
 
 @admin.register(Barrera)
-class BarreraAdmin(admin.ModelAdmin):
+class BarreraAdmin(HistorialEstadoAdminMixin, admin.ModelAdmin):
     list_display = ['nombre', 'estado', 'departamento', 'fecha_creacion']
     list_filter = ['estado', 'departamento']
     search_fields = ['nombre']
     readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'progreso', 'total', 'intentos', 'fecha_creacion', 'fecha_fin']
+    list_filter = ['estado', 'tipo']
+    readonly_fields = [
+        'estado', 'progreso', 'total', 'checkpoint', 'resultado', 'error', 'intentos',
+        'trabajador', 'latido', 'creado_por', 'fecha_creacion', 'fecha_inicio', 'fecha_fin'
+    ]
@@ -0,0 +1,252 @@
+"""
+Snapshots binarios de la allowlist de cada departamento.
+
+Para cada Departamento se genera un archivo con los UID de sus sensores
+activos, pensado para el firmware de los lectores:
+
+Cabecera (24 bytes, little-endian, struct '<4sBBBBIQI'):
+    magic        4s  b'SCAL'
+    formato      B   versión del formato (2)
+    tipo         B   0 = lista ordenada, 1 = filtro de Bloom
+    ancho        B   bytes por UID en la lista ordenada (0 en Bloom)
+    k            B   número de funciones hash del Bloom (0 en lista ordenada)
+    departamento I   id del departamento
+    version      Q   cursor de CambioSync al momento de construir el snapshot
+    n            I   cantidad de UID incluidos
+
+Cuerpo:
+    lista ordenada: n registros de `ancho` bytes (UID en UTF-8 rellenado con
+        b'\\0'), ordenados byte a byte, de modo que el lector puede responder
+        con una búsqueda binaria.
+    Bloom: arreglo de bits de tamaño (largo del cuerpo * 8). Las posiciones se
+        calculan con doble hashing: h = blake2b(uid, digest_size=16),
+        h1 = h[0:8], h2 = h[8:16] | 1 (enteros little-endian; h2 impar para
+        que las k posiciones no se repitan cuando h2 comparte factores con m)
+        y posicion_i = (h1 + i * h2) mod m, para i en 0..k-1.
+
+Los snapshots se guardan en settings.ALLOWLIST_DIR. Cuando cambia el estado,
+uid o departamento de un sensor, al confirmar la transacción se escribe en el
+marcador del departamento afectado el cursor de CambioSync, que ya incluye el
+cambio. Un snapshot está vigente si la `version` de su cabecera alcanza ese
+cursor. El GET nunca construye: entrega el último snapshot en disco y, si está
+desactualizado o no existe, encola un job `construir_allowlists`; también se
+construyen con `python manage.py construir_allowlists`.
+"""
+import hashlib
+import math
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CambioSync, Departamento, Sensor
+from .signals import estado_actualizado
+
+
+MAGIC = b'SCAL'
+FORMATO = 2
+CABECERA = struct.Struct('<4sBBBBIQI')
+
+ORDENADA = 'ordenada'
+BLOOM = 'bloom'
+TIPOS = {ORDENADA: 0, BLOOM: 1}
+
+CAMPOS_RELEVANTES = ('uid', 'estado', 'departamento_id', 'fecha_eliminacion')
+
+
+@dataclass
+class Snapshot:
+    contenido: bytes
+    etag: str
+    
+    @property
+    def version(self):
+        """Cursor de CambioSync con el que se construyó (campo `version` de la cabecera)"""
+        return CABECERA.unpack_from(self.contenido)[6]
+
+
+# Caché en memoria del último snapshot leído de disco por ruta:
+# ruta -> (mtime_ns, Snapshot)
+_cache = {}
+
+
+def _directorio():
+    directorio = settings.ALLOWLIST_DIR
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _ruta_snapshot(departamento_id, tipo):
+    return os.path.join(_directorio(), f'departamento-{departamento_id}-{tipo}.bin')
+
+
+def _ruta_marcador(departamento_id):
+    return os.path.join(_directorio(), f'departamento-{departamento_id}.pendiente')
+
+
+def _version_actual():
+    return CambioSync.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def marcar_pendiente(departamento_ids):
+    """
+    Marca los snapshots de los departamentos indicados como desactualizados.
+    El cursor se lee al confirmar la transacción, de modo que incluye la
+    entrada de CambioSync del propio cambio.
+    """
+    departamento_ids = set(departamento_ids) - {None}
+    if departamento_ids:
+        transaction.on_commit(lambda: _registrar_version(departamento_ids, _version_actual()))
+
+
+def version_pendiente(departamento_id):
+    """Cursor de CambioSync del último cambio marcado en el departamento (0 si no hay)"""
+    try:
+        with open(_ruta_marcador(departamento_id)) as archivo:
+            return int(archivo.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _registrar_version(departamento_ids, version):
+    for departamento_id in departamento_ids:
+        if version_pendiente(departamento_id) >= version:
+            continue
+        _escribir(_ruta_marcador(departamento_id), str(version).encode())
+
+
+def _escribir(ruta, contenido):
+    descriptor, temporal = tempfile.mkstemp(dir=_directorio(), suffix='.tmp')
+    with os.fdopen(descriptor, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def esta_vigente(departamento_id, tipo):
+    """Un snapshot está vigente si su versión alcanza el último cambio marcado"""
+    snapshot = obtener(departamento_id, tipo)
+    return snapshot is not None and snapshot.version >= version_pendiente(departamento_id)
+
+
+def _posiciones_bloom(uid, k, m):
+    digest = hashlib.blake2b(uid, digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % m for i in range(k)]
+
+
+def _codificar_ordenada(departamento_id, version, uids):
+    ancho = max((len(uid) for uid in uids), default=0)
+    cuerpo = b''.join(uid.ljust(ancho, b'\0') for uid in sorted(uids))
+    cabecera = CABECERA.pack(MAGIC, FORMATO, TIPOS[ORDENADA], ancho, 0, departamento_id, version, len(uids))
+    return cabecera + cuerpo
+
+
+def _codificar_bloom(departamento_id, version, uids):
+    n = max(len(uids), 1)
+    tasa = settings.ALLOWLIST_BLOOM_FALSOS_POSITIVOS
+    m = max(64, math.ceil(-n * math.log(tasa) / (math.log(2) ** 2)))
+    m = (m + 7) // 8 * 8
+    k = min(16, max(1, round(m / n * math.log(2))))
+    
+    bits = bytearray(m // 8)
+    for uid in uids:
+        for posicion in _posiciones_bloom(uid, k, m):
+            bits[posicion >> 3] |= 1 << (posicion & 7)
+    
+    cabecera = CABECERA.pack(MAGIC, FORMATO, TIPOS[BLOOM], 0, k, departamento_id, version, len(uids))
+    return cabecera + bytes(bits)
+
+
+def construir(departamento_id, tipo=ORDENADA):
+    """
+    Construye y guarda en disco el snapshot de un departamento.
+    El cursor de CambioSync y los UID se leen en la misma transacción; un
+    cambio confirmado después deja en el marcador un cursor mayor y el
+    snapshot vuelve a quedar pendiente.
+    """
+    with transaction.atomic():
+        version = _version_actual()
+        uids = [
+            uid.encode('utf-8')
+            for uid in Sensor.objects.filter(
+                departamento_id=departamento_id, estado=Sensor.ACTIVO
+            ).values_list('uid', flat=True)
+        ]
+    
+    codificar = _codificar_bloom if tipo == BLOOM else _codificar_ordenada
+    contenido = codificar(departamento_id, version, uids)
+    
+    ruta = _ruta_snapshot(departamento_id, tipo)
+    _escribir(ruta, contenido)
+    
+    snapshot = Snapshot(contenido, _etag(contenido))
+    _cache[ruta] = (os.stat(ruta).st_mtime_ns, snapshot)
+    return snapshot
+
+
+def _etag(contenido):
+    return '"%s"' % hashlib.sha256(contenido).hexdigest()[:32]
+
+
+def obtener(departamento_id, tipo=ORDENADA):
+    """
+    Retorna el último snapshot construido del departamento, o None si todavía
+    no existe. No lo reconstruye aunque esté desactualizado (ver esta_vigente).
+    """
+    ruta = _ruta_snapshot(departamento_id, tipo)
+    try:
+        mtime = os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    en_cache = _cache.get(ruta)
+    if en_cache and en_cache[0] == mtime:
+        return en_cache[1]
+    
+    with open(ruta, 'rb') as archivo:
+        contenido = archivo.read()
+    snapshot = Snapshot(contenido, _etag(contenido))
+    _cache[ruta] = (mtime, snapshot)
+    return snapshot
+
+
+def construir_pendientes(tipos=(ORDENADA,), forzar=False, departamento_ids=None):
+    """Reconstruye los snapshots desactualizados o inexistentes (o todos con forzar=True)"""
+    if departamento_ids is None:
+        departamento_ids = Departamento.objects.values_list('id', flat=True)
+    construidos = []
+    for departamento_id in departamento_ids:
+        for tipo in tipos:
+            if forzar or not esta_vigente(departamento_id, tipo):
+                construir(departamento_id, tipo)
+                construidos.append((departamento_id, tipo))
+    return construidos
+
+
+@receiver(post_save, sender=Sensor)
+def sensor_guardado(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    originales = getattr(instance, '_valores_originales', None)
+    if not created and originales is not None and all(
+        originales.get(campo) == getattr(instance, campo) for campo in CAMPOS_RELEVANTES
+    ):
+        return
+    marcar_pendiente([instance.departamento_id, instance.valor_original('departamento_id')])
+
+
+@receiver(post_delete, sender=Sensor)
+def sensor_eliminado(sender, instance, **kwargs):
+    marcar_pendiente([instance.departamento_id])
+
+
+@receiver(estado_actualizado, sender=Sensor)
+def sensores_cambiaron_estado(sender, ids, **kwargs):
+    marcar_pendiente(
+        Sensor.objects.filter(pk__in=ids).order_by().values_list('departamento_id', flat=True).distinct()
+    )
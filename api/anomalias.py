@@ -0,0 +1,160 @@
+"""
+Detección de anomalías sobre el flujo de eventos, sin consultar Evento.
+
+El detector mantiene en memoria, por sensor, una ventana con las fechas de
+sus últimos eventos denegados y el último departamento donde se leyó (el de
+la barrera del evento). Se
+alimenta desde la creación de eventos (EventoViewSet.perform_create) y aplica
+las reglas de settings.ANOMALIAS:
+
+- DENEGADOS_MAXIMO eventos denegados dentro de DENEGADOS_VENTANA segundos.
+- El mismo sensor leído en barreras de dos departamentos distintos dentro de
+  CAMBIO_DEPARTAMENTO_VENTANA segundos. Los eventos sin barrera no dicen dónde
+  se leyó el sensor (su departamento es el asignado al sensor, que puede
+  cambiar legítimamente) y no participan de esta regla.
+
+Al detectar una anomalía registra un Evento de tipo 'anomalia' explicando el
+motivo y, si ACCION es 'bloquear', cambia el sensor a estado bloqueado.
+
+La memoria está acotada: como máximo MAX_SENSORES sensores, y se descartan
+los que no tienen eventos hace más de INACTIVIDAD segundos. El estado es por
+proceso, por lo que con varios workers cada uno ve solo sus eventos.
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from . import estados
+from .models import Evento, Sensor
+
+
+logger = logging.getLogger(__name__)
+
+BLOQUEAR = 'bloquear'
+MARCAR = 'marcar'
+
+
+class _EstadoSensor:
+    __slots__ = ('denegados', 'departamento_id', 'fecha_departamento', 'ultima_fecha')
+
+    def __init__(self, maximo_denegados):
+        self.denegados = deque(maxlen=maximo_denegados)
+        self.departamento_id = None
+        self.fecha_departamento = None
+        self.ultima_fecha = None
+
+
+class DetectorAnomalias:
+    """Detector en memoria con ventanas acotadas por sensor"""
+
+    def __init__(self, reglas):
+        self.reglas = reglas
+        self._sensores = OrderedDict()
+        self._candado = threading.Lock()
+
+    def registrar(self, evento):
+        """Procesa un evento recién creado; retorna la lista de motivos detectados"""
+        if evento.tipo_evento == Evento.ANOMALIA:
+            return []
+        
+        ahora = evento.fecha.timestamp()
+        departamento_id = self._departamento_del_evento(evento)
+        motivos = []
+        
+        with self._candado:
+            self._desalojar(ahora)
+            estado = self._sensores.pop(evento.sensor_id, None)
+            if estado is None:
+                estado = _EstadoSensor(self.reglas['DENEGADOS_MAXIMO'])
+            self._sensores[evento.sensor_id] = estado
+            
+            if evento.resultado == Evento.DENEGADO:
+                estado.denegados.append(ahora)
+                if (
+                    len(estado.denegados) == estado.denegados.maxlen
+                    and ahora - estado.denegados[0] <= self.reglas['DENEGADOS_VENTANA']
+                ):
+                    motivos.append(
+                        f"{len(estado.denegados)} accesos denegados en "
+                        f"{ahora - estado.denegados[0]:.0f} s"
+                    )
+                    estado.denegados.clear()
+            
+            if departamento_id is not None:
+                if (
+                    estado.departamento_id is not None
+                    and departamento_id != estado.departamento_id
+                    and ahora - estado.fecha_departamento <= self.reglas['CAMBIO_DEPARTAMENTO_VENTANA']
+                ):
+                    motivos.append(
+                        f"leído en los departamentos {estado.departamento_id} y {departamento_id} "
+                        f"con {ahora - estado.fecha_departamento:.0f} s de diferencia"
+                    )
+                estado.departamento_id = departamento_id
+                estado.fecha_departamento = ahora
+            estado.ultima_fecha = ahora
+        
+        if motivos:
+            self._actuar(evento, motivos)
+        return motivos
+
+    @staticmethod
+    def _departamento_del_evento(evento):
+        """Departamento donde se leyó el sensor (el de la barrera), o None si el evento no tiene barrera"""
+        if evento.barrera_id is None:
+            return None
+        return evento.barrera.departamento_id
+
+    def _desalojar(self, ahora):
+        """Descarta los sensores menos recientes si se supera el máximo o están inactivos"""
+        limite = ahora - self.reglas['INACTIVIDAD']
+        while self._sensores:
+            sensor_id, estado = next(iter(self._sensores.items()))
+            if len(self._sensores) <= self.reglas['MAX_SENSORES'] and estado.ultima_fecha >= limite:
+                break
+            del self._sensores[sensor_id]
+
+    def _actuar(self, evento, motivos):
+        sensor = evento.sensor
+        bloquear = self.reglas['ACCION'] == BLOQUEAR
+        if bloquear:
+            try:
+                estados.cambiar_estado_condicional(
+                    sensor, Sensor.BLOQUEADO, estado_anterior=Sensor.ACTIVO
+                )
+            except estados.ConflictoEstado:
+                # El sensor ya no estaba activo: no hay nada que bloquear
+                bloquear = False
+        
+        accion = 'Sensor bloqueado automáticamente' if bloquear else 'Anomalía detectada'
+        descripcion = f"{accion}: {'; '.join(motivos)}"
+        Evento.objects.create(
+            sensor=sensor,
+            tipo_evento=Evento.ANOMALIA,
+            resultado=Evento.DENEGADO,
+            descripcion=descripcion
+        )
+        logger.warning('Sensor %s (%s): %s', sensor.pk, sensor.uid, descripcion)
+
+
+_detector = None
+_detector_candado = threading.Lock()
+
+
+def obtener_detector():
+    """Detector del proceso, creado con las reglas de settings.ANOMALIAS"""
+    global _detector
+    if _detector is None:
+        with _detector_candado:
+            if _detector is None:
+                _detector = DetectorAnomalias(settings.ANOMALIAS)
+    return _detector
+
+
+def registrar_evento(evento):
+    """Punto de entrada desde la creación de eventos"""
+    if not settings.ANOMALIAS.get('ACTIVO', True):
+        return []
+    return obtener_detector().registrar(evento)
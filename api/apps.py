@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        # Registrar receptores de señales
+        from . import sync, allowlist, cache, contadores, historial, resumenes, sharding  # noqa: F401
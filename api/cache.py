@@ -0,0 +1,124 @@
+"""
+Caché de respuestas de las vistas con invalidación por etiquetas.
+
+Cada etiqueta (por ejemplo 'sensor') tiene un número de versión guardado en la
+caché. La clave de una respuesta incluye las versiones de todas sus etiquetas,
+así que invalidar una etiqueta solo requiere incrementar su versión: las
+entradas antiguas dejan de usarse y expiran solas.
+
+Las etiquetas se invalidan al confirmar la transacción desde post_save y
+post_delete de los modelos cacheados, y desde la señal estado_actualizado.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Departamento, Rol, PerfilUsuario, Sensor, Barrera
+from .signals import estado_actualizado
+
+
+ETIQUETAS_MODELO = {
+    Departamento: 'departamento',
+    Rol: 'rol',
+    PerfilUsuario: 'perfil',
+    Sensor: 'sensor',
+    Barrera: 'barrera',
+    User: 'usuario',
+}
+
+
+def _clave_etiqueta(etiqueta):
+    return f'etiqueta:{etiqueta}'
+
+
+def versiones(etiquetas):
+    """Versiones actuales de las etiquetas (las inexistentes se inicializan en 1)"""
+    claves = [_clave_etiqueta(etiqueta) for etiqueta in etiquetas]
+    encontradas = cache.get_many(claves)
+    faltantes = {clave: 1 for clave in claves if clave not in encontradas}
+    if faltantes:
+        cache.set_many(faltantes, timeout=None)
+        encontradas.update(faltantes)
+    return [encontradas[clave] for clave in claves]
+
+
+def invalidar(*etiquetas):
+    """Incrementa la versión de las etiquetas, descartando las respuestas asociadas"""
+    for etiqueta in etiquetas:
+        clave = _clave_etiqueta(etiqueta)
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, 2, timeout=None)
+
+
+def clave_respuesta(request, etiquetas, rol):
+    """Clave de caché a partir de la ruta, los parámetros normalizados, el rol y las etiquetas"""
+    parametros = sorted(request.query_params.lists())
+    partes = [
+        request.path,
+        repr(parametros),
+        rol or '',
+        repr(versiones(etiquetas)),
+    ]
+    resumen = hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+    return f'respuesta:{resumen}'
+
+
+def obtener_respuesta(clave):
+    return cache.get(clave)
+
+
+def guardar_respuesta(clave, datos):
+    cache.set(clave, datos, timeout=settings.RESPUESTAS_CACHE_TIMEOUT)
+
+
+def sensores_por_uid(uids):
+    """
+    Id, estado y departamento de los sensores con esos UID, como dict por UID
+    (None si no existe). Las entradas se cachean por UID con la versión de la
+    etiqueta 'sensor'; los UID que faltan se leen con una sola consulta uid__in.
+    """
+    version = versiones(['sensor'])[0]
+    claves = {f'sensor:uid:{version}:{uid}': uid for uid in uids}
+    encontrados = {claves[clave]: datos for clave, datos in cache.get_many(list(claves)).items()}
+    
+    faltantes = [uid for uid in claves.values() if uid not in encontrados]
+    if faltantes:
+        leidos = dict.fromkeys(faltantes, False)
+        for fila in Sensor.objects.filter(uid__in=faltantes).values('uid', 'id', 'estado', 'departamento_id'):
+            leidos[fila.pop('uid')] = fila
+        cache.set_many(
+            {f'sensor:uid:{version}:{uid}': datos for uid, datos in leidos.items()},
+            timeout=settings.RESPUESTAS_CACHE_TIMEOUT
+        )
+        encontrados.update(leidos)
+    return {uid: encontrados[uid] or None for uid in claves.values()}
+
+
+def _invalidar_al_confirmar(etiqueta):
+    transaction.on_commit(lambda: invalidar(etiqueta))
+
+
+def modelo_modificado(sender, raw=False, **kwargs):
+    etiqueta = ETIQUETAS_MODELO.get(sender)
+    if etiqueta is not None and not raw:
+        _invalidar_al_confirmar(etiqueta)
+
+
+# Conectados por modelo para no desactivar el borrado rápido de otros modelos
+for _modelo in ETIQUETAS_MODELO:
+    post_save.connect(modelo_modificado, sender=_modelo)
+    post_delete.connect(modelo_modificado, sender=_modelo)
+
+
+@receiver(estado_actualizado)
+def estado_modificado(sender, **kwargs):
+    etiqueta = ETIQUETAS_MODELO.get(sender)
+    if etiqueta is not None:
+        _invalidar_al_confirmar(etiqueta)
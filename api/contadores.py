@@ -0,0 +1,234 @@
+"""
+Estimación del número de filas de un queryset sin COUNT(*) exacto.
+
+- PostgreSQL: estadísticas del planificador (pg_class.reltuples sin filtros,
+  filas estimadas por EXPLAIN con filtros).
+- Otros motores (SQLite): contadores mantenidos en ContadorFilas para Evento,
+  por combinación de filtros de igualdad sobre CAMPOS_CONTADOS.
+
+Las inserciones de Evento no escriben en los contadores: cada base de
+eventos tiene una marca ('marca:<alias>' en ContadorFilas) con el último id
+contado, y poner_al_dia() suma de una vez los eventos con id posterior, con
+un GROUP BY sobre ese tramo. Se ejecuta antes de estimar, como máximo cada
+settings.CONTADORES_INTERVALO segundos por proceso, o desde el job
+`recalcular_contadores`. La marca avanza con un UPDATE condicional, así dos
+procesos nunca suman el mismo tramo.
+
+Los borrados explícitos descuentan los eventos ya contados (id hasta la
+marca). Los borrados en cascada no los actualizan;
+`python manage.py recalcular_contadores` los recalcula.
+"""
+import json
+import time
+from itertools import combinations
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Count, F
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+
+from . import sharding
+from .models import ContadorFilas, Evento
+
+
+CAMPOS_CONTADOS = ('resultado', 'tipo_evento')
+
+# Momento (time.monotonic) de la última puesta al día en este proceso
+_ultima_puesta_al_dia = None
+
+
+def _clave(filtros):
+    """Clave canónica para un dict de filtros de igualdad"""
+    if not filtros:
+        return 'evento'
+    return 'evento:' + ','.join(f'{campo}={filtros[campo]}' for campo in sorted(filtros))
+
+
+def _claves(valores):
+    claves = []
+    for largo in range(len(CAMPOS_CONTADOS) + 1):
+        for campos in combinations(CAMPOS_CONTADOS, largo):
+            claves.append(_clave({campo: valores[campo] for campo in campos}))
+    return claves
+
+
+def claves_evento(evento):
+    """Claves de todos los contadores a los que pertenece un evento"""
+    return _claves({campo: getattr(evento, campo) for campo in CAMPOS_CONTADOS})
+
+
+def _sumar(por_clave):
+    """Un UPDATE por cada cantidad distinta a sumar"""
+    for cantidad in set(por_clave.values()) - {0}:
+        claves = [clave for clave, valor in por_clave.items() if valor == cantidad]
+        ContadorFilas.objects.filter(clave__in=claves).update(total=F('total') + cantidad)
+
+
+def _bases():
+    """Bases de datos con eventos (ver api/sharding.py)"""
+    return settings.EVENTO_SHARDS or [DEFAULT_DB_ALIAS]
+
+
+def _clave_marca(alias):
+    return f'marca:{alias}'
+
+
+def _base_de(evento):
+    if sharding.activo():
+        return sharding.shard_de_id(evento.pk)
+    return DEFAULT_DB_ALIAS
+
+
+def _ultimo_id(alias):
+    return Evento.objects.using(alias).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def marcas():
+    """Último id contado por base de eventos; las que faltan se crean con el id actual"""
+    claves = {_clave_marca(alias): alias for alias in _bases()}
+    existentes = dict(ContadorFilas.objects.filter(clave__in=list(claves)).values_list('clave', 'total'))
+    resultado = {}
+    for clave, alias in claves.items():
+        if clave not in existentes:
+            existentes[clave] = ContadorFilas.objects.get_or_create(
+                clave=clave, defaults={'total': _ultimo_id(alias)}
+            )[0].total
+        resultado[alias] = existentes[clave]
+    return resultado
+
+
+def poner_al_dia():
+    """
+    Suma a los contadores los eventos insertados después de la marca de cada
+    base. Retorna el número de eventos sumados.
+    """
+    global _ultima_puesta_al_dia
+    _ultima_puesta_al_dia = time.monotonic()
+    sumados = 0
+    for alias, marca in marcas().items():
+        ultimo = _ultimo_id(alias)
+        if ultimo <= marca:
+            continue
+        grupos = list(
+            Evento.objects.using(alias).filter(pk__gt=marca, pk__lte=ultimo)
+            .order_by().values_list(*CAMPOS_CONTADOS).annotate(cantidad=Count('pk'))
+        )
+        por_clave = {}
+        for *valores, cantidad in grupos:
+            for clave in _claves(dict(zip(CAMPOS_CONTADOS, valores))):
+                por_clave[clave] = por_clave.get(clave, 0) + cantidad
+        with transaction.atomic():
+            if not ContadorFilas.objects.filter(clave=_clave_marca(alias), total=marca).update(total=ultimo):
+                continue  # otro proceso ya sumó este tramo
+            _sumar(por_clave)
+        sumados += sum(cantidad for *_, cantidad in grupos)
+    return sumados
+
+
+def ajustar(eventos, delta):
+    """
+    Suma `delta` a los contadores de los eventos indicados que ya fueron
+    contados (id hasta la marca de su base); los posteriores no se contaron
+    todavía. Los borrados deben ajustar antes de delete(), que deja el pk en None.
+    """
+    limites = marcas()
+    por_clave = {}
+    for evento in eventos:
+        if evento.pk is None or evento.pk > limites.get(_base_de(evento), 0):
+            continue
+        for clave in claves_evento(evento):
+            por_clave[clave] = por_clave.get(clave, 0) + delta
+    _sumar(por_clave)
+
+
+def filtros_de_igualdad(queryset, campos=CAMPOS_CONTADOS):
+    """
+    Retorna los filtros de igualdad del queryset como dict si todos son
+    sobre `campos` de la tabla base; None en otro caso.
+    """
+    query = queryset.query
+    where = query.where
+    if where.negated or (where.children and where.connector != AND) or query.is_sliced or query.distinct:
+        return None
+    filtros = {}
+    for hijo in where.children:
+        if not isinstance(hijo, Exact) or not isinstance(hijo.lhs, Col):
+            return None
+        if hijo.lhs.alias != query.get_initial_alias() or hijo.lhs.target.name not in campos:
+            return None
+        # El rhs ya está preparado para la base de datos (por ejemplo, el código de un CodigoField)
+        filtros[hijo.lhs.target.name] = hijo.lhs.target.to_python(getattr(hijo.rhs, 'pk', hijo.rhs))
+    return filtros
+
+
+def _estimar_postgresql(queryset):
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where.children:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            fila = cursor.fetchone()
+            return fila[0] if fila and fila[0] >= 0 else None
+        
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _estimar_con_contador(queryset):
+    if queryset.model is not Evento:
+        return None
+    filtros = filtros_de_igualdad(queryset)
+    if filtros is None:
+        return None
+    
+    if _ultima_puesta_al_dia is None or time.monotonic() - _ultima_puesta_al_dia >= settings.CONTADORES_INTERVALO:
+        poner_al_dia()
+    
+    clave = _clave(filtros)
+    total = ContadorFilas.objects.filter(clave=clave).values_list('total', flat=True).first()
+    if total is None:
+        # Primer uso del contador: se inicializa con un conteo exacto hasta las marcas
+        total = _contar_hasta_marcas(filtros, marcas())
+        ContadorFilas.objects.get_or_create(clave=clave, defaults={'total': total})
+    return total
+
+
+def _contar_hasta_marcas(filtros, limites):
+    return sum(
+        Evento.objects.using(alias).filter(**filtros, pk__lte=marca).count()
+        for alias, marca in limites.items()
+    )
+
+
+def estimar(queryset):
+    """Número estimado de filas del queryset, o None si no se puede estimar"""
+    if connections[queryset.db].vendor == 'postgresql':
+        return _estimar_postgresql(queryset)
+    return _estimar_con_contador(queryset)
+
+
+def recalcular():
+    """
+    Recalcula con COUNT(*) exacto todos los contadores existentes, hasta el
+    último id actual de cada base, que pasa a ser su marca.
+    """
+    limites = {alias: _ultimo_id(alias) for alias in _bases()}
+    recalculados = 0
+    with transaction.atomic():
+        for contador in ContadorFilas.objects.filter(clave__startswith='evento').select_for_update():
+            filtros = {}
+            if ':' in contador.clave:
+                filtros = dict(parte.split('=', 1) for parte in contador.clave.split(':', 1)[1].split(','))
+            contador.total = _contar_hasta_marcas(filtros, limites)
+            contador.save(update_fields=['total'])
+            recalculados += 1
+        for alias, ultimo in limites.items():
+            ContadorFilas.objects.update_or_create(clave=_clave_marca(alias), defaults={'total': ultimo})
+    return recalculados
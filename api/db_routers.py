@@ -0,0 +1,154 @@
+"""
+Enrutamiento de lecturas hacia réplicas.
+
+Las vistas que heredan de LecturaReplicaMixin activan, solo para sus métodos
+seguros (GET/HEAD/OPTIONS), el envío de lecturas a una de las réplicas de
+settings.DATABASE_REPLICAS. La réplica se elige una vez por solicitud, de modo
+que todas sus consultas leen el mismo estado. Todas las escrituras van a
+'default'.
+
+Lectura de las propias escrituras: cuando un usuario escribe en la base de
+datos, PrimariaTrasEscrituraMiddleware le entrega una cookie firmada con su id
+que vence a los settings.REPLICA_LAG_TOLERANCIA segundos; mientras la envíe,
+sus lecturas se mantienen en la primaria, para no ver datos anteriores a su
+propio cambio. Al viajar con el cliente, funciona con cualquier worker o
+servidor sin depender de una caché compartida.
+
+EventoShardRouter reparte los eventos entre settings.EVENTO_SHARDS.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+# Alias de la réplica elegida para la solicitud en curso (None: primaria)
+_replica = ContextVar('replica', default=None)
+_hubo_escritura = ContextVar('hubo_escritura', default=False)
+
+COOKIE_PRIMARIA = 'primaria'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+_SAL_COOKIE = 'api.db_routers.primaria'
+
+
+def activar_replica():
+    """
+    Elige una réplica para el contexto actual y envía allí sus lecturas;
+    retorna el token para desactivarlas.
+    """
+    return _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+
+def desactivar_replica(token):
+    _replica.reset(token)
+
+
+def debe_leer_primaria(request):
+    """True si no hay réplicas o si el usuario escribió hace menos de la tolerancia de lag"""
+    if not settings.DATABASE_REPLICAS:
+        return True
+    usuario = getattr(request, 'user', None)
+    if usuario is None or not usuario.is_authenticated:
+        return False
+    escritor = request.get_signed_cookie(
+        COOKIE_PRIMARIA, default=None, salt=_SAL_COOKIE, max_age=settings.REPLICA_LAG_TOLERANCIA
+    )
+    return escritor == str(usuario.pk)
+
+
+class ReplicaRouter:
+    """Router que envía las lecturas habilitadas a una réplica y todo lo demás a 'default'"""
+
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is not None and replica in settings.DATABASE_REPLICAS:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _hubo_escritura.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        alias = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in alias and obj2._state.db in alias:
+            return True
+        return None
+
+
+class EventoShardRouter:
+    """
+    Router de Evento cuando settings.EVENTO_SHARDS está definido (ver
+    api/sharding.py). Los demás modelos y las lecturas sin instancia quedan
+    a cargo de los routers siguientes; las vistas eligen el shard con using().
+    """
+
+    # EventoDescripcion vive en el shard de su evento
+    modelos = ('api.evento', 'api.eventodescripcion')
+
+    def _es_evento(self, model):
+        return bool(settings.EVENTO_SHARDS) and model._meta.label_lower in self.modelos
+
+    def db_for_read(self, model, **hints):
+        instancia = hints.get('instance')
+        if self._es_evento(model) and instancia is not None and instancia._state.db:
+            return instancia._state.db
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not self._es_evento(model):
+            return None
+        instancia = hints.get('instance')
+        if not isinstance(instancia, model):
+            return None
+        _hubo_escritura.set(True)
+        # Un evento nuevo puede traer _state.db de la relación asignada; se ubica por su sensor
+        if instancia._state.adding:
+            from .sharding import shard_de_id, shard_para_evento
+            if model._meta.label_lower == 'api.eventodescripcion':
+                return shard_de_id(instancia.evento_id)
+            return shard_para_evento(instancia)
+        return instancia._state.db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self._es_evento(type(obj1)) or self._es_evento(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.EVENTO_SHARDS:
+            return app_label == 'api' and model_name in ('evento', 'eventodescripcion')
+        return None
+
+
+class PrimariaTrasEscrituraMiddleware:
+    """
+    Marca a los usuarios que escribieron en la base de datos durante la
+    solicitud (cookie firmada COOKIE_PRIMARIA) para que sus próximas lecturas
+    se hagan en la primaria. Las escrituras internas de una lectura (por
+    ejemplo, inicializar un contador) no marcan al usuario.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _hubo_escritura.set(False)
+        try:
+            response = self.get_response(request)
+            usuario = getattr(request, 'user', None)
+            if (
+                _hubo_escritura.get()
+                and request.method not in METODOS_SEGUROS
+                and settings.DATABASE_REPLICAS
+                and usuario is not None
+                and usuario.is_authenticated
+            ):
+                response.set_signed_cookie(
+                    COOKIE_PRIMARIA, str(usuario.pk), salt=_SAL_COOKIE,
+                    max_age=settings.REPLICA_LAG_TOLERANCIA, httponly=True, samesite='Lax'
+                )
+            return response
+        finally:
+            _hubo_escritura.reset(token)
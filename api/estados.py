@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .signals import estado_actualizado
+
+
+# Ids por SELECT y UPDATE en los cambios masivos: SQLite admite por omisión
+# 999 parámetros por sentencia en versiones antiguas
+LOTE_IDS = 900
+
+
+class ConflictoEstado(Exception):
+    """
+    El objeto cambió desde que el cliente lo leyó. `version_distinta` indica
+    que falló la versión esperada (If-Match, 412) y no solo el estado (409).
+    """
+    
+    def __init__(self, version_distinta=False):
+        super().__init__()
+        self.version_distinta = version_distinta
+
+
+def _actualizar(queryset, nuevo_estado, ahora):
+    return queryset.update(
+        estado=nuevo_estado,
+        fecha_actualizacion=ahora,
+        version=F('version') + 1
+    )
+
+
+def cambiar_estado_condicional(instancia, nuevo_estado, version=None, estado_anterior=None, usuario=None):
+    """
+    Cambia el estado de `instancia` con un único UPDATE condicional:
+
+        UPDATE ... SET estado=?, fecha_actualizacion=?, version=version+1
+        WHERE id=? [AND version=?] AND estado=?
+
+    Solo se escriben `estado`, `fecha_actualizacion` y `version`, sin leer ni
+    reescribir el resto de columnas. Si se indica `version` o `estado_anterior`
+    y la fila ya no coincide se lanza ConflictoEstado (con version_distinta
+    si lo que no coincide es la versión).
+    Sin `estado_anterior` se condiciona al estado de la instancia en memoria,
+    para conocer el estado previo que se registra en el historial
+    (api/historial.py); si otro cambio se adelantó, se relee el estado
+    bloqueando la fila y se aplica igual.
+    La instancia en memoria se actualiza con los nuevos valores.
+    """
+    modelo = type(instancia)
+    filtros = {'pk': instancia.pk}
+    if version is not None:
+        filtros['version'] = version
+    anterior = estado_anterior if estado_anterior is not None else instancia.estado
+    
+    ahora = timezone.now()
+    with transaction.atomic():
+        actualizados = _actualizar(modelo.objects.filter(**filtros, estado=anterior), nuevo_estado, ahora)
+        if not actualizados and estado_anterior is None:
+            anterior = (
+                modelo.objects.select_for_update().filter(**filtros)
+                .values_list('estado', flat=True).first()
+            )
+            if anterior is not None:
+                actualizados = _actualizar(modelo.objects.filter(**filtros), nuevo_estado, ahora)
+        if not actualizados:
+            raise ConflictoEstado(
+                version_distinta=version is not None
+                and not modelo.objects.filter(**filtros).exists()
+            )
+        
+        estado_actualizado.send(
+            sender=modelo, ids=[instancia.pk], estado=nuevo_estado, usuario=usuario,
+            anteriores={instancia.pk: anterior}, fecha=ahora
+        )
+    
+    instancia.estado = nuevo_estado
+    instancia.fecha_actualizacion = ahora
+    if version is not None:
+        instancia.version = version + 1
+    else:
+        instancia.refresh_from_db(fields=['version'])
+    instancia.recordar_valores(['estado', 'fecha_actualizacion', 'version'])
+    return instancia
+
+
+def cambiar_estado_masivo(queryset, nuevo_estado, usuario=None, ids=None):
+    """
+    Aplica `nuevo_estado` a todos los objetos del queryset (limitado a `ids`
+    si se indican) en una transacción:
+
+        SELECT id, estado ... WHERE <filtros> [AND id IN (...)] AND estado <> ? FOR UPDATE
+        UPDATE ... SET estado=?, fecha_actualizacion=?, version=version+1
+        WHERE id IN (...)
+
+    El SELECT bloquea las filas y obtiene sus ids y estados previos, que
+    necesitan el feed de sync y el historial de estados (el ORM no ofrece
+    UPDATE ... RETURNING de forma portable). Con `ids` el SELECT, y siempre
+    el UPDATE, se dividen en bloques de LOTE_IDS ids (ordenados, para
+    bloquear las filas siempre en el mismo orden) por el límite de
+    parámetros de SQLite; con menos filas es una sola sentencia.
+
+    Solo se modifican `estado`, `fecha_actualizacion` y `version` de las filas
+    cuyo estado es distinto al nuevo. Dentro de la misma transacción se emite una
+    única señal `estado_actualizado` con los ids afectados y sus estados previos.
+    Retorna la lista de ids actualizados.
+    """
+    modelo = queryset.model
+    
+    pendientes = queryset.exclude(estado=nuevo_estado).select_for_update().order_by()
+    if ids is None:
+        lotes = [pendientes]
+    else:
+        ids = sorted(set(ids))
+        lotes = (pendientes.filter(pk__in=ids[inicio:inicio + LOTE_IDS]) for inicio in range(0, len(ids), LOTE_IDS))
+    
+    with transaction.atomic():
+        anteriores = {}
+        for lote in lotes:
+            anteriores.update(lote.values_list('pk', 'estado'))
+        if not anteriores:
+            return []
+        
+        ids = list(anteriores)
+        ahora = timezone.now()
+        for inicio in range(0, len(ids), LOTE_IDS):
+            _actualizar(modelo.objects.filter(pk__in=ids[inicio:inicio + LOTE_IDS]), nuevo_estado, ahora)
+        
+        estado_actualizado.send(
+            sender=modelo, ids=ids, estado=nuevo_estado, usuario=usuario,
+            anteriores=anteriores, fecha=ahora
+        )
+    
+    return ids
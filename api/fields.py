@@ -0,0 +1,57 @@
+"""
+Campos de modelo propios.
+"""
+from django.core import exceptions
+from django.db import models
+from django.utils.functional import cached_property
+
+
+class CodigoField(models.PositiveSmallIntegerField):
+    """
+    Enumeración de texto guardada como entero pequeño (2 bytes en lugar de
+    un varchar). En Python el valor sigue siendo el texto de `choices`: el
+    modelo, los filtros, los serializers y el admin no cambian. En la base de
+    datos se guarda el código de `codigos` ({valor: código}); los códigos no
+    deben cambiarse ni reutilizarse una vez que hay filas guardadas.
+    """
+
+    def __init__(self, *args, codigos=None, **kwargs):
+        self.codigos = dict(codigos or {})
+        self.valores = {codigo: valor for valor, codigo in self.codigos.items()}
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['codigos'] = self.codigos
+        return name, path, args, kwargs
+
+    @cached_property
+    def validators(self):
+        # Sin los validadores de rango de IntegerField: en Python el valor es texto
+        return [*self.default_validators, *self._validators]
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return self.valores.get(value, value)
+
+    def to_python(self, value):
+        if value is None or value in self.codigos:
+            return value
+        try:
+            return self.valores[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or isinstance(value, int):
+            return value
+        try:
+            return self.codigos[value]
+        except (KeyError, TypeError):
+            raise ValueError(f"El campo '{self.name}' no admite el valor {value!r}") from None
@@ -0,0 +1,33 @@
+import django_filters
+
+from . import sharding
+from .models import Departamento, Evento, Sensor
+
+
+class EventoFilter(django_filters.FilterSet):
+    """
+    Filtros de EventoViewSet. El filtro por departamento usa la columna
+    desnormalizada Evento.departamento (departamento del sensor al momento del
+    evento) y el índice (departamento, -fecha), sin JOIN con sensores.
+    `sensor__departamento` conserva su significado: eventos de los sensores que
+    hoy pertenecen al departamento, aunque se hayan registrado en otro.
+    `desde` y `hasta` (ISO 8601) limitan el rango de fechas [desde, hasta).
+    """
+    sensor__departamento = django_filters.ModelChoiceFilter(
+        queryset=Departamento.objects.all(),
+        method='filtrar_departamento_del_sensor'
+    )
+    desde = django_filters.IsoDateTimeFilter(field_name='fecha', lookup_expr='gte')
+    hasta = django_filters.IsoDateTimeFilter(field_name='fecha', lookup_expr='lt')
+    
+    class Meta:
+        model = Evento
+        fields = ['tipo_evento', 'resultado', 'sensor', 'departamento']
+    
+    def filtrar_departamento_del_sensor(self, queryset, name, value):
+        """Subconsulta sobre el índice (sensor, -fecha) con los sensores actuales del departamento"""
+        sensores = Sensor.todos.filter(departamento=value).values('pk')
+        if sharding.activo():
+            # Los shards no tienen la tabla de sensores: los ids se leen de 'default'
+            sensores = list(sensores.values_list('pk', flat=True))
+        return queryset.filter(sensor__in=sensores)
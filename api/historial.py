@@ -0,0 +1,110 @@
+"""
+Historial append-only de los cambios de estado de sensores y barreras.
+
+Cada cambio de `estado` agrega una fila a TransicionEstado (estado anterior,
+estado nuevo, usuario y fecha) dentro de la misma transacción que lo aplica:
+
+- Cambios condicionales y masivos (api/estados.py): desde la señal
+  estado_actualizado, con un único INSERT por lote. La fecha es la
+  fecha_actualizacion escrita por el UPDATE.
+- save() (API, admin, importaciones): desde post_save, comparando con el
+  estado leído de la base de datos; el alta registra el estado inicial con
+  estado_anterior nulo. El usuario se indica con usuario_actual().
+
+estado_en() responde en qué estado estaba un objeto en una fecha con una
+búsqueda sobre el índice (entidad, objeto_id, -fecha), sin recorrer los
+eventos de apertura y cierre manual.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Barrera, Sensor, TransicionEstado
+from .signals import estado_actualizado
+
+
+ENTIDADES = {
+    Sensor: TransicionEstado.SENSOR,
+    Barrera: TransicionEstado.BARRERA,
+}
+
+_usuario = ContextVar('usuario_historial', default=None)
+
+
+@contextmanager
+def usuario_actual(usuario):
+    """Atribuye a `usuario` los cambios de estado guardados con save() dentro del bloque"""
+    token = _usuario.set(usuario)
+    try:
+        yield
+    finally:
+        _usuario.reset(token)
+
+
+def _usuario_id(usuario):
+    return getattr(usuario, 'pk', None)
+
+
+def registrar_guardado(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'estado' not in update_fields):
+        return
+    anterior = None if created else instance.valor_original('estado')
+    if anterior == instance.estado:
+        return
+    TransicionEstado.objects.create(
+        entidad=ENTIDADES[sender],
+        objeto_id=instance.pk,
+        estado_anterior=anterior,
+        estado_nuevo=instance.estado,
+        usuario_id=_usuario_id(_usuario.get()),
+        fecha=instance.fecha_creacion if created else instance.fecha_actualizacion
+    )
+
+
+@receiver(estado_actualizado)
+def registrar_cambio_estado(sender, ids, estado, usuario=None, anteriores=None, fecha=None, **kwargs):
+    entidad = ENTIDADES.get(sender)
+    if entidad is None:
+        return
+    anteriores = anteriores or {}
+    extra = {'fecha': fecha} if fecha is not None else {}
+    TransicionEstado.objects.bulk_create([
+        TransicionEstado(
+            entidad=entidad,
+            objeto_id=objeto_id,
+            estado_anterior=anteriores.get(objeto_id),
+            estado_nuevo=estado,
+            usuario_id=_usuario_id(usuario),
+            **extra
+        )
+        for objeto_id in ids if anteriores.get(objeto_id) != estado
+    ])
+
+
+for _clase in ENTIDADES:
+    post_save.connect(registrar_guardado, sender=_clase)
+
+
+def transiciones(instancia):
+    """Queryset de las transiciones de `instancia`, de la más reciente a la más antigua"""
+    return TransicionEstado.objects.filter(entidad=ENTIDADES[type(instancia)], objeto_id=instancia.pk)
+
+
+def estado_en(instancia, fecha):
+    """
+    Estado de `instancia` en `fecha` como (estado, transición que lo fijó), o
+    None si el objeto todavía no existía. La transición es None cuando el
+    estado es anterior a todo lo registrado (objetos creados antes del
+    historial): se toma el estado previo de la primera transición posterior o,
+    si no cambió desde entonces, el actual.
+    """
+    if instancia.fecha_creacion > fecha:
+        return None
+    registradas = transiciones(instancia)
+    ultima = registradas.filter(fecha__lte=fecha).first()
+    if ultima is not None:
+        return ultima.estado_nuevo, ultima
+    siguiente = registradas.filter(fecha__gt=fecha).order_by('fecha', 'id').first()
+    return (siguiente.estado_anterior if siguiente is not None else instancia.estado), None
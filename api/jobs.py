@@ -0,0 +1,156 @@
+"""
+Ejecución de trabajos pesados en segundo plano, sin broker externo.
+
+Las vistas encolan un Job (encolar) y responden de inmediato; el comando
+`python manage.py procesar_jobs` los toma y los ejecuta en un pool de
+procesos, fuera de los workers que atienden solicitudes.
+
+- Reclamo: un único UPDATE condicional (estado y latido esperados) asigna el
+  job a un trabajador; si dos trabajadores compiten, solo uno actualiza la fila.
+- Avance: cada tarea procesa por bloques y llama a Progreso.avanzar(), que
+  guarda el progreso, el checkpoint y el latido con un UPDATE condicionado a
+  que el job siga asignado al trabajador (si fue cancelado o reasignado, la
+  tarea se interrumpe con JobInterrumpido).
+- Reanudación: un job en proceso sin latido durante settings.JOBS_TIEMPO_MUERTO
+  segundos se vuelve a reclamar y la tarea continúa desde su checkpoint. Si
+  muere un proceso del pool, procesar_jobs devuelve sus jobs a la cola de
+  inmediato (liberar) y reemplaza el pool.
+
+Las tareas se registran con @tarea('nombre') en api/tareas.py.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Job
+
+
+_tareas = {}
+
+
+class JobInterrumpido(Exception):
+    """El job fue cancelado o reasignado a otro trabajador mientras se ejecutaba"""
+
+
+def tarea(nombre):
+    """Registra una función `funcion(parametros, progreso)` como tipo de job"""
+    def registrar(funcion):
+        _tareas[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def tareas_registradas():
+    from . import tareas  # noqa: F401  (registra las tareas incluidas)
+    return _tareas
+
+
+class Progreso:
+    """Avance de un job en ejecución; expone el último checkpoint guardado"""
+
+    def __init__(self, job, trabajador):
+        self.job_id = job.pk
+        self.usuario = job.creado_por
+        self.trabajador = trabajador
+        self.checkpoint = job.checkpoint
+        self.progreso = job.progreso
+        self.total = job.total
+
+    def _actualizar(self, **campos):
+        actualizados = Job.objects.filter(
+            pk=self.job_id, estado=Job.EN_PROCESO, trabajador=self.trabajador
+        ).update(latido=timezone.now(), **campos)
+        if not actualizados:
+            raise JobInterrumpido(f'El job {self.job_id} fue cancelado o reasignado')
+
+    def definir_total(self, total):
+        self.total = total
+        self._actualizar(total=total)
+
+    def avanzar(self, cantidad, checkpoint=None):
+        """Suma `cantidad` al progreso y guarda el checkpoint del bloque terminado"""
+        self.progreso += cantidad
+        self.checkpoint = checkpoint
+        self._actualizar(progreso=self.progreso, checkpoint=checkpoint)
+
+
+def encolar(tipo, parametros=None, usuario=None):
+    """Crea un job pendiente del tipo indicado"""
+    if tipo not in tareas_registradas():
+        raise ValueError(f"Tipo de job desconocido: '{tipo}'")
+    return Job.objects.create(tipo=tipo, parametros=parametros or {}, creado_por=usuario)
+
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def reclamar(trabajador):
+    """
+    Asigna al trabajador el job pendiente más antiguo, o uno en proceso cuyo
+    trabajador dejó de dar señales. Retorna el Job reclamado o None.
+    """
+    limite = timezone.now() - timedelta(seconds=settings.JOBS_TIEMPO_MUERTO)
+    candidatos = (
+        Job.objects.filter(
+            Q(estado=Job.PENDIENTE)
+            | Q(estado=Job.EN_PROCESO, latido__lt=limite)
+            | Q(estado=Job.EN_PROCESO, latido__isnull=True)
+        )
+        .order_by('fecha_creacion', 'id')
+        .values_list('pk', 'estado', 'latido')[:20]
+    )
+    for job_id, estado, latido in candidatos:
+        ahora = timezone.now()
+        actualizados = Job.objects.filter(pk=job_id, estado=estado, latido=latido).update(
+            estado=Job.EN_PROCESO,
+            trabajador=trabajador,
+            latido=ahora,
+            intentos=F('intentos') + 1,
+            fecha_inicio=Coalesce(F('fecha_inicio'), Value(ahora)),
+        )
+        if actualizados:
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def ejecutar(job_id, trabajador):
+    """Ejecuta un job ya reclamado por `trabajador` y registra su resultado"""
+    job = Job.objects.select_related('creado_por').get(pk=job_id)
+    funcion = tareas_registradas().get(job.tipo)
+    progreso = Progreso(job, trabajador)
+    asignado = Job.objects.filter(pk=job_id, estado=Job.EN_PROCESO, trabajador=trabajador)
+    try:
+        if funcion is None:
+            raise ValueError(f"Tipo de job desconocido: '{job.tipo}'")
+        resultado = funcion(job.parametros, progreso)
+    except JobInterrumpido:
+        return
+    except Exception:
+        asignado.update(estado=Job.FALLIDO, error=traceback.format_exc(), fecha_fin=timezone.now())
+        return
+    asignado.update(estado=Job.COMPLETADO, resultado=resultado, fecha_fin=timezone.now(), latido=timezone.now())
+
+
+def liberar(job_id, trabajador):
+    """
+    Devuelve a la cola un job en proceso de `trabajador` cuyo proceso murió
+    sin registrar el resultado; el próximo reclamo lo retoma desde su checkpoint
+    """
+    return bool(Job.objects.filter(pk=job_id, estado=Job.EN_PROCESO, trabajador=trabajador).update(
+        estado=Job.PENDIENTE, trabajador='', latido=None
+    ))
+
+
+def cancelar(job):
+    """Cancela un job pendiente o en proceso; retorna False si ya había terminado"""
+    actualizados = Job.objects.filter(
+        pk=job.pk, estado__in=[Job.PENDIENTE, Job.EN_PROCESO]
+    ).update(estado=Job.CANCELADO, fecha_fin=timezone.now())
+    return bool(actualizados)
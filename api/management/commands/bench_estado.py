@@ -0,0 +1,110 @@
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from api import estados
+from api.models import Barrera
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark de contención para cambios de estado de barreras: compara el '
+        'flujo leer-modificar-guardar (save() completo) con el UPDATE condicional '
+        'por versión. Crea una barrera temporal en la base de datos configurada '
+        'y la elimina al terminar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Clientes concurrentes')
+        parser.add_argument('--operaciones', type=int, default=100, help='Cambios de estado por hilo')
+
+    def handle(self, *args, **options):
+        hilos = options['hilos']
+        operaciones = options['operaciones']
+        barrera = Barrera.objects.create(nombre=f'bench-{uuid.uuid4().hex[:12]}')
+        
+        try:
+            for modo in ('rmw', 'cas'):
+                resultado = self._ejecutar(barrera.pk, modo, hilos, operaciones)
+                self._reportar(modo, hilos * operaciones, resultado)
+        finally:
+            Barrera.objects.filter(pk=barrera.pk).delete()
+
+    def _ejecutar(self, barrera_id, modo, hilos, operaciones):
+        """Lanza los hilos y devuelve métricas agregadas del modo indicado"""
+        version_inicial = Barrera.objects.values_list('version', flat=True).get(pk=barrera_id)
+        metricas = {'conflictos': 0, 'bloqueos': 0}
+        candado = threading.Lock()
+        trabajo = self._trabajo_rmw if modo == 'rmw' else self._trabajo_cas
+        
+        def hilo():
+            locales = {'conflictos': 0, 'bloqueos': 0}
+            try:
+                trabajo(barrera_id, operaciones, locales)
+            finally:
+                connection.close()
+            with candado:
+                for clave, valor in locales.items():
+                    metricas[clave] += valor
+        
+        inicio = time.perf_counter()
+        workers = [threading.Thread(target=hilo) for _ in range(hilos)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        metricas['segundos'] = time.perf_counter() - inicio
+        
+        version_final = Barrera.objects.values_list('version', flat=True).get(pk=barrera_id)
+        metricas['aplicadas'] = version_final - version_inicial
+        return metricas
+
+    @staticmethod
+    def _siguiente(estado):
+        return Barrera.CERRADA if estado == Barrera.ABIERTA else Barrera.ABIERTA
+
+    def _trabajo_rmw(self, barrera_id, operaciones, metricas):
+        """Flujo anterior: SELECT de la fila completa y save() de todas las columnas"""
+        for _ in range(operaciones):
+            try:
+                barrera = Barrera.objects.get(pk=barrera_id)
+                barrera.estado = self._siguiente(barrera.estado)
+                barrera.save()
+            except OperationalError:
+                metricas['bloqueos'] += 1
+
+    def _trabajo_cas(self, barrera_id, operaciones, metricas):
+        """UPDATE condicional por versión; ante conflicto se relee y reintenta"""
+        barrera = Barrera.objects.only('id', 'estado', 'version').get(pk=barrera_id)
+        for _ in range(operaciones):
+            while True:
+                try:
+                    estados.cambiar_estado_condicional(
+                        barrera, self._siguiente(barrera.estado), version=barrera.version
+                    )
+                    break
+                except estados.ConflictoEstado:
+                    metricas['conflictos'] += 1
+                    barrera.refresh_from_db(fields=['estado', 'version'])
+                except OperationalError:
+                    metricas['bloqueos'] += 1
+
+    def _reportar(self, modo, intentadas, m):
+        perdidas = max(intentadas - m['aplicadas'] - m['bloqueos'], 0) if modo == 'rmw' else 0
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            'Leer-modificar-guardar (save())' if modo == 'rmw' else 'UPDATE condicional (versión)'
+        ))
+        filas = [
+            ('operaciones', intentadas),
+            ('tiempo', f"{m['segundos']:.2f} s"),
+            ('throughput', f"{intentadas / m['segundos']:.0f} op/s"),
+            ('cambios aplicados', m['aplicadas']),
+            ('actualizaciones perdidas', perdidas),
+            ('conflictos (412)', m['conflictos']),
+            ('errores de bloqueo', m['bloqueos']),
+        ]
+        for etiqueta, valor in filas:
+            self.stdout.write(f"  {etiqueta + ':':<26}{valor}")
@@ -0,0 +1,190 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.models import Evento
+
+
+TABLAS = ('bench_evento_texto', 'bench_evento_compacto', 'bench_evento_descripcion')
+
+# Mismos índices que Evento
+INDICES = [('fecha',), ('sensor_id', 'fecha'), ('departamento_id', 'fecha')]
+
+DDL = {
+    'bench_evento_texto': (
+        'CREATE TABLE bench_evento_texto ('
+        'id bigint PRIMARY KEY, sensor_id integer NOT NULL, tipo_evento varchar(20) NOT NULL, '
+        'resultado varchar(20) NOT NULL, barrera_id integer NULL, departamento_id integer NULL, '
+        'fecha timestamp NOT NULL, descripcion text NULL)'
+    ),
+    'bench_evento_compacto': (
+        'CREATE TABLE bench_evento_compacto ('
+        'id bigint PRIMARY KEY, sensor_id integer NOT NULL, tipo_evento smallint NOT NULL, '
+        'resultado smallint NOT NULL, barrera_id integer NULL, departamento_id integer NULL, '
+        'fecha timestamp NOT NULL)'
+    ),
+    'bench_evento_descripcion': (
+        'CREATE TABLE bench_evento_descripcion (evento_id bigint PRIMARY KEY, texto text NOT NULL)'
+    ),
+}
+
+CONSULTAS = {
+    'conteo por tipo y resultado': {
+        'bench_evento_texto': 'SELECT tipo_evento, resultado, COUNT(*) FROM bench_evento_texto GROUP BY tipo_evento, resultado',
+        'bench_evento_compacto': 'SELECT tipo_evento, resultado, COUNT(*) FROM bench_evento_compacto GROUP BY tipo_evento, resultado',
+    },
+    'filtro por resultado': {
+        'bench_evento_texto': "SELECT COUNT(*) FROM bench_evento_texto WHERE resultado = 'denegado'",
+        'bench_evento_compacto': 'SELECT COUNT(*) FROM bench_evento_compacto WHERE resultado = 2',
+    },
+    'últimos 500 con descripción': {
+        'bench_evento_texto': 'SELECT id, tipo_evento, resultado, fecha, descripcion FROM bench_evento_texto ORDER BY fecha DESC LIMIT 500',
+        'bench_evento_compacto': (
+            'SELECT e.id, e.tipo_evento, e.resultado, e.fecha, d.texto FROM bench_evento_compacto e '
+            'LEFT JOIN bench_evento_descripcion d ON d.evento_id = e.id ORDER BY e.fecha DESC LIMIT 500'
+        ),
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark del formato compacto de Evento: compara el formato anterior '
+        '(tipo y resultado como texto, descripción en la fila) con el actual '
+        '(códigos smallint y descripción en tabla aparte). Crea tablas '
+        'temporales bench_* en la base de datos configurada y las elimina al '
+        'terminar. Informa tamaño de tabla e índices y tiempo de lectura.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=200000, help='Eventos generados')
+        parser.add_argument(
+            '--con-descripcion', type=float, default=0.05,
+            help='Fracción de eventos con descripción'
+        )
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones por consulta (se informa la mejor)')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Motor no soportado: {connection.vendor}')
+
+        self._eliminar_tablas()
+        try:
+            self._crear_tablas()
+            self._cargar(options['filas'], options['con_descripcion'])
+            self._reportar_tamanos()
+            self._reportar_consultas(options['repeticiones'])
+        finally:
+            self._eliminar_tablas()
+
+    def _eliminar_tablas(self):
+        with connection.cursor() as cursor:
+            for tabla in TABLAS:
+                cursor.execute(f'DROP TABLE IF EXISTS {tabla}')
+
+    def _crear_tablas(self):
+        with connection.cursor() as cursor:
+            for tabla in TABLAS:
+                cursor.execute(DDL[tabla])
+            for tabla in ('bench_evento_texto', 'bench_evento_compacto'):
+                for columnas in INDICES:
+                    nombre = f"{tabla}_{'_'.join(columnas)}_idx"
+                    cursor.execute(f"CREATE INDEX {nombre} ON {tabla} ({', '.join(columnas)})")
+
+    def _cargar(self, filas, con_descripcion):
+        """Genera eventos con la distribución habitual: casi todos accesos, pocos con descripción"""
+        aleatorio = random.Random(0)
+        tipos = [Evento.ACCESO] * 90 + [Evento.MANUAL_ABIERTO] * 4 + [Evento.MANUAL_CERRADO] * 4 + [Evento.ANOMALIA] * 2
+        resultados = [Evento.PERMITIDO] * 9 + [Evento.DENEGADO]
+        inicio = datetime(2026, 1, 1)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for desde in range(0, filas, 5000):
+                texto, compacto, descripciones = [], [], []
+                for evento_id in range(desde + 1, min(desde + 5000, filas) + 1):
+                    tipo = aleatorio.choice(tipos)
+                    resultado = aleatorio.choice(resultados)
+                    sensor = aleatorio.randrange(1, 5000)
+                    departamento = sensor % 50 + 1
+                    fecha = (inicio + timedelta(seconds=evento_id * 7)).isoformat(sep=' ')
+                    descripcion = None
+                    if tipo == Evento.ANOMALIA or aleatorio.random() < con_descripcion:
+                        descripcion = f'Anomalía detectada: {aleatorio.randrange(2, 30)} lecturas en 60 segundos'
+                        descripciones.append((evento_id, descripcion))
+                    texto.append((evento_id, sensor, tipo, resultado, None, departamento, fecha, descripcion))
+                    compacto.append((
+                        evento_id, sensor, Evento.TIPO_EVENTO_CODIGOS[tipo], Evento.RESULTADO_CODIGOS[resultado],
+                        None, departamento, fecha
+                    ))
+                cursor.executemany('INSERT INTO bench_evento_texto VALUES (%s, %s, %s, %s, %s, %s, %s, %s)', texto)
+                cursor.executemany('INSERT INTO bench_evento_compacto VALUES (%s, %s, %s, %s, %s, %s, %s)', compacto)
+                if descripciones:
+                    cursor.executemany('INSERT INTO bench_evento_descripcion VALUES (%s, %s)', descripciones)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for tabla in TABLAS:
+                    cursor.execute(f'ANALYZE {tabla}')
+        self.stdout.write(f'Eventos generados: {filas}')
+
+    def _tamano(self, tabla):
+        """(bytes de la tabla, bytes de sus índices)"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_table_size(%s), pg_indexes_size(%s)', [tabla, tabla])
+                return cursor.fetchone()
+            # SQLite: páginas por objeto según la tabla virtual dbstat
+            cursor.execute(
+                'SELECT name, SUM(pgsize) FROM dbstat WHERE name = %s OR name IN '
+                '(SELECT name FROM sqlite_master WHERE type = %s AND tbl_name = %s) GROUP BY name',
+                [tabla, 'index', tabla]
+            )
+            tamanos = dict(cursor.fetchall())
+        return tamanos.pop(tabla, 0), sum(tamanos.values())
+
+    def _reportar_tamanos(self):
+        texto = self._tamano('bench_evento_texto')
+        compacto = self._tamano('bench_evento_compacto')
+        descripcion = self._tamano('bench_evento_descripcion')
+        compacto_total = (compacto[0] + descripcion[0], compacto[1] + descripcion[1])
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Tamaño'))
+        self.stdout.write(f"  {'':<28}{'texto':>12}{'compacto':>12}{'ahorro':>9}")
+        for etiqueta, antes, despues in (
+            ('tabla de eventos', texto[0], compacto[0]),
+            ('índices de eventos', texto[1], compacto[1]),
+            ('total (con descripciones)', sum(texto), sum(compacto_total)),
+        ):
+            self.stdout.write(
+                f'  {etiqueta:<28}{self._mb(antes):>12}{self._mb(despues):>12}{self._ahorro(antes, despues):>9}'
+            )
+
+    def _reportar_consultas(self, repeticiones):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Lectura (mejor de {repeticiones})'))
+        self.stdout.write(f"  {'':<28}{'texto':>12}{'compacto':>12}{'ahorro':>9}")
+        with connection.cursor() as cursor:
+            for etiqueta, sentencias in CONSULTAS.items():
+                tiempos = []
+                for tabla in ('bench_evento_texto', 'bench_evento_compacto'):
+                    mejor = None
+                    for _ in range(repeticiones):
+                        inicio = time.perf_counter()
+                        cursor.execute(sentencias[tabla])
+                        cursor.fetchall()
+                        duracion = time.perf_counter() - inicio
+                        mejor = duracion if mejor is None else min(mejor, duracion)
+                    tiempos.append(mejor)
+                self.stdout.write(
+                    f'  {etiqueta:<28}{tiempos[0] * 1000:>9.1f} ms{tiempos[1] * 1000:>9.1f} ms'
+                    f'{self._ahorro(*tiempos):>9}'
+                )
+
+    @staticmethod
+    def _mb(valor):
+        return f'{valor / 1024 / 1024:.1f} MB'
+
+    @staticmethod
+    def _ahorro(antes, despues):
+        return f'{(1 - despues / antes) * 100:.0f}%' if antes else '-'
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api import allowlist
+
+
+class Command(BaseCommand):
+    help = (
+        'Construye los snapshots binarios de allowlist por departamento. '
+        'Por defecto solo reconstruye los que tienen cambios pendientes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departamento', type=int, help='Construir solo este departamento')
+        parser.add_argument('--bloom', action='store_true', help='Construir también la variante de filtro de Bloom')
+        parser.add_argument('--forzar', action='store_true', help='Reconstruir aunque el snapshot esté vigente')
+
+    def handle(self, *args, **options):
+        tipos = (allowlist.ORDENADA, allowlist.BLOOM) if options['bloom'] else (allowlist.ORDENADA,)
+        
+        departamento_ids = [options['departamento']] if options['departamento'] else None
+        construidos = allowlist.construir_pendientes(tipos, forzar=options['forzar'], departamento_ids=departamento_ids)
+        
+        for departamento_id, tipo in construidos:
+            self.stdout.write(f'  departamento {departamento_id}: {tipo}')
+        self.stdout.write(self.style.SUCCESS(f'Snapshots construidos: {len(construidos)}'))
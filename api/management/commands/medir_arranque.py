@@ -0,0 +1,123 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Script que se ejecuta en un proceso nuevo para medir un arranque en frío.
+# Recibe por variables de entorno si debe precalentar y el token JWT a usar.
+SCRIPT_HIJO = r'''
+import io, json, os, time
+from wsgiref.util import setup_testing_defaults
+
+tiempos = {}
+marca = time.perf_counter()
+
+def etapa(nombre):
+    global marca
+    ahora = time.perf_counter()
+    tiempos[nombre] = (ahora - marca) * 1000
+    marca = ahora
+
+os.environ['PRECALENTAR'] = '0'
+import django
+etapa('import_django')
+django.setup()
+etapa('django_setup')
+import rest_framework.views, rest_framework.viewsets
+etapa('import_drf')
+import rest_framework_simplejwt.authentication, rest_framework_simplejwt.serializers
+etapa('import_simplejwt')
+import api.views, api.urls
+etapa('import_api')
+from core.wsgi import application
+etapa('wsgi_application')
+
+if os.environ['MEDIR_PRECALENTAR'] == '1':
+    from api.warmup import precalentar
+    precalentar(application)
+    etapa('precalentamiento')
+
+def solicitud(ruta, token=None):
+    environ = {'PATH_INFO': ruta, 'REQUEST_METHOD': 'GET', 'wsgi.input': io.BytesIO()}
+    if token:
+        environ['HTTP_AUTHORIZATION'] = 'Bearer ' + token
+    setup_testing_defaults(environ)
+    estado = []
+    cuerpo = application(environ, lambda s, h, e=None: estado.append(s))
+    b''.join(cuerpo)
+    cuerpo.close()
+    return estado[0]
+
+solicitud('/api/info/')
+etapa('primera_solicitud_info')
+solicitud('/api/info/')
+etapa('segunda_solicitud_info')
+token = os.environ.get('MEDIR_TOKEN')
+if token:
+    solicitud('/api/sensores/', token)
+    etapa('primera_solicitud_sensores')
+    solicitud('/api/sensores/', token)
+    etapa('segunda_solicitud_sensores')
+
+print(json.dumps(tiempos))
+'''
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el tiempo de arranque de un worker en procesos nuevos: importaciones, '
+        'django.setup(), precalentamiento y latencia de las primeras solicitudes, '
+        'con y sin precalentamiento.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=3, help='Procesos por modo (se informa la mediana)')
+        parser.add_argument('--usuario', help='Usuario para medir también una solicitud autenticada a /api/sensores/')
+
+    def handle(self, *args, **options):
+        token = None
+        if options['usuario']:
+            from rest_framework_simplejwt.tokens import RefreshToken
+            try:
+                usuario = User.objects.get(username=options['usuario'])
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario '{options['usuario']}'")
+            token = str(RefreshToken.for_user(usuario).access_token)
+        
+        resultados = {}
+        for modo, precalentar in (('en frío', '0'), ('precalentado', '1')):
+            corridas = [self._medir(precalentar, token) for _ in range(options['repeticiones'])]
+            resultados[modo] = {
+                etapa: statistics.median(corrida[etapa] for corrida in corridas)
+                for etapa in corridas[0]
+            }
+        
+        etapas = list(resultados['precalentado'])
+        self.stdout.write(f"{'etapa (ms, mediana)':<30}{'en frío':>14}{'precalentado':>14}")
+        for etapa in etapas:
+            frio = resultados['en frío'].get(etapa)
+            self.stdout.write(
+                f"{etapa:<30}{'-' if frio is None else f'{frio:.1f}':>14}{resultados['precalentado'][etapa]:>14.1f}"
+            )
+
+    def _medir(self, precalentar, token):
+        entorno = dict(os.environ, MEDIR_PRECALENTAR=precalentar)
+        entorno.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+        if token:
+            entorno['MEDIR_TOKEN'] = token
+        proceso = subprocess.run(
+            [sys.executable, '-c', SCRIPT_HIJO],
+            cwd=settings.BASE_DIR,
+            env=entorno,
+            capture_output=True,
+            text=True,
+        )
+        if proceso.returncode != 0:
+            raise CommandError(f'El proceso de medición falló:\n{proceso.stderr}')
+        return json.loads(proceso.stdout.strip().splitlines()[-1])
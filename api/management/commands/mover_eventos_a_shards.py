@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import contadores, sharding
+
+
+class Command(BaseCommand):
+    help = "Mueve a su shard los eventos guardados en 'default' antes de activar EVENTO_SHARDS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000, help='Eventos por transacción')
+
+    def handle(self, *args, **options):
+        if not sharding.activo():
+            raise CommandError('EVENTO_SHARDS no está definido')
+        movidos = sharding.mover_desde_default(tamano_lote=options['lote'])
+        contadores.recalcular()
+        self.stdout.write(self.style.SUCCESS(f'Eventos movidos: {movidos}'))
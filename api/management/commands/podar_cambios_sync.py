@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.sync import podar_cambios
+
+
+class Command(BaseCommand):
+    help = 'Poda el registro de cambios de sincronización conservando la última entrada de cada objeto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Antigüedad mínima de las entradas a podar')
+
+    def handle(self, *args, **options):
+        eliminadas = podar_cambios(timezone.now() - timedelta(days=options['dias']))
+        self.stdout.write(self.style.SUCCESS(f'Entradas eliminadas: {eliminadas}'))
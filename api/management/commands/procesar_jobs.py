@@ -0,0 +1,109 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+# Las funciones que corren en el pool importan la app dentro del proceso hijo,
+# después de django.setup() (los procesos se crean con 'spawn')
+
+def _inicializar_proceso():
+    import django
+    django.setup()
+
+
+def _crear_pool(procesos):
+    contexto = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=_inicializar_proceso)
+
+
+def _ejecutar_job(job_id, trabajador):
+    from api import jobs
+    try:
+        jobs.ejecutar(job_id, trabajador)
+    finally:
+        connections.close_all()
+    return job_id
+
+
+class Command(BaseCommand):
+    help = (
+        'Procesa los jobs en segundo plano (ver api/jobs.py) con un pool de procesos. '
+        'Reclama jobs pendientes o abandonados y mantiene su latido mientras se ejecutan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=settings.JOBS_PROCESOS, help='Jobs simultáneos')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas de jobs nuevos')
+        parser.add_argument('--una-vez', action='store_true', help='Terminar cuando no queden jobs por procesar')
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
+        from api import jobs
+        from api.models import Job
+        
+        procesos = options['procesos']
+        trabajador = jobs.nombre_trabajador()
+        self.stdout.write(f'Trabajador {trabajador} con {procesos} procesos')
+        
+        pool = _crear_pool(procesos)
+        en_curso = {}
+        reemplazar = False
+        try:
+            while True:
+                for futuro in [futuro for futuro in en_curso if futuro.done()]:
+                    job_id = en_curso.pop(futuro)
+                    error = futuro.exception()
+                    if isinstance(error, BrokenProcessPool):
+                        # Un proceso del pool murió (por ejemplo, sin memoria): los jobs
+                        # que corrían en él vuelven a la cola desde su checkpoint
+                        reemplazar = True
+                        jobs.liberar(job_id, trabajador)
+                        self.stderr.write(f'Job {job_id}: el pool de procesos se interrumpió; se reintentará')
+                    elif error is not None:
+                        self.stderr.write(f'Job {job_id}: el proceso terminó con error: {error}')
+                    else:
+                        self.stdout.write(f'Job {job_id} terminado')
+                
+                if reemplazar:
+                    # Un pool interrumpido rechaza nuevos envíos: se reemplaza por uno nuevo
+                    for job_id in en_curso.values():
+                        jobs.liberar(job_id, trabajador)
+                    en_curso.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = _crear_pool(procesos)
+                    reemplazar = False
+                
+                while len(en_curso) < procesos:
+                    job = jobs.reclamar(trabajador)
+                    if job is None:
+                        break
+                    self.stdout.write(f'Job {job.pk} ({job.tipo}) iniciado, intento {job.intentos}')
+                    try:
+                        en_curso[pool.submit(_ejecutar_job, job.pk, trabajador)] = job.pk
+                    except BrokenProcessPool:
+                        jobs.liberar(job.pk, trabajador)
+                        reemplazar = True
+                        break
+                
+                if reemplazar and not en_curso:
+                    continue
+                if not en_curso:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+                
+                # Latido de los jobs en ejecución, aunque la tarea no informe avance
+                Job.objects.filter(
+                    pk__in=list(en_curso.values()), estado=Job.EN_PROCESO, trabajador=trabajador
+                ).update(latido=timezone.now())
+                wait(list(en_curso), timeout=options['intervalo'], return_when=FIRST_COMPLETED)
+        finally:
+            pool.shutdown()
+        
+        self.stdout.write(self.style.SUCCESS('Sin jobs pendientes'))
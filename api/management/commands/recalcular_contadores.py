@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from api import contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula con COUNT(*) exacto los contadores usados para estimar la paginación de eventos'
+
+    def handle(self, *args, **options):
+        recalculados = contadores.recalcular()
+        self.stdout.write(self.style.SUCCESS(f'Contadores recalculados: {recalculados}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api import ocupacion
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla de ocupación por departamento a partir del historial de eventos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Eventos leídos por lote')
+
+    def handle(self, *args, **options):
+        ocupantes = ocupacion.reconstruir(options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Ocupación reconstruida: {ocupantes} sensores dentro'))
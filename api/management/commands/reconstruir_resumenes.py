@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from api import resumenes
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen de eventos por hora usado por el histograma de eventos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Sumar solo las horas cerradas desde el último corte (para ejecutar cada hora)'
+        )
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            filas = resumenes.poner_al_dia()
+            self.stdout.write(self.style.SUCCESS(f'Resumen al día: {filas} filas sumadas'))
+            return
+        filas = resumenes.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido: {filas} filas'))
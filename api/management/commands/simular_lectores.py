@@ -0,0 +1,185 @@
+import json
+import os
+import re
+import signal
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.simulacion import OPERACIONES, Simulacion
+
+
+def _duracion(valor):
+    """'90', '90s', '30m' o '4h' en segundos"""
+    coincidencia = re.fullmatch(r'(\d+(?:\.\d+)?)([smh]?)', valor.strip())
+    if not coincidencia:
+        raise ValueError(valor)
+    cantidad, unidad = coincidencia.groups()
+    return float(cantidad) * {'': 1, 's': 1, 'm': 60, 'h': 3600}[unidad]
+
+
+def _minuto(valor):
+    """'HH:MM' en minutos desde la medianoche"""
+    horas, minutos = valor.strip().split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+def _ms(valor):
+    return '-' if valor is None else f'{valor:.1f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de larga duración: simula una flota de lectores RFID '
+        'repartidos en departamentos y barreras contra un servidor en ejecución '
+        '(login, sync, buscar_uids, eventos, estado de barreras). Las lecturas '
+        'aumentan en los cambios de turno e incluyen UID desconocidos, bloqueados '
+        'y perdidos. Informa throughput, percentiles de latencia y tasa de errores '
+        'por período y al final. El usuario debe tener rol Admin.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base del servidor')
+        parser.add_argument('--usuario', required=True, help='Usuario (rol Admin) con el que inician sesión los lectores')
+        parser.add_argument('--password', default=os.environ.get('SIMULADOR_PASSWORD'),
+                            help='Contraseña (por defecto la variable SIMULADOR_PASSWORD)')
+        parser.add_argument('--lectores', type=int, default=20, help='Lectores simulados')
+        parser.add_argument('--departamentos', type=int, default=5, help='Departamentos entre los que se reparten')
+        parser.add_argument('--duracion', default='1h', help='Duración de la corrida: 90s, 30m, 4h')
+        parser.add_argument('--reporte', default='60s', help='Período de los reportes intermedios')
+        parser.add_argument('--lecturas-por-minuto', type=float, default=6.0, help='Lecturas por lector fuera de los turnos')
+        parser.add_argument('--turnos', default='07:00,15:00,23:00', help='Horas de cambio de turno (vacío: sin picos)')
+        parser.add_argument('--factor-turno', type=float, default=6.0, help='Multiplicador de la tasa en un cambio de turno')
+        parser.add_argument('--ventana-turno', type=float, default=10.0, help='Ancho del pico de turno, en minutos simulados')
+        parser.add_argument('--hora-inicio', help='Hora simulada al comenzar, HH:MM (por defecto la hora actual)')
+        parser.add_argument('--escala', type=float, default=1.0, help='Minutos simulados por minuto real')
+        parser.add_argument('--desconocidos', type=float, default=0.03, help='Fracción de lecturas con UID inexistente')
+        parser.add_argument('--bloqueados', type=float, default=0.02, help='Fracción de lecturas de sensores bloqueados')
+        parser.add_argument('--perdidos', type=float, default=0.01, help='Fracción de lecturas de sensores perdidos')
+        parser.add_argument('--intervalo-catalogo', default='60s', help='Cada cuánto consulta cada lector los catálogos')
+        parser.add_argument('--apertura', type=float, default=4.0, help='Segundos que la barrera queda abierta')
+        parser.add_argument('--timeout', type=float, default=10.0, help='Timeout por solicitud, en segundos')
+        parser.add_argument('--reintentos', type=int, default=3, help='Reintentos ante timeout de las solicitudes GET')
+        parser.add_argument('--rampa', default='10s', help='Tiempo en que se reparte el arranque de los lectores')
+        parser.add_argument('--semilla', type=int, help='Semilla para repetir la misma secuencia de lecturas')
+        parser.add_argument('--preparar', action='store_true',
+                            help='Crear por la API los departamentos, barreras y sensores SIM-* que falten')
+        parser.add_argument('--barreras', type=int, default=2, help='Barreras por departamento con --preparar')
+        parser.add_argument('--sensores', type=int, default=200, help='Sensores por departamento con --preparar')
+        parser.add_argument('--salida', help='Archivo JSON Lines donde guardar cada reporte y el resumen final')
+
+    def handle(self, *args, **options):
+        if not options['password']:
+            raise CommandError('Indique --password o la variable SIMULADOR_PASSWORD')
+        if options['lectores'] < 1 or options['departamentos'] < 1:
+            raise CommandError('--lectores y --departamentos deben ser al menos 1')
+        try:
+            duracion = _duracion(options['duracion'])
+            reporte = _duracion(options['reporte'])
+            intervalo_catalogo = _duracion(options['intervalo_catalogo'])
+            rampa = _duracion(options['rampa'])
+        except ValueError as error:
+            raise CommandError(f'Duración inválida: {error}')
+        try:
+            turnos = [_minuto(turno) for turno in options['turnos'].split(',') if turno.strip()]
+            ahora = datetime.now()
+            hora_inicio = _minuto(options['hora_inicio']) if options['hora_inicio'] else ahora.hour * 60 + ahora.minute
+        except ValueError:
+            raise CommandError('Las horas deben tener el formato HH:MM')
+
+        simulacion = Simulacion(
+            options['url'], options['usuario'], options['password'],
+            lectores=options['lectores'],
+            lecturas_por_minuto=options['lecturas_por_minuto'],
+            turnos=turnos,
+            factor_turno=options['factor_turno'],
+            ventana_turno=options['ventana_turno'],
+            hora_inicio=hora_inicio,
+            escala=options['escala'],
+            desconocidos=options['desconocidos'],
+            bloqueados=options['bloqueados'],
+            perdidos=options['perdidos'],
+            intervalo_catalogo=intervalo_catalogo,
+            apertura=options['apertura'],
+            timeout=options['timeout'],
+            reintentos=options['reintentos'],
+            rampa=rampa,
+            semilla=options['semilla'],
+        )
+
+        cliente = simulacion.cliente()
+        if not cliente.iniciar_sesion():
+            raise CommandError(f"No se pudo iniciar sesión en {options['url']} como '{options['usuario']}'")
+        try:
+            nombres = None
+            if options['preparar']:
+                nombres = simulacion.preparar(
+                    cliente, options['departamentos'], options['barreras'], options['sensores'],
+                    informar=lambda texto: self.stdout.write(f'Datos de simulación creados: {texto}')
+                )
+            else:
+                simulacion.catalogo.sincronizar(cliente)
+        except RuntimeError as error:
+            raise CommandError(str(error))
+        finally:
+            cliente.cerrar()
+
+        departamentos = simulacion.elegir_departamentos(options['departamentos'], nombres)
+        if not departamentos:
+            raise CommandError('No hay departamentos con sensores activos; use --preparar')
+
+        self.stdout.write(
+            f"{options['lectores']} lectores en {len(departamentos)} departamentos contra {options['url']} "
+            f"durante {duracion:.0f} s (semilla {simulacion.semilla}). Ctrl+C termina antes."
+        )
+        salida = open(options['salida'], 'a', encoding='utf-8') if options['salida'] else None
+
+        def informar(resumen):
+            self._reportar_periodo(resumen)
+            if salida:
+                salida.write(json.dumps({'tipo': 'periodo', **resumen}) + '\n')
+                salida.flush()
+
+        anterior = signal.signal(signal.SIGINT, lambda *args: simulacion.detener.set())
+        try:
+            resumen = simulacion.ejecutar(departamentos, duracion, reporte, informar)
+        finally:
+            signal.signal(signal.SIGINT, anterior)
+
+        self._reportar_final(resumen)
+        if salida:
+            salida.write(json.dumps({'tipo': 'final', **resumen}) + '\n')
+            salida.close()
+
+    def _reportar_periodo(self, r):
+        minuto = int(r['minuto_simulado'])
+        self.stdout.write(
+            f"[{int(r['transcurrido']) // 3600:02d}:{int(r['transcurrido']) % 3600 // 60:02d}:"
+            f"{int(r['transcurrido']) % 60:02d} | reloj {minuto // 60:02d}:{minuto % 60:02d}] "
+            f"{r['por_segundo']:7.1f} sol/s {r['eventos_por_segundo']:6.1f} ev/s "
+            f"err {r['tasa_error'] * 100:5.2f}% "
+            f"p50 {_ms(r['p50_ms'])} p95 {_ms(r['p95_ms'])} p99 {_ms(r['p99_ms'])} ms"
+        )
+
+    def _reportar_final(self, r):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Resumen ({r['lectores']} lectores, {r['departamentos']} departamentos, {r['segundos']:.0f} s)"
+        ))
+        self.stdout.write(
+            f"  {'operación':<12}{'intentos':>10}{'sol/s':>9}{'rechazos':>10}{'errores':>9}{'timeouts':>10}"
+            f"{'reint.':>8}{'err %':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>10}"
+        )
+        filas = [(operacion, r['operaciones'][operacion]) for operacion in OPERACIONES if operacion in r['operaciones']]
+        filas.append(('total', r))
+        for nombre, o in filas:
+            self.stdout.write(
+                f"  {nombre:<12}{o['intentos']:>10}{o['por_segundo']:>9.1f}{o['rechazos']:>10}{o['errores']:>9}"
+                f"{o['timeouts']:>10}{o['reintentos']:>8}{o['tasa_error'] * 100:>8.2f}"
+                f"{_ms(o['p50_ms']):>9}{_ms(o['p95_ms']):>9}{_ms(o['p99_ms']):>9}{_ms(o['max_ms']):>10}"
+            )
+        self.stdout.write(f"  eventos registrados: {r['eventos_por_segundo']:.1f}/s")
+        self.stdout.write(
+            '  lecturas: ' + ', '.join(f'{clase} {cantidad}' for clase, cantidad in sorted(r['lecturas'].items()))
+        )
+        if r.get('minimo_por_segundo') is not None:
+            self.stdout.write(f"  throughput sostenido (peor período): {r['minimo_por_segundo']:.1f} sol/s")
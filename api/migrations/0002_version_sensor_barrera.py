@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 01:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barrera',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sensor',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0 on 2026-10-19 01:34
+
+from django.db import migrations, models
+
+
+TAMANO_LOTE = 2000
+
+
+def sembrar_cambios(apps, schema_editor):
+    """Registra las filas existentes para que since=0 entregue un snapshot completo"""
+    CambioSync = apps.get_model('api', 'CambioSync')
+    db = schema_editor.connection.alias
+    for modelo in ('departamento', 'barrera', 'sensor'):
+        Modelo = apps.get_model('api', modelo)
+        ids = Modelo.objects.using(db).order_by('pk').values_list('pk', flat=True)
+        lote = []
+        for objeto_id in ids.iterator(chunk_size=TAMANO_LOTE):
+            lote.append(CambioSync(modelo=modelo, objeto_id=objeto_id, operacion='actualizado'))
+            if len(lote) >= TAMANO_LOTE:
+                CambioSync.objects.using(db).bulk_create(lote)
+                lote = []
+        if lote:
+            CambioSync.objects.using(db).bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_version_sensor_barrera'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioSync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('sensor', 'Sensor'), ('barrera', 'Barrera'), ('departamento', 'Departamento')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('operacion', models.CharField(choices=[('actualizado', 'Creado o actualizado'), ('eliminado', 'Eliminado')], max_length=20)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de sincronización',
+                'verbose_name_plural': 'Cambios de sincronización',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(sembrar_cambios, migrations.RunPython.noop),
+    ]
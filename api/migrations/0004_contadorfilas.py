@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-19 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_cambiosync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorFilas',
+            fields=[
+                ('clave', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('total', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de filas',
+                'verbose_name_plural': 'Contadores de filas',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 01:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_contadorfilas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo_evento',
+            field=models.CharField(choices=[('acceso', 'Acceso con sensor'), ('manual_abierto', 'Apertura manual'), ('manual_cerrado', 'Cierre manual'), ('anomalia', 'Anomalía detectada')], default='acceso', max_length=20),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-19 01:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_evento_tipo_anomalia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barrera',
+            name='sentido',
+            field=models.CharField(choices=[('entrada', 'Entrada'), ('salida', 'Salida'), ('bidireccional', 'Bidireccional')], default='bidireccional', help_text='Sentido de paso que registran los lectores de la barrera', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='barrera',
+            field=models.ForeignKey(blank=True, help_text='Barrera donde se leyó el sensor (opcional)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.barrera'),
+        ),
+        migrations.CreateModel(
+            name='Presencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_entrada', models.DateTimeField()),
+                ('departamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presencias', to='api.departamento')),
+                ('sensor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='presencia', to='api.sensor')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='presencias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Presencia',
+                'verbose_name_plural': 'Presencias',
+                'ordering': ['fecha_entrada'],
+                'indexes': [models.Index(fields=['departamento', 'fecha_entrada'], name='api_presenc_departa_2fbf24_idx')],
+            },
+        ),
+    ]
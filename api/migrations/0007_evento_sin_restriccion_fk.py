@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-19 01:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_presencia_sentido_barrera'),
+    ]
+
+    # Sin restricción FK solo con shards de eventos (ver Evento.sensor en api/models.py)
+    operations = [
+        migrations.AlterField(
+            model_name='evento',
+            name='barrera',
+            field=models.ForeignKey(blank=True, db_constraint=not settings.EVENTO_SHARDS, help_text='Barrera donde se leyó el sensor (opcional)', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.barrera'),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='sensor',
+            field=models.ForeignKey(db_constraint=not settings.EVENTO_SHARDS, on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='api.sensor'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 6.0 on 2026-10-19 01:52
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models, transaction
+
+
+TAMANO_LOTE = 2000
+
+
+def completar_departamento(apps, schema_editor):
+    """
+    Copia a los eventos existentes el departamento de su sensor, por lotes de
+    TAMANO_LOTE filas confirmados por separado. Para eventos anteriores a esta
+    migración se usa el departamento actual del sensor.
+    """
+    Evento = apps.get_model('api', 'Evento')
+    Sensor = apps.get_model('api', 'Sensor')
+    db = schema_editor.connection.alias
+    # Los shards de eventos no tienen la tabla de sensores (ver api/sharding.py)
+    origen = DEFAULT_DB_ALIAS if db in settings.EVENTO_SHARDS else db
+    departamentos = dict(Sensor.objects.using(origen).values_list('pk', 'departamento_id'))
+    
+    ultimo = 0
+    while True:
+        lote = list(
+            Evento.objects.using(db)
+            .filter(pk__gt=ultimo, departamento__isnull=True)
+            .order_by('pk')
+            .values_list('pk', 'sensor_id')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo = lote[-1][0]
+        
+        por_departamento = defaultdict(list)
+        for evento_id, sensor_id in lote:
+            por_departamento[departamentos.get(sensor_id)].append(evento_id)
+        with transaction.atomic(using=db):
+            for departamento_id, ids in por_departamento.items():
+                if departamento_id is not None:
+                    Evento.objects.using(db).filter(pk__in=ids).update(departamento_id=departamento_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_evento_sin_restriccion_fk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='departamento',
+            field=models.ForeignKey(blank=True, db_constraint=not settings.EVENTO_SHARDS, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to='api.departamento'),
+        ),
+        migrations.RunPython(
+            completar_departamento,
+            migrations.RunPython.noop,
+            hints={'model_name': 'evento'}
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['departamento', '-fecha'], name='api_evento_departa_b7ccda_idx'),
+        ),
+    ]
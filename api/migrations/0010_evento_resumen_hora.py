@@ -0,0 +1,70 @@
+# Generated by Django 6.0 on 2026-10-19 01:59
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def completar_resumen(apps, schema_editor):
+    """
+    Resume los eventos existentes de esta base de datos hasta la hora actual,
+    que queda como corte del resumen (ver api/resumenes.py). Con sharding los
+    eventos están en los shards: el resumen se completa después con
+    `python manage.py reconstruir_resumenes`.
+    """
+    if settings.EVENTO_SHARDS:
+        return
+    Evento = apps.get_model('api', 'Evento')
+    EventoResumenHora = apps.get_model('api', 'EventoResumenHora')
+    ContadorFilas = apps.get_model('api', 'ContadorFilas')
+    db = schema_editor.connection.alias
+    corte = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    filas = (
+        Evento.objects.using(db).filter(fecha__lt=corte).order_by()
+        .annotate(hora=TruncHour('fecha', tzinfo=timezone.utc))
+        .values_list('hora', 'departamento_id', 'tipo_evento', 'resultado')
+        .annotate(total=Count('pk'))
+    )
+    EventoResumenHora.objects.using(db).bulk_create(
+        (
+            EventoResumenHora(
+                hora=hora, departamento_id=departamento_id,
+                tipo_evento=tipo_evento, resultado=resultado, total=total
+            )
+            for hora, departamento_id, tipo_evento, resultado, total in filas.iterator()
+        ),
+        batch_size=2000
+    )
+    ContadorFilas.objects.using(db).update_or_create(clave='resumen:corte', defaults={'total': int(corte.timestamp())})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoResumenHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('tipo_evento', models.CharField(choices=[('acceso', 'Acceso con sensor'), ('manual_abierto', 'Apertura manual'), ('manual_cerrado', 'Cierre manual'), ('anomalia', 'Anomalía detectada')], max_length=20)),
+                ('resultado', models.CharField(choices=[('permitido', 'Permitido'), ('denegado', 'Denegado')], max_length=20)),
+                ('total', models.BigIntegerField(default=0)),
+                ('departamento', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='api.departamento')),
+            ],
+            options={
+                'verbose_name': 'Resumen horario de eventos',
+                'verbose_name_plural': 'Resúmenes horarios de eventos',
+                'indexes': [models.Index(fields=['departamento', 'hora'], name='api_eventor_departa_724ce0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hora', 'departamento', 'tipo_evento', 'resultado'), name='resumen_hora_unico')],
+            },
+        ),
+        migrations.RunPython(completar_resumen, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,174 @@
+# Generated by Django 6.0 on 2026-10-19 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+from django.db.models import Case, OuterRef, Subquery, Value, When
+
+import api.fields
+
+
+TAMANO_LOTE = 5000
+
+# Copia de Evento.TIPO_EVENTO_CODIGOS y Evento.RESULTADO_CODIGOS al momento de esta migración
+TIPO_EVENTO_CODIGOS = {'acceso': 1, 'manual_abierto': 2, 'manual_cerrado': 3, 'anomalia': 4}
+RESULTADO_CODIGOS = {'permitido': 1, 'denegado': 2}
+
+
+def _codigo(campo, codigos):
+    return Case(
+        *[When(**{campo: valor}, then=Value(codigo)) for valor, codigo in codigos.items()],
+        output_field=models.PositiveSmallIntegerField()
+    )
+
+
+def _valor(campo, codigos):
+    return Case(
+        *[When(**{campo: codigo}, then=Value(valor)) for valor, codigo in codigos.items()],
+        output_field=models.CharField()
+    )
+
+
+def _lotes(eventos):
+    """Rangos consecutivos de TAMANO_LOTE eventos"""
+    ultimo = 0
+    while True:
+        ids = list(eventos.filter(pk__gt=ultimo).order_by('pk').values_list('pk', flat=True)[:TAMANO_LOTE])
+        if not ids:
+            break
+        yield eventos.filter(pk__gte=ids[0], pk__lte=ids[-1])
+        ultimo = ids[-1]
+
+
+def compactar_eventos(apps, schema_editor):
+    """
+    Convierte tipo_evento y resultado a sus códigos y copia las descripciones
+    no vacías a EventoDescripcion, por lotes de TAMANO_LOTE eventos
+    confirmados por separado.
+    """
+    Evento = apps.get_model('api', 'Evento')
+    EventoDescripcion = apps.get_model('api', 'EventoDescripcion')
+    db = schema_editor.connection.alias
+    eventos = Evento.objects.using(db)
+
+    desconocidos = set(
+        eventos.exclude(tipo_evento__in=TIPO_EVENTO_CODIGOS).values_list('tipo_evento', flat=True).distinct()
+    ) | set(
+        eventos.exclude(resultado__in=RESULTADO_CODIGOS).values_list('resultado', flat=True).distinct()
+    )
+    if desconocidos:
+        raise ValueError(f'Valores sin código en api_evento ({db}): {sorted(desconocidos)}')
+
+    tipo_evento = _codigo('tipo_evento', TIPO_EVENTO_CODIGOS)
+    resultado = _codigo('resultado', RESULTADO_CODIGOS)
+    for lote in _lotes(eventos):
+        with transaction.atomic(using=db):
+            lote.update(tipo_evento_codigo=tipo_evento, resultado_codigo=resultado)
+            EventoDescripcion.objects.using(db).bulk_create(
+                EventoDescripcion(evento_id=evento_id, texto=texto)
+                for evento_id, texto in (
+                    lote.exclude(descripcion__isnull=True).exclude(descripcion='')
+                    .values_list('pk', 'descripcion')
+                )
+            )
+
+
+def expandir_eventos(apps, schema_editor):
+    """
+    Inverso de compactar_eventos: reconstruye tipo_evento y resultado a partir
+    de sus códigos y descripcion desde EventoDescripcion, por lotes de
+    TAMANO_LOTE eventos confirmados por separado.
+    """
+    Evento = apps.get_model('api', 'Evento')
+    EventoDescripcion = apps.get_model('api', 'EventoDescripcion')
+    db = schema_editor.connection.alias
+    eventos = Evento.objects.using(db)
+
+    tipo_evento = _valor('tipo_evento_codigo', TIPO_EVENTO_CODIGOS)
+    resultado = _valor('resultado_codigo', RESULTADO_CODIGOS)
+    descripcion = Subquery(
+        EventoDescripcion.objects.using(db).filter(evento_id=OuterRef('pk')).values('texto')[:1]
+    )
+    for lote in _lotes(eventos):
+        with transaction.atomic(using=db):
+            lote.update(tipo_evento=tipo_evento, resultado=resultado, descripcion=descripcion)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0010_evento_resumen_hora'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoDescripcion',
+            fields=[
+                ('evento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='detalle', serialize=False, to='api.evento')),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'verbose_name': 'Descripción de evento',
+                'verbose_name_plural': 'Descripciones de eventos',
+            },
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='tipo_evento_codigo',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='evento',
+            name='resultado_codigo',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        # Sin NOT NULL antes de quitarlas, para que al revertir se puedan volver
+        # a agregar con filas existentes y expandir_eventos las complete
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo_evento',
+            field=models.CharField(choices=[('acceso', 'Acceso con sensor'), ('manual_abierto', 'Apertura manual'), ('manual_cerrado', 'Cierre manual'), ('anomalia', 'Anomalía detectada')], default='acceso', max_length=20, null=True),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='resultado',
+            field=models.CharField(choices=[('permitido', 'Permitido'), ('denegado', 'Denegado')], max_length=20, null=True),
+        ),
+        migrations.RunPython(
+            compactar_eventos,
+            expandir_eventos,
+            hints={'model_name': 'evento'}
+        ),
+        migrations.RemoveField(
+            model_name='evento',
+            name='tipo_evento',
+        ),
+        migrations.RemoveField(
+            model_name='evento',
+            name='resultado',
+        ),
+        migrations.RemoveField(
+            model_name='evento',
+            name='descripcion',
+        ),
+        migrations.RenameField(
+            model_name='evento',
+            old_name='tipo_evento_codigo',
+            new_name='tipo_evento',
+        ),
+        migrations.RenameField(
+            model_name='evento',
+            old_name='resultado_codigo',
+            new_name='resultado',
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='tipo_evento',
+            field=api.fields.CodigoField(choices=[('acceso', 'Acceso con sensor'), ('manual_abierto', 'Apertura manual'), ('manual_cerrado', 'Cierre manual'), ('anomalia', 'Anomalía detectada')], codigos={'acceso': 1, 'anomalia': 4, 'manual_abierto': 2, 'manual_cerrado': 3}, default='acceso'),
+        ),
+        migrations.AlterField(
+            model_name='evento',
+            name='resultado',
+            field=api.fields.CodigoField(choices=[('permitido', 'Permitido'), ('denegado', 'Denegado')], codigos={'denegado': 2, 'permitido': 1}),
+        ),
+    ]
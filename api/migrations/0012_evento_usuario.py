@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-19 02:09
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, migrations, models, transaction
+
+
+TAMANO_LOTE = 2000
+
+
+def completar_usuario(apps, schema_editor):
+    """
+    Copia a los eventos existentes el usuario asociado de su sensor, por lotes
+    de TAMANO_LOTE filas confirmados por separado. Para eventos anteriores a
+    esta migración se usa el usuario asociado actual del sensor.
+    """
+    Evento = apps.get_model('api', 'Evento')
+    Sensor = apps.get_model('api', 'Sensor')
+    db = schema_editor.connection.alias
+    # Los shards de eventos no tienen la tabla de sensores (ver api/sharding.py)
+    origen = DEFAULT_DB_ALIAS if db in settings.EVENTO_SHARDS else db
+    usuarios = dict(
+        Sensor.objects.using(origen).filter(usuario_asociado__isnull=False).values_list('pk', 'usuario_asociado_id')
+    )
+    if not usuarios:
+        return
+    
+    ultimo = 0
+    while True:
+        lote = list(
+            Evento.objects.using(db)
+            .filter(pk__gt=ultimo)
+            .order_by('pk')
+            .values_list('pk', 'sensor_id')[:TAMANO_LOTE]
+        )
+        if not lote:
+            break
+        ultimo = lote[-1][0]
+        
+        por_usuario = defaultdict(list)
+        for evento_id, sensor_id in lote:
+            if sensor_id in usuarios:
+                por_usuario[usuarios[sensor_id]].append(evento_id)
+        with transaction.atomic(using=db):
+            for usuario_id, ids in por_usuario.items():
+                Evento.objects.using(db).filter(pk__in=ids).update(usuario_id=usuario_id)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0011_evento_compacto'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evento',
+            name='usuario',
+            field=models.ForeignKey(blank=True, db_constraint=not settings.EVENTO_SHARDS, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='eventos', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(
+            completar_usuario,
+            migrations.RunPython.noop,
+            hints={'model_name': 'evento'}
+        ),
+        migrations.AddIndex(
+            model_name='evento',
+            index=models.Index(fields=['usuario', '-fecha'], name='api_evento_usuario_f68430_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_evento_usuario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sensor',
+            name='fecha_eliminacion',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
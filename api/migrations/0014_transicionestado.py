@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-19 02:25
+
+import api.fields
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_sensor_fecha_eliminacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entidad', api.fields.CodigoField(choices=[('sensor', 'Sensor'), ('barrera', 'Barrera')], codigos={'barrera': 2, 'sensor': 1})),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('estado_anterior', api.fields.CodigoField(blank=True, choices=[('activo', 'Activo'), ('inactivo', 'Inactivo'), ('bloqueado', 'Bloqueado'), ('perdido', 'Perdido'), ('abierta', 'Abierta'), ('cerrada', 'Cerrada')], codigos={'abierta': 5, 'activo': 1, 'bloqueado': 3, 'cerrada': 6, 'inactivo': 2, 'perdido': 4}, null=True)),
+                ('estado_nuevo', api.fields.CodigoField(choices=[('activo', 'Activo'), ('inactivo', 'Inactivo'), ('bloqueado', 'Bloqueado'), ('perdido', 'Perdido'), ('abierta', 'Abierta'), ('cerrada', 'Cerrada')], codigos={'abierta': 5, 'activo': 1, 'bloqueado': 3, 'cerrada': 6, 'inactivo': 2, 'perdido': 4})),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transición de estado',
+                'verbose_name_plural': 'Transiciones de estado',
+                'ordering': ['-fecha', '-id'],
+                'indexes': [models.Index(fields=['entidad', 'objeto_id', '-fecha', '-id'], name='api_transic_entidad_953f0e_idx')],
+            },
+        ),
+    ]
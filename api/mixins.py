@@ -0,0 +1,263 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import cache as respuestas
+from . import db_routers
+from . import historial as historial_estados
+from . import resumenes
+from .permissions import obtener_rol
+from .serializers import TransicionEstadoSerializer
+
+
+def etag_version(instancia):
+    """ETag fuerte a partir del contador de versión del objeto"""
+    return f'"{instancia.version}"'
+
+
+def version_if_match(request):
+    """
+    Obtiene la versión esperada desde el header If-Match ('"3"' o 'W/"3"').
+    Retorna None si el header no viene o es '*'.
+    """
+    valor = request.headers.get('If-Match', '').strip()
+    if not valor or valor == '*':
+        return None
+    if valor.startswith('W/'):
+        valor = valor[2:]
+    try:
+        return int(valor.strip('"'))
+    except ValueError:
+        raise serializers.ValidationError({'If-Match': 'Debe contener la versión entregada en el ETag'})
+
+
+def status_conflicto(conflicto):
+    """412 si falló la versión de If-Match, 409 si solo cambió el estado"""
+    if conflicto.version_distinta:
+        return status.HTTP_412_PRECONDITION_FAILED
+    return status.HTTP_409_CONFLICT
+
+
+class VersionETagMixin:
+    """Agrega el header ETag (versión del objeto) al detalle de un recurso versionado"""
+    
+    def retrieve(self, request, *args, **kwargs):
+        instancia = self.get_object()
+        serializer = self.get_serializer(instancia)
+        response = Response(serializer.data)
+        response['ETag'] = etag_version(instancia)
+        return response
+
+
+class HistorialEstadoMixin:
+    """
+    Historial de cambios de estado de sensores y barreras (ver api/historial.py).
+    Atribuye las altas y ediciones hechas por la API al usuario de la solicitud
+    y agrega las acciones estado_en e historial.
+    """
+    
+    def perform_create(self, serializer):
+        with historial_estados.usuario_actual(self.request.user):
+            super().perform_create(serializer)
+    
+    def perform_update(self, serializer):
+        with historial_estados.usuario_actual(self.request.user):
+            super().perform_update(serializer)
+    
+    @action(detail=True, methods=['get'])
+    def estado_en(self, request, pk=None):
+        """
+        Estado del objeto en una fecha, con una búsqueda indexada en el historial
+        GET /api/barreras/{id}/estado_en/?fecha=2026-10-19T03:12:00
+        Respuesta: {"id": 3, "fecha": "...", "estado": "cerrada", "desde": "...", "usuario": 1}
+        (desde y usuario son los de la transición que fijó el estado; nulos si es anterior al historial)
+        """
+        if not request.query_params.get('fecha'):
+            return Response(
+                {"error": "El parámetro 'fecha' es requerido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            fecha = resumenes.leer_fecha(request.query_params['fecha'], 'fecha')
+        except resumenes.HistogramaInvalido as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        instancia = self.get_object()
+        resultado = historial_estados.estado_en(instancia, fecha)
+        if resultado is None:
+            return Response(
+                {"error": "El objeto no existía en esa fecha"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        estado, transicion = resultado
+        return Response({
+            "id": instancia.pk,
+            "fecha": fecha,
+            "estado": estado,
+            "desde": transicion.fecha if transicion else None,
+            "usuario": transicion.usuario_id if transicion else None,
+        })
+    
+    @action(detail=True, methods=['get'])
+    def historial(self, request, pk=None):
+        """
+        Cambios de estado del objeto, del más reciente al más antiguo
+        GET /api/barreras/{id}/historial/?desde=2026-10-01&hasta=2026-10-19
+        """
+        instancia = self.get_object()
+        transiciones = historial_estados.transiciones(instancia).select_related('usuario')
+        try:
+            if request.query_params.get('desde'):
+                transiciones = transiciones.filter(fecha__gte=resumenes.leer_fecha(request.query_params['desde'], 'desde'))
+            if request.query_params.get('hasta'):
+                transiciones = transiciones.filter(fecha__lt=resumenes.leer_fecha(request.query_params['hasta'], 'hasta'))
+        except resumenes.HistogramaInvalido as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        pagina = self.paginate_queryset(transiciones)
+        serializer = TransicionEstadoSerializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class LecturaReplicaMixin:
+    """
+    Envía las lecturas de los métodos seguros (GET, HEAD, OPTIONS) de la vista
+    a las réplicas configuradas, salvo que el usuario haya escrito hace poco
+    (ver api/db_routers.py). La autenticación y los permisos se resuelven
+    antes, siempre contra la primaria.
+    """
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in permissions.SAFE_METHODS and not db_routers.debe_leer_primaria(request):
+            self._token_replica = db_routers.activar_replica()
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_token_replica', None)
+        if token is not None:
+            db_routers.desactivar_replica(token)
+            self._token_replica = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class RespuestaCacheMixin:
+    """
+    Cachea las respuestas de list y retrieve. La clave incluye la ruta, los
+    parámetros de consulta normalizados, el rol del usuario y la versión de
+    cada etiqueta de `cache_etiquetas` (ver api/cache.py).
+    """
+    cache_etiquetas = ()
+    
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(super().list, request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(super().retrieve, request, *args, **kwargs)
+    
+    def _respuesta_cacheada(self, vista, request, *args, **kwargs):
+        clave = respuestas.clave_respuesta(request, self.cache_etiquetas, obtener_rol(request))
+        guardada = respuestas.obtener_respuesta(clave)
+        if guardada is not None:
+            datos, etag = guardada
+            response = Response(datos)
+            if etag:
+                response['ETag'] = etag
+            return response
+        
+        response = vista(request, *args, **kwargs)
+        if response.status_code == 200:
+            respuestas.guardar_respuesta(clave, (response.data, response.get('ETag')))
+        return response
+
+
+def _rutas_de_campo(campo, modelo, prefijo):
+    """
+    Relaciones y columnas que necesita un campo de serializer. Retorna
+    (relaciones, columnas), o columnas=None si su source no se puede resolver
+    a columnas del modelo; las relaciones recorridas hasta ese punto se
+    mantienen.
+    """
+    relaciones, columnas = set(), set()
+    if campo.source == '*':
+        return relaciones, None
+    
+    actual = modelo
+    ruta = []
+    partes = campo.source.split('.')
+    for indice, parte in enumerate(partes):
+        if parte.startswith('get_') and parte.endswith('_display'):
+            parte = parte[len('get_'):-len('_display')]
+        try:
+            field = actual._meta.get_field(parte)
+        except FieldDoesNotExist:
+            return relaciones, None
+        ruta.append(field.name)
+        es_ultimo = indice == len(partes) - 1
+        
+        if field.is_relation and not (field.many_to_one or field.one_to_one):
+            return relaciones, None
+        if field.is_relation and (not es_ultimo or isinstance(campo, serializers.BaseSerializer)):
+            relacion = prefijo + '__'.join(ruta)
+            relaciones.add(relacion)
+            columnas.add(relacion)
+            actual = field.related_model
+            if es_ultimo:
+                anidadas, columnas_anidadas = _rutas_de_campos(campo.fields, actual, relacion + '__')
+                relaciones |= anidadas
+                if columnas_anidadas is None:
+                    return relaciones, None
+                columnas |= columnas_anidadas
+        elif es_ultimo:
+            columnas.add(prefijo + '__'.join(ruta))
+        else:
+            return relaciones, None
+    return relaciones, columnas
+
+
+def _rutas_de_campos(fields, modelo, prefijo=''):
+    """
+    Calcula las relaciones a seguir con select_related y las columnas a cargar
+    con only() para serializar `fields`. Retorna (relaciones, columnas), o
+    columnas=None si algún campo no se puede resolver a columnas del modelo
+    (una propiedad, source='*' o una relación inversa); las relaciones de
+    todos los campos se calculan igual.
+    """
+    relaciones, columnas = set(), set()
+    for campo in fields.values():
+        if campo.write_only:
+            continue
+        relaciones_campo, columnas_campo = _rutas_de_campo(campo, modelo, prefijo)
+        relaciones |= relaciones_campo
+        if columnas is not None and columnas_campo is not None:
+            columnas |= columnas_campo
+        else:
+            columnas = None
+    return relaciones, columnas
+
+
+class CamposDinamicosViewMixin:
+    """
+    Ajusta el queryset a los campos pedidos con ?fields= y ?expand= (ver
+    CamposDinamicosMixin en api/serializers.py): solo se hacen los JOIN y se
+    leen las columnas que la respuesta necesita.
+    """
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        parametros = self.request.query_params
+        if self.request.method not in ('GET', 'HEAD') or not (parametros.get('fields') or parametros.get('expand')):
+            return queryset
+        
+        serializer = self.get_serializer()
+        relaciones, columnas = _rutas_de_campos(serializer.fields, queryset.model)
+        # Solo con only() se descartan los JOIN de la vista (only() no admite
+        # seguir relaciones diferidas); sin él se conservan y se suman los pedidos
+        recortar = bool(parametros.get('fields')) and columnas is not None
+        if recortar:
+            queryset = queryset.select_related(None)
+        if relaciones:
+            queryset = queryset.select_related(*relaciones)
+        if recortar:
+            queryset = queryset.only(queryset.model._meta.pk.name, *columnas)
+        return queryset
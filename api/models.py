@@ -1,7 +1,55 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinLengthValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from .fields import CodigoField
+
+
+class ModeloVersionado(models.Model):
+    """
+    Modelo abstracto con un contador de versión para control de concurrencia
+    optimista. La versión se incrementa en cada save() y en cada cambio de
+    estado condicional (ver api/estados.py), y se expone como ETag.
+    
+    Recuerda además los valores leídos de la base de datos, para que los
+    receptores de post_save detecten qué cambió (valor_original).
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda los valores leídos de la base de datos para detectar cambios al guardar"""
+        instancia = super().from_db(db, field_names, values)
+        instancia._valores_originales = dict(zip(field_names, values))
+        return instancia
+    
+    def valor_original(self, campo):
+        """Valor de `campo` tal como se leyó de la base de datos (None si es nuevo)"""
+        return getattr(self, '_valores_originales', {}).get(campo)
+    
+    def recordar_valores(self, campos=None):
+        """Toma los valores actuales de `campos` (todos por defecto) como los guardados en la base de datos"""
+        campos = [self._meta.get_field(campo) for campo in campos] if campos else self._meta.concrete_fields
+        originales = getattr(self, '_valores_originales', {})
+        originales.update({
+            campo.attname: self.__dict__[campo.attname] for campo in campos if campo.attname in self.__dict__
+        })
+        self._valores_originales = originales
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'version' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['version']
+        super().save(*args, **kwargs)
+        self.recordar_valores(kwargs.get('update_fields'))
 
 
 class Departamento(models.Model):
@@ -72,8 +120,21 @@ class PerfilUsuario(models.Model):
         return f"{self.user.username} - {self.rol}"
 
 
-class Sensor(models.Model):
-    """Modelo para representar sensores RFID en el sistema"""
+class SensorManager(models.Manager):
+    """Excluye los sensores eliminados que esperan la purga de sus eventos"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(fecha_eliminacion__isnull=True)
+
+
+class Sensor(ModeloVersionado):
+    """
+    Modelo para representar sensores RFID en el sistema.
+    
+    El borrado es lógico (marcar_eliminado): el sensor deja de aparecer en
+    Sensor.objects y la tarea 'purgar_sensores' (api/tareas.py) borra sus
+    eventos por lotes y al final la fila. Sensor.todos incluye los eliminados.
+    """
     ACTIVO = 'activo'
     INACTIVO = 'inactivo'
     BLOQUEADO = 'bloqueado'
@@ -111,12 +172,25 @@ class Sensor(models.Model):
     )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_eliminacion = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    objects = SensorManager()
+    todos = models.Manager()
     
     class Meta:
         verbose_name = 'Sensor'
         verbose_name_plural = 'Sensores'
         ordering = ['-fecha_creacion']
     
+    def marcar_eliminado(self):
+        """
+        Borrado lógico: oculta el sensor y lo saca de la ocupación actual. Sus
+        eventos se mantienen hasta que los purga la tarea 'purgar_sensores'.
+        """
+        self.fecha_eliminacion = timezone.now()
+        self.save(update_fields=['fecha_eliminacion', 'fecha_actualizacion'])
+        Presencia.objects.filter(sensor_id=self.pk).delete()
+    
     def clean(self):
         """Validación personalizada"""
         if self.estado == self.PERDIDO and self.usuario_asociado:
@@ -126,16 +200,47 @@ class Sensor(models.Model):
         return f"Sensor {self.uid} - {self.get_estado_display()}"
 
 
+class EventoQuerySet(models.QuerySet):
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        """
+        Completa el departamento y el usuario desnormalizados también en las
+        inserciones masivas y guarda las descripciones de los que la tienen
+        """
+        objs = list(objs)
+        Evento.asignar_datos_del_sensor(objs)
+        creados = super().bulk_create(objs, *args, **kwargs)
+        if not kwargs.get('ignore_conflicts') and not kwargs.get('update_conflicts'):
+            EventoDescripcion.objects.using(self.db).bulk_create(
+                EventoDescripcion(evento=evento, texto=evento.descripcion)
+                for evento in creados if getattr(evento, '_descripcion', None)
+            )
+        return creados
+    
+    def create(self, **kwargs):
+        """
+        Sin using() explícito el router elige la base de datos a partir de la
+        instancia, para que cada evento llegue a su shard (ver api/sharding.py)
+        """
+        if self._db is not None:
+            return super().create(**kwargs)
+        evento = self.model(**kwargs)
+        evento.save(force_insert=True)
+        return evento
+
+
 class Evento(models.Model):
     """Modelo para registrar eventos de acceso del sistema"""
     ACCESO = 'acceso'
     MANUAL_ABIERTO = 'manual_abierto'
     MANUAL_CERRADO = 'manual_cerrado'
+    ANOMALIA = 'anomalia'
     
     TIPO_EVENTO_CHOICES = [
         (ACCESO, 'Acceso con sensor'),
         (MANUAL_ABIERTO, 'Apertura manual'),
         (MANUAL_CERRADO, 'Cierre manual'),
+        (ANOMALIA, 'Anomalía detectada'),
     ]
     
     PERMITIDO = 'permitido'
@@ -146,22 +251,60 @@ class Evento(models.Model):
         (DENEGADO, 'Denegado'),
     ]
     
+    # Códigos guardados en la base de datos (ver CodigoField): no cambiarlos ni reutilizarlos
+    TIPO_EVENTO_CODIGOS = {ACCESO: 1, MANUAL_ABIERTO: 2, MANUAL_CERRADO: 3, ANOMALIA: 4}
+    RESULTADO_CODIGOS = {PERMITIDO: 1, DENEGADO: 2}
+    
+    # Con sharding (api/sharding.py) los eventos viven en otra base de datos que
+    # sensores, barreras, departamentos y usuarios: las FK se crean sin
+    # restricción en la base de datos. Sin shards se mantienen las restricciones.
     sensor = models.ForeignKey(
         Sensor,
         on_delete=models.CASCADE,
-        related_name='eventos'
+        related_name='eventos',
+        db_constraint=not settings.EVENTO_SHARDS
     )
-    tipo_evento = models.CharField(
-        max_length=20,
+    tipo_evento = CodigoField(
         choices=TIPO_EVENTO_CHOICES,
+        codigos=TIPO_EVENTO_CODIGOS,
         default=ACCESO
     )
-    resultado = models.CharField(
-        max_length=20,
-        choices=RESULTADO_CHOICES
+    resultado = CodigoField(
+        choices=RESULTADO_CHOICES,
+        codigos=RESULTADO_CODIGOS
+    )
+    barrera = models.ForeignKey(
+        'Barrera',
+        on_delete=models.SET_NULL,
+        related_name='eventos',
+        null=True,
+        blank=True,
+        db_constraint=not settings.EVENTO_SHARDS,
+        help_text='Barrera donde se leyó el sensor (opcional)'
+    )
+    # Departamento del sensor al momento del evento (desnormalizado para filtrar sin JOIN)
+    departamento = models.ForeignKey(
+        Departamento,
+        on_delete=models.SET_NULL,
+        related_name='eventos',
+        null=True,
+        blank=True,
+        editable=False,
+        db_constraint=not settings.EVENTO_SHARDS
+    )
+    # Usuario asociado al sensor al momento del evento (historial de accesos por usuario)
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='eventos',
+        null=True,
+        blank=True,
+        editable=False,
+        db_constraint=not settings.EVENTO_SHARDS
     )
     fecha = models.DateTimeField(auto_now_add=True)
-    descripcion = models.TextField(blank=True, null=True)
+    
+    objects = EventoQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Evento'
@@ -170,13 +313,100 @@ class Evento(models.Model):
         indexes = [
             models.Index(fields=['-fecha']),
             models.Index(fields=['sensor', '-fecha']),
+            models.Index(fields=['departamento', '-fecha']),
+            models.Index(fields=['usuario', '-fecha']),
         ]
     
+    @staticmethod
+    def asignar_datos_del_sensor(eventos):
+        """
+        Asigna a los eventos nuevos el departamento y el usuario asociado de su
+        sensor, con una consulta para los sensores no cargados
+        """
+        pendientes = [evento for evento in eventos if evento.departamento_id is None and evento.sensor_id is not None]
+        sin_cargar = {
+            evento.sensor_id for evento in pendientes
+            if not Evento.sensor.is_cached(evento)
+        }
+        sensores = {
+            sensor_id: (departamento_id, usuario_id)
+            for sensor_id, departamento_id, usuario_id in Sensor.objects.filter(pk__in=sin_cargar).values_list(
+                'pk', 'departamento_id', 'usuario_asociado_id'
+            )
+        } if sin_cargar else {}
+        for evento in pendientes:
+            if Evento.sensor.is_cached(evento):
+                departamento_id, usuario_id = evento.sensor.departamento_id, evento.sensor.usuario_asociado_id
+            else:
+                departamento_id, usuario_id = sensores.get(evento.sensor_id, (None, None))
+            evento.departamento_id = departamento_id
+            if evento.usuario_id is None:
+                evento.usuario_id = usuario_id
+    
+    @property
+    def descripcion(self):
+        """Texto opcional del evento, guardado aparte en EventoDescripcion solo cuando existe"""
+        if hasattr(self, '_descripcion'):
+            return self._descripcion
+        try:
+            return self.detalle.texto
+        except EventoDescripcion.DoesNotExist:
+            return None
+    
+    @descripcion.setter
+    def descripcion(self, texto):
+        self._descripcion = texto or None
+    
+    def guardar_descripcion(self, creado):
+        """Crea, actualiza o elimina la fila de EventoDescripcion según la descripción asignada"""
+        if not hasattr(self, '_descripcion'):
+            if creado:
+                # Un evento nuevo sin descripción asignada no la tiene: evita consultarla después
+                self._descripcion = None
+            return
+        detalles = EventoDescripcion.objects.using(self._state.db)
+        if self._descripcion is None:
+            if not creado:
+                detalles.filter(evento=self).delete()
+        elif creado:
+            detalles.create(evento=self, texto=self._descripcion)
+        else:
+            detalles.update_or_create(evento=self, defaults={'texto': self._descripcion})
+    
+    def save(self, *args, **kwargs):
+        creado = self._state.adding
+        if creado:
+            Evento.asignar_datos_del_sensor([self])
+        super().save(*args, **kwargs)
+        self.guardar_descripcion(creado)
+    
     def __str__(self):
         return f"{self.get_tipo_evento_display()} - {self.get_resultado_display()} ({self.fecha.strftime('%Y-%m-%d %H:%M')})"
 
 
-class Barrera(models.Model):
+class EventoDescripcion(models.Model):
+    """
+    Descripción de un evento. Se guarda en una tabla aparte, solo para los
+    eventos que la tienen, para que la tabla de eventos mantenga filas de
+    tamaño fijo. Con sharding vive en el mismo shard que su evento.
+    """
+    evento = models.OneToOneField(
+        Evento,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='detalle'
+    )
+    texto = models.TextField()
+    
+    class Meta:
+        verbose_name = 'Descripción de evento'
+        verbose_name_plural = 'Descripciones de eventos'
+    
+    def __str__(self):
+        return self.texto
+
+
+class Barrera(ModeloVersionado):
     """Modelo para representar barreras de acceso"""
     ABIERTA = 'abierta'
     CERRADA = 'cerrada'
@@ -186,6 +416,16 @@ class Barrera(models.Model):
         (CERRADA, 'Cerrada'),
     ]
     
+    ENTRADA = 'entrada'
+    SALIDA = 'salida'
+    BIDIRECCIONAL = 'bidireccional'
+    
+    SENTIDO_CHOICES = [
+        (ENTRADA, 'Entrada'),
+        (SALIDA, 'Salida'),
+        (BIDIRECCIONAL, 'Bidireccional'),
+    ]
+    
     nombre = models.CharField(
         max_length=100,
         unique=True,
@@ -203,6 +443,12 @@ class Barrera(models.Model):
         null=True,
         blank=True
     )
+    sentido = models.CharField(
+        max_length=20,
+        choices=SENTIDO_CHOICES,
+        default=BIDIRECCIONAL,
+        help_text='Sentido de paso que registran los lectores de la barrera'
+    )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
@@ -213,3 +459,248 @@ class Barrera(models.Model):
     
     def __str__(self):
         return f"{self.nombre} - {self.get_estado_display()}"
+
+
+class CambioSync(models.Model):
+    """
+    Registro append-only de cambios en Sensor, Barrera y Departamento.
+    Su id es el cursor monotónico que usan los controladores de borde para
+    sincronizarse de forma incremental (GET /api/sync/?since=<cursor>).
+    """
+    SENSOR = 'sensor'
+    BARRERA = 'barrera'
+    DEPARTAMENTO = 'departamento'
+    
+    MODELO_CHOICES = [
+        (SENSOR, 'Sensor'),
+        (BARRERA, 'Barrera'),
+        (DEPARTAMENTO, 'Departamento'),
+    ]
+    
+    ACTUALIZADO = 'actualizado'
+    ELIMINADO = 'eliminado'
+    
+    OPERACION_CHOICES = [
+        (ACTUALIZADO, 'Creado o actualizado'),
+        (ELIMINADO, 'Eliminado'),
+    ]
+    
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.PositiveBigIntegerField()
+    operacion = models.CharField(max_length=20, choices=OPERACION_CHOICES)
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Cambio de sincronización'
+        verbose_name_plural = 'Cambios de sincronización'
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"#{self.id} {self.modelo} {self.objeto_id} {self.operacion}"
+
+
+class TransicionEstado(models.Model):
+    """
+    Historial append-only de los cambios de estado de sensores y barreras
+    (ver api/historial.py). Cada fila ocupa unos pocos bytes: la entidad y los
+    estados se guardan como enteros pequeños (CodigoField). El índice
+    (entidad, objeto_id, -fecha) resuelve "en qué estado estaba X en tal
+    fecha" con una sola búsqueda.
+    """
+    SENSOR = 'sensor'
+    BARRERA = 'barrera'
+    
+    ENTIDAD_CHOICES = [
+        (SENSOR, 'Sensor'),
+        (BARRERA, 'Barrera'),
+    ]
+    
+    # Códigos guardados en la base de datos (ver CodigoField): no cambiarlos ni reutilizarlos
+    ENTIDAD_CODIGOS = {SENSOR: 1, BARRERA: 2}
+    ESTADO_CODIGOS = {
+        Sensor.ACTIVO: 1, Sensor.INACTIVO: 2, Sensor.BLOQUEADO: 3, Sensor.PERDIDO: 4,
+        Barrera.ABIERTA: 5, Barrera.CERRADA: 6,
+    }
+    ESTADO_CHOICES = Sensor.ESTADO_CHOICES + Barrera.ESTADO_CHOICES
+    
+    entidad = CodigoField(choices=ENTIDAD_CHOICES, codigos=ENTIDAD_CODIGOS)
+    objeto_id = models.PositiveBigIntegerField()
+    # Nulo en el alta del objeto
+    estado_anterior = CodigoField(choices=ESTADO_CHOICES, codigos=ESTADO_CODIGOS, null=True, blank=True)
+    estado_nuevo = CodigoField(choices=ESTADO_CHOICES, codigos=ESTADO_CODIGOS)
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        related_name='+',
+        null=True,
+        blank=True
+    )
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Transición de estado'
+        verbose_name_plural = 'Transiciones de estado'
+        ordering = ['-fecha', '-id']
+        indexes = [
+            models.Index(fields=['entidad', 'objeto_id', '-fecha', '-id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.entidad} {self.objeto_id}: {self.estado_anterior} -> {self.estado_nuevo} ({self.fecha:%Y-%m-%d %H:%M})"
+
+
+class ContadorFilas(models.Model):
+    """
+    Contadores mantenidos de filas de Evento, usados para estimar el total de
+    resultados en la paginación sin ejecutar COUNT(*) (ver api/contadores.py).
+    La clave identifica el filtro: 'evento', 'evento:resultado=permitido', etc.
+    """
+    clave = models.CharField(max_length=100, primary_key=True)
+    total = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Contador de filas'
+        verbose_name_plural = 'Contadores de filas'
+    
+    def __str__(self):
+        return f"{self.clave}: {self.total}"
+
+
+class EventoResumenHora(models.Model):
+    """
+    Número de eventos por hora (UTC), departamento, tipo y resultado de las
+    horas anteriores al corte del resumen. Se construye por tramos desde los
+    eventos, fuera de las inserciones, y permite calcular histogramas por hora,
+    día o semana leyendo de la tabla de eventos solo la cola posterior al
+    corte (ver api/resumenes.py).
+    """
+    hora = models.DateTimeField()
+    departamento = models.ForeignKey(
+        Departamento,
+        on_delete=models.DO_NOTHING,
+        related_name='+',
+        null=True,
+        blank=True,
+        db_constraint=False
+    )
+    tipo_evento = models.CharField(max_length=20, choices=Evento.TIPO_EVENTO_CHOICES)
+    resultado = models.CharField(max_length=20, choices=Evento.RESULTADO_CHOICES)
+    total = models.BigIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Resumen horario de eventos'
+        verbose_name_plural = 'Resúmenes horarios de eventos'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hora', 'departamento', 'tipo_evento', 'resultado'],
+                name='resumen_hora_unico'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['departamento', 'hora']),
+        ]
+    
+    def __str__(self):
+        return f"{self.hora:%Y-%m-%d %H:00} {self.tipo_evento}/{self.resultado}: {self.total}"
+
+
+class Presencia(models.Model):
+    """
+    Ocupación actual: un sensor (y su usuario asociado) dentro de un
+    departamento. Se mantiene de forma incremental al registrar eventos de
+    acceso permitidos (ver api/ocupacion.py); un sensor está como máximo en
+    un departamento a la vez.
+    """
+    sensor = models.OneToOneField(
+        Sensor,
+        on_delete=models.CASCADE,
+        related_name='presencia'
+    )
+    departamento = models.ForeignKey(
+        Departamento,
+        on_delete=models.CASCADE,
+        related_name='presencias'
+    )
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='presencias'
+    )
+    fecha_entrada = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Presencia'
+        verbose_name_plural = 'Presencias'
+        ordering = ['fecha_entrada']
+        indexes = [
+            models.Index(fields=['departamento', 'fecha_entrada']),
+        ]
+    
+    def __str__(self):
+        return f"Sensor {self.sensor_id} en {self.departamento_id} desde {self.fecha_entrada:%Y-%m-%d %H:%M}"
+
+
+class Job(models.Model):
+    """
+    Trabajo pesado ejecutado fuera de las solicitudes HTTP por
+    `python manage.py procesar_jobs` (ver api/jobs.py). Guarda el avance y un
+    checkpoint por bloque procesado para poder reanudarse si el proceso muere.
+    """
+    PENDIENTE = 'pendiente'
+    EN_PROCESO = 'en_proceso'
+    COMPLETADO = 'completado'
+    FALLIDO = 'fallido'
+    CANCELADO = 'cancelado'
+    
+    ESTADO_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (EN_PROCESO, 'En proceso'),
+        (COMPLETADO, 'Completado'),
+        (FALLIDO, 'Fallido'),
+        (CANCELADO, 'Cancelado'),
+    ]
+    
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default=PENDIENTE
+    )
+    progreso = models.PositiveBigIntegerField(default=0)
+    total = models.PositiveBigIntegerField(null=True, blank=True)
+    checkpoint = models.JSONField(null=True, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    intentos = models.PositiveIntegerField(default=0)
+    trabajador = models.CharField(max_length=100, blank=True, default='')
+    latido = models.DateTimeField(null=True, blank=True)
+    creado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='jobs'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_creacion']),
+        ]
+    
+    def __str__(self):
+        return f"Job #{self.id} {self.tipo} ({self.get_estado_display()})"
+    
+    @property
+    def porcentaje(self):
+        if not self.total:
+            return 100.0 if self.estado == self.COMPLETADO else None
+        return round(min(self.progreso, self.total) * 100 / self.total, 1)
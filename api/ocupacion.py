@@ -0,0 +1,106 @@
+"""
+Ocupación (presencia) por departamento, mantenida de forma incremental.
+
+Cada evento de acceso permitido actualiza la tabla Presencia:
+
+- Leído en una barrera de entrada: el sensor entra al departamento.
+- Leído en una barrera de salida: el sensor sale del departamento.
+- Barrera bidireccional o sin barrera: alterna entrada y salida.
+
+El departamento es el de la barrera, o el del evento (el del sensor al
+registrarse) si no indica barrera. Al entrar a un departamento el sensor deja de figurar en el
+anterior. `python manage.py reconstruir_ocupacion` recalcula la tabla desde
+el historial de eventos.
+"""
+from django.db import transaction
+
+from . import sharding
+from .models import Barrera, Evento, Presencia
+
+
+def _departamento_y_sentido(evento):
+    barrera = evento.barrera if evento.barrera_id else None
+    if barrera is not None and barrera.departamento_id is not None:
+        return barrera.departamento_id, barrera.sentido
+    return evento.departamento_id, (barrera.sentido if barrera else Barrera.BIDIRECCIONAL)
+
+
+def _es_acceso(evento):
+    return evento.tipo_evento == Evento.ACCESO and evento.resultado == Evento.PERMITIDO
+
+
+def transicion(actual, departamento_id, sentido):
+    """
+    Calcula si el sensor queda dentro de `departamento_id` tras el evento.
+    `actual` es el departamento donde está el sensor (None si no está en ninguno).
+    """
+    if sentido == Barrera.ENTRADA:
+        return True
+    if sentido == Barrera.SALIDA:
+        return False
+    return actual != departamento_id
+
+
+def registrar_evento(evento):
+    """Actualiza la presencia a partir de un evento recién creado"""
+    if not _es_acceso(evento):
+        return
+    
+    departamento_id, sentido = _departamento_y_sentido(evento)
+    sensor = evento.sensor
+    with transaction.atomic():
+        actual = (
+            Presencia.objects.select_for_update()
+            .filter(sensor_id=sensor.pk)
+            .values_list('departamento_id', flat=True)
+            .first()
+        )
+        if transicion(actual, departamento_id, sentido):
+            if actual is None:
+                Presencia.objects.create(
+                    sensor_id=sensor.pk,
+                    departamento_id=departamento_id,
+                    usuario_id=sensor.usuario_asociado_id,
+                    fecha_entrada=evento.fecha
+                )
+            else:
+                Presencia.objects.filter(sensor_id=sensor.pk).update(
+                    departamento_id=departamento_id,
+                    usuario_id=sensor.usuario_asociado_id,
+                    fecha_entrada=evento.fecha
+                )
+        elif actual == departamento_id:
+            Presencia.objects.filter(sensor_id=sensor.pk).delete()
+
+
+def reconstruir(tamano_lote=5000):
+    """Recalcula toda la tabla Presencia recorriendo los accesos permitidos en orden"""
+    dentro = {}
+    eventos = (
+        Evento.objects.filter(tipo_evento=Evento.ACCESO, resultado=Evento.PERMITIDO)
+        .select_related('sensor', 'barrera')
+        .only(
+            'fecha', 'tipo_evento', 'resultado', 'sensor_id', 'barrera_id', 'departamento_id',
+            'sensor__usuario_asociado_id',
+            'barrera__departamento_id', 'barrera__sentido',
+        )
+        .order_by('fecha', 'id')
+    )
+    for evento in sharding.iterar(eventos, tamano_lote):
+        departamento_id, sentido = _departamento_y_sentido(evento)
+        actual = dentro.get(evento.sensor_id)
+        actual_departamento = actual.departamento_id if actual else None
+        if transicion(actual_departamento, departamento_id, sentido):
+            dentro[evento.sensor_id] = Presencia(
+                sensor_id=evento.sensor_id,
+                departamento_id=departamento_id,
+                usuario_id=evento.sensor.usuario_asociado_id,
+                fecha_entrada=evento.fecha
+            )
+        elif actual_departamento == departamento_id:
+            del dentro[evento.sensor_id]
+    
+    with transaction.atomic():
+        Presencia.objects.all().delete()
+        Presencia.objects.bulk_create(dentro.values(), batch_size=tamano_lote)
+    return len(dentro)
@@ -0,0 +1,78 @@
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+from . import contadores
+
+
+class ConteoEstimadoPaginator(Paginator):
+    """
+    Paginator que evita el COUNT(*) exacto usando contadores.estimar().
+    
+    Cada página se lee con una fila extra para saber si hay una siguiente;
+    al llegar a la última página el total se corrige con el valor real.
+    Si no hay estimación disponible, o es menor que UMBRAL_EXACTO, se usa
+    el conteo exacto.
+    """
+    UMBRAL_EXACTO = 10000
+    
+    estimado = False
+    
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            total = contadores.estimar(self.object_list)
+            if total is not None and total >= self.UMBRAL_EXACTO:
+                self.estimado = True
+                return total
+        return super().count
+    
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('El número de página no es un entero')
+        if number < 1:
+            raise EmptyPage('El número de página es menor que 1')
+        return number
+    
+    def page(self, number):
+        number = self.validate_number(number)
+        inferior = (number - 1) * self.per_page
+        filas = list(self.object_list[inferior:inferior + self.per_page + 1])
+        hay_siguiente = len(filas) > self.per_page
+        filas = filas[:self.per_page]
+        
+        if not filas and number > 1:
+            raise EmptyPage('La página no contiene resultados')
+        
+        # Ajustar el total estimado con lo observado en esta página
+        if not hay_siguiente:
+            self.count = inferior + len(filas)
+            self.estimado = False
+        elif self.count <= inferior + self.per_page:
+            self.count = inferior + self.per_page + 1
+        return self._get_page(filas, number, self)
+
+
+class ConteoEstimadoPagination(PageNumberPagination):
+    """
+    Paginación de la API con total estimado para tablas grandes.
+    Con ?conteo_exacto=1 se calcula el COUNT(*) exacto.
+    La respuesta indica con 'count_estimado' si el total es aproximado.
+    """
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        exacto = request.query_params.get('conteo_exacto') in ('1', 'true')
+        self.django_paginator_class = Paginator if exacto else ConteoEstimadoPaginator
+        return super().paginate_queryset(queryset, request, view)
+    
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_estimado': getattr(self.page.paginator, 'estimado', False),
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
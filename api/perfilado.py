@@ -0,0 +1,302 @@
+"""
+Perfilado de solicitudes bajo demanda y por muestreo.
+
+- Bajo demanda: un Admin (permiso IsAdminOnly) agrega el encabezado
+  `X-Perfilar: 1` o el parámetro `?perfilar=1`. El perfil se guarda y su id
+  se devuelve en el encabezado `X-Perfil-Id`; con el valor `respuesta` el
+  perfil reemplaza el cuerpo de la respuesta.
+- Muestreo: con settings.PERFILADO_MUESTREO = N > 0 se perfila 1 de cada N
+  solicitudes del proceso.
+
+Los perfiles se guardan como JSON en settings.PERFILADO_DIR, un anillo que
+conserva los últimos settings.PERFILADO_MAX_ARCHIVOS. Cada perfil incluye:
+
+- funciones: tiempos por función de cProfile (las más costosas).
+- sql: sentencias con duración, base de datos y plan EXPLAIN. Los parámetros
+  se usan para el EXPLAIN pero no se guardan.
+- serializers: tiempo acumulado por campo de serializer (el tiempo de un
+  serializer anidado incluye el de sus campos). Solo se cronometran los
+  serializers que la vista perfilada obtiene con get_serializer(): el
+  middleware ejecuta esa vista con una subclase que los instrumenta, sin
+  modificar las clases que usan las demás solicitudes.
+"""
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+from rest_framework.request import Request
+from rest_framework.generics import GenericAPIView
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.settings import api_settings
+
+from .permissions import IsAdminOnly
+
+
+MAX_FUNCIONES = 50
+MAX_SENTENCIAS = 500
+MAX_EXPLAIN = 20
+
+_campos = ContextVar('perfilado_campos', default=None)
+_contador = itertools.count(1)
+_serializers_cronometrados = {}
+_vistas_cronometradas = {}
+
+
+class _CampoCronometrado:
+    """Envuelve un campo de serializer y acumula el tiempo de su lectura y representación"""
+
+    def __init__(self, campo, registro, serializer):
+        self._campo = campo
+        self._registro = registro
+        self._clave = f'{serializer}.{campo.field_name}'
+
+    def __getattr__(self, nombre):
+        return getattr(self._campo, nombre)
+
+    def _medir(self, metodo, valor):
+        inicio = time.perf_counter()
+        try:
+            return metodo(valor)
+        finally:
+            datos = self._registro.setdefault(self._clave, {'llamadas': 0, 'ms': 0.0})
+            datos['llamadas'] += 1
+            datos['ms'] += (time.perf_counter() - inicio) * 1000
+
+    def get_attribute(self, instance):
+        return self._medir(self._campo.get_attribute, instance)
+
+    def to_representation(self, value):
+        return self._medir(self._campo.to_representation, value)
+
+
+def _cronometrar(serializer):
+    """
+    Cambia la clase de `serializer` (o del hijo de un ListSerializer) por una
+    subclase que cronometra sus campos, incluidos los serializers anidados.
+    Solo afecta a esa instancia.
+    """
+    if isinstance(serializer, ListSerializer):
+        _cronometrar(serializer.child)
+        return serializer
+    if not isinstance(serializer, Serializer) or getattr(serializer, '_cronometrado', False):
+        return serializer
+    clase = type(serializer)
+    if clase not in _serializers_cronometrados:
+        def _readable_fields(self):
+            registro = _campos.get()
+            for campo in super(subclase, self)._readable_fields:
+                if registro is None:
+                    yield campo
+                else:
+                    _cronometrar(campo)
+                    yield _CampoCronometrado(campo, registro, clase.__name__)
+
+        subclase = type(clase.__name__, (clase,), {'_readable_fields': property(_readable_fields), '_cronometrado': True})
+        _serializers_cronometrados[clase] = subclase
+    serializer.__class__ = _serializers_cronometrados[clase]
+    return serializer
+
+
+def _vista_cronometrada(vista):
+    """
+    Vista equivalente a `vista` (de DRF) cuyos serializers, obtenidos con
+    get_serializer(), cronometran sus campos
+    """
+    clase = vista.cls
+    if clase not in _vistas_cronometradas:
+        def get_serializer(self, *args, **kwargs):
+            return _cronometrar(super(subclase, self).get_serializer(*args, **kwargs))
+
+        subclase = type(clase.__name__, (clase,), {'get_serializer': get_serializer})
+        _vistas_cronometradas[clase] = subclase
+    if getattr(vista, 'actions', None) is not None:
+        return _vistas_cronometradas[clase].as_view(vista.actions, **vista.initkwargs)
+    return _vistas_cronometradas[clase].as_view(**vista.initkwargs)
+
+
+class _RegistroSQL:
+    """execute_wrapper que anota cada sentencia con su duración"""
+
+    def __init__(self, alias, sentencias):
+        self.alias = alias
+        self.sentencias = sentencias
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if len(self.sentencias) < MAX_SENTENCIAS:
+                self.sentencias.append({
+                    'db': self.alias,
+                    'sql': sql,
+                    'params': None if many else params,
+                    'ms': round((time.perf_counter() - inicio) * 1000, 3),
+                })
+
+
+def _explicar(sentencias):
+    """Agrega el plan EXPLAIN a las primeras sentencias SELECT distintas"""
+    planes = {}
+    for sentencia in sentencias:
+        if not sentencia['sql'].lstrip().upper().startswith('SELECT'):
+            continue
+        clave = (sentencia['db'], sentencia['sql'])
+        if clave not in planes:
+            if len(planes) >= MAX_EXPLAIN:
+                continue
+            conexion = connections[sentencia['db']]
+            try:
+                with conexion.cursor() as cursor:
+                    cursor.execute(f"{conexion.ops.explain_query_prefix()} {sentencia['sql']}", sentencia['params'])
+                    planes[clave] = [' '.join(str(valor) for valor in fila) for fila in cursor.fetchall()]
+            except Exception as error:
+                planes[clave] = [f'EXPLAIN no disponible: {error}']
+        sentencia['explain'] = planes[clave]
+
+
+def _funciones(perfilador):
+    estadisticas = pstats.Stats(perfilador, stream=io.StringIO())
+    filas = []
+    for (archivo, linea, funcion), (_, llamadas, propio, acumulado, _) in estadisticas.stats.items():
+        filas.append({
+            'funcion': f'{archivo}:{linea}({funcion})',
+            'llamadas': llamadas,
+            'ms_propio': round(propio * 1000, 3),
+            'ms_acumulado': round(acumulado * 1000, 3),
+        })
+    filas.sort(key=lambda fila: fila['ms_acumulado'], reverse=True)
+    return filas[:MAX_FUNCIONES]
+
+
+def perfilar(request, get_response):
+    """Ejecuta la solicitud bajo el perfilador; retorna (response, perfil)"""
+    sentencias, campos = [], {}
+    perfilador = cProfile.Profile()
+    token = _campos.set(campos)
+    envoltorios = []
+    for alias in connections:
+        envoltorio = connections[alias].execute_wrapper(_RegistroSQL(alias, sentencias))
+        envoltorio.__enter__()
+        envoltorios.append(envoltorio)
+
+    inicio = time.perf_counter()
+    try:
+        perfilador.enable()
+        response = get_response(request)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+    finally:
+        perfilador.disable()
+        duracion = time.perf_counter() - inicio
+        for envoltorio in reversed(envoltorios):
+            envoltorio.__exit__(None, None, None)
+        _campos.reset(token)
+
+    _explicar(sentencias)
+    # Los parámetros pueden traer datos personales o credenciales: solo se guarda el SQL
+    for sentencia in sentencias:
+        del sentencia['params']
+    perfil = {
+        'id': f'{time.time_ns()}-{uuid.uuid4().hex[:8]}',
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'metodo': request.method,
+        'ruta': request.get_full_path(),
+        'status': response.status_code,
+        'ms': round(duracion * 1000, 3),
+        'funciones': _funciones(perfilador),
+        'sql': sentencias,
+        'serializers': {
+            campo: {'llamadas': datos['llamadas'], 'ms': round(datos['ms'], 3)}
+            for campo, datos in sorted(campos.items(), key=lambda item: item[1]['ms'], reverse=True)
+        },
+    }
+    return response, perfil
+
+
+def guardar(perfil):
+    """Escribe el perfil en el anillo de disco y descarta los más antiguos"""
+    os.makedirs(settings.PERFILADO_DIR, exist_ok=True)
+    ruta = os.path.join(settings.PERFILADO_DIR, f"perfil-{perfil['id']}.json")
+    temporal = ruta + '.tmp'
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(perfil, archivo, ensure_ascii=False, default=str)
+    os.replace(temporal, ruta)
+
+    for antiguo in listar()[settings.PERFILADO_MAX_ARCHIVOS:]:
+        try:
+            os.remove(os.path.join(settings.PERFILADO_DIR, f'perfil-{antiguo}.json'))
+        except FileNotFoundError:
+            pass
+
+
+def listar():
+    """Ids de los perfiles guardados, del más reciente al más antiguo"""
+    try:
+        nombres = os.listdir(settings.PERFILADO_DIR)
+    except FileNotFoundError:
+        return []
+    ids = [nombre[len('perfil-'):-len('.json')] for nombre in nombres if nombre.startswith('perfil-') and nombre.endswith('.json')]
+    return sorted(ids, key=lambda perfil_id: int(perfil_id.split('-')[0]), reverse=True)
+
+
+def leer(perfil_id):
+    """Perfil guardado con ese id, o None"""
+    if perfil_id not in listar():
+        return None
+    with open(os.path.join(settings.PERFILADO_DIR, f'perfil-{perfil_id}.json'), encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _modo_solicitado(request):
+    return request.headers.get('X-Perfilar') or request.GET.get('perfilar')
+
+
+def _es_admin(request):
+    """Autentica la solicitud como lo hace DRF y aplica IsAdminOnly"""
+    autenticadores = [clase() for clase in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        return IsAdminOnly().has_permission(Request(request, authenticators=autenticadores), None)
+    except Exception:
+        return False
+
+
+class PerfiladoMiddleware:
+    """Perfila las solicitudes pedidas por un Admin y 1 de cada PERFILADO_MUESTREO"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        modo = _modo_solicitado(request)
+        if modo and modo != '0' and _es_admin(request):
+            response, perfil = perfilar(request, self.get_response)
+            guardar(perfil)
+            if modo == 'respuesta':
+                return JsonResponse(perfil, json_dumps_params={'ensure_ascii': False, 'default': str})
+            response['X-Perfil-Id'] = perfil['id']
+            return response
+
+        muestreo = settings.PERFILADO_MUESTREO
+        if muestreo > 0 and next(_contador) % muestreo == 0:
+            response, perfil = perfilar(request, self.get_response)
+            guardar(perfil)
+            return response
+
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """En una solicitud perfilada, ejecuta la vista DRF con sus serializers cronometrados"""
+        clase = getattr(view_func, 'cls', None)
+        if _campos.get() is None or clase is None or not issubclass(clase, GenericAPIView):
+            return None
+        return _vista_cronometrada(view_func)(request, *view_args, **view_kwargs)
@@ -2,6 +2,20 @@ from rest_framework import permissions
 from .models import PerfilUsuario, Rol
 
 
+def obtener_rol(request):
+    """
+    Nombre del rol del usuario autenticado (None si no tiene perfil).
+    Se consulta una sola vez por solicitud y queda memorizado en ella.
+    """
+    if not hasattr(request, '_rol_usuario'):
+        request._rol_usuario = (
+            PerfilUsuario.objects.filter(user=request.user)
+            .values_list('rol__nombre', flat=True)
+            .first()
+        )
+    return request._rol_usuario
+
+
 class IsAdminOrReadOnly(permissions.BasePermission):
     """
     Permiso personalizado que permite:
@@ -20,11 +34,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return True
         
         # Para métodos de escritura, verificar si es Admin
-        try:
-            perfil = PerfilUsuario.objects.get(user=request.user)
-            return perfil.rol.nombre == Rol.ADMIN
-        except PerfilUsuario.DoesNotExist:
-            return False
+        return obtener_rol(request) == Rol.ADMIN
 
 
 class IsAdminOnly(permissions.BasePermission):
@@ -38,11 +48,7 @@ class IsAdminOnly(permissions.BasePermission):
             return False
         
         # Verificar si es Admin
-        try:
-            perfil = PerfilUsuario.objects.get(user=request.user)
-            return perfil.rol.nombre == Rol.ADMIN
-        except PerfilUsuario.DoesNotExist:
-            return False
+        return obtener_rol(request) == Rol.ADMIN
 
 
 class IsOwnerOrAdmin(permissions.BasePermission):
@@ -62,12 +68,8 @@ class IsOwnerOrAdmin(permissions.BasePermission):
             return True
         
         # Verificar si es Admin
-        try:
-            perfil = PerfilUsuario.objects.get(user=request.user)
-            if perfil.rol.nombre == Rol.ADMIN:
-                return True
-        except PerfilUsuario.DoesNotExist:
-            pass
+        if obtener_rol(request) == Rol.ADMIN:
+            return True
         
         # Verificar si es el propietario (para PerfilUsuario)
         if hasattr(obj, 'user'):
@@ -0,0 +1,331 @@
+"""
+Resumen de eventos por hora e histogramas por intervalos de tiempo.
+
+EventoResumenHora guarda el número de eventos por hora (UTC), departamento,
+tipo y resultado de las horas completas anteriores a un corte (hora exacta,
+guardado como segundos Unix en ContadorFilas, clave 'resumen:corte'). Las
+inserciones de Evento no lo escriben: `python manage.py reconstruir_resumenes
+--incremental` (o el job `reconstruir_resumenes` con `incremental`), programado
+cada hora, suma de una vez las horas cerradas desde el corte y lo avanza con un
+UPDATE condicional, así dos procesos nunca suman el mismo tramo. Sin
+--incremental se recalcula todo. Los borrados explícitos descuentan los
+eventos anteriores al corte; los borrados en cascada no lo actualizan.
+
+El histograma se calcula en la base de datos (Trunc + Count) en la zona
+horaria de settings.TIME_ZONE, con los cambios de horario incluidos (un día
+puede tener 23 o 25 horas), y se completa con ceros en los intervalos sin
+eventos. Cuando el intervalo es de una hora o más y los filtros son solo de
+departamento, tipo y resultado, se suma EventoResumenHora en las horas
+completas del rango hasta el corte; la hora parcial del comienzo y lo
+posterior al corte (la última hora, la parcial del final y lo que falte por
+resumir) se leen de la tabla de eventos.
+America/Santiago tiene desfases de horas completas, por lo que cada hora
+local coincide con una hora UTC del resumen.
+"""
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Trunc, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import sharding
+from .contadores import filtros_de_igualdad
+from .models import ContadorFilas, Evento, EventoResumenHora
+
+
+INTERVALOS = {
+    'minuto': ('minute', timedelta(minutes=1)),
+    'hora': ('hour', timedelta(hours=1)),
+    'dia': ('day', timedelta(days=1)),
+    'semana': ('week', timedelta(weeks=1)),
+}
+
+CAMPOS_AGRUPABLES = {
+    'tipo_evento': Evento.TIPO_EVENTO_CHOICES,
+    'resultado': Evento.RESULTADO_CHOICES,
+}
+
+CAMPOS_RESUMEN = ('departamento', 'tipo_evento', 'resultado')
+
+MAX_INTERVALOS = 5000
+
+TAMANO_LOTE = 2000
+
+CLAVE_CORTE = 'resumen:corte'
+
+
+class HistogramaInvalido(ValueError):
+    """Parámetros de histograma fuera de los valores permitidos"""
+
+
+def _hora(fecha):
+    return fecha.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def corte():
+    """Hora (UTC) hasta la que el resumen está completo, o None si nunca se construyó"""
+    segundos = ContadorFilas.objects.filter(clave=CLAVE_CORTE).values_list('total', flat=True).first()
+    return None if segundos is None else datetime.fromtimestamp(segundos, dt_timezone.utc)
+
+
+def _segundos(fecha):
+    return int(fecha.timestamp())
+
+
+def _sumar(por_clave):
+    """Suma las cantidades de `por_clave` ((hora, departamento, tipo, resultado): cantidad) al resumen"""
+    for (hora, departamento_id, tipo_evento, resultado), cantidad in por_clave.items():
+        fila = EventoResumenHora.objects.filter(
+            hora=hora, departamento_id=departamento_id, tipo_evento=tipo_evento, resultado=resultado
+        )
+        if fila.update(total=F('total') + cantidad) or cantidad <= 0:
+            continue
+        try:
+            with transaction.atomic():
+                EventoResumenHora.objects.create(
+                    hora=hora, departamento_id=departamento_id,
+                    tipo_evento=tipo_evento, resultado=resultado, total=cantidad
+                )
+        except IntegrityError:
+            # Otra inserción creó la fila entre el UPDATE y el INSERT
+            fila.update(total=F('total') + cantidad)
+
+
+def ajustar(eventos, delta):
+    """
+    Suma `delta` a las filas del resumen de los eventos indicados anteriores al
+    corte; los posteriores todavía no se resumieron
+    """
+    limite = corte()
+    if limite is None:
+        return
+    por_clave = Counter()
+    for evento in eventos:
+        if evento.fecha < limite:
+            por_clave[(_hora(evento.fecha), evento.departamento_id, evento.tipo_evento, evento.resultado)] += delta
+    _sumar(por_clave)
+
+
+def _totales(desde, hasta):
+    """Eventos de todos los shards por (hora, departamento, tipo, resultado) en [desde, hasta)"""
+    totales = Counter()
+    filtros = {'fecha__lt': hasta}
+    if desde is not None:
+        filtros['fecha__gte'] = desde
+    for alias in sharding.bases():
+        filas = (
+            Evento.objects.using(alias).filter(**filtros).order_by()
+            .annotate(hora=TruncHour('fecha', tzinfo=dt_timezone.utc))
+            .values_list('hora', 'departamento_id', 'tipo_evento', 'resultado')
+            .annotate(total=Count('pk'))
+        )
+        for hora, departamento_id, tipo_evento, resultado, total in filas:
+            totales[(hora, departamento_id, tipo_evento, resultado)] += total
+    return totales
+
+
+def reconstruir():
+    """
+    Recalcula el resumen completo desde los eventos de todos los shards hasta
+    la hora actual, que pasa a ser el corte; retorna el número de filas
+    """
+    nuevo_corte = _hora(timezone.now())
+    totales = _totales(None, nuevo_corte)
+
+    with transaction.atomic():
+        EventoResumenHora.objects.all().delete()
+        EventoResumenHora.objects.bulk_create(
+            (
+                EventoResumenHora(
+                    hora=hora, departamento_id=departamento_id,
+                    tipo_evento=tipo_evento, resultado=resultado, total=total
+                )
+                for (hora, departamento_id, tipo_evento, resultado), total in totales.items()
+            ),
+            batch_size=TAMANO_LOTE
+        )
+        ContadorFilas.objects.update_or_create(clave=CLAVE_CORTE, defaults={'total': _segundos(nuevo_corte)})
+    return len(totales)
+
+
+def poner_al_dia():
+    """
+    Suma al resumen las horas cerradas desde el corte y lo avanza hasta la hora
+    actual; sin corte reconstruye todo. Retorna el número de filas sumadas.
+    """
+    anterior = corte()
+    if anterior is None:
+        return reconstruir()
+    nuevo_corte = _hora(timezone.now())
+    if nuevo_corte <= anterior:
+        return 0
+    totales = _totales(anterior, nuevo_corte)
+    with transaction.atomic():
+        avanzado = ContadorFilas.objects.filter(clave=CLAVE_CORTE, total=_segundos(anterior)).update(
+            total=_segundos(nuevo_corte)
+        )
+        if not avanzado:
+            return 0  # otro proceso ya sumó este tramo
+        _sumar(totales)
+    return len(totales)
+
+
+def _zona():
+    return ZoneInfo(settings.TIME_ZONE)
+
+
+def _inicio_local(fecha, intervalo):
+    """Inicio del intervalo que contiene `fecha` (hora local sin zona)"""
+    if intervalo == 'minuto':
+        return fecha.replace(second=0, microsecond=0)
+    if intervalo == 'hora':
+        return fecha.replace(minute=0, second=0, microsecond=0)
+    dia = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    if intervalo == 'semana':
+        dia -= timedelta(days=dia.weekday())
+    return dia
+
+
+def inicios_de_intervalo(desde, hasta, intervalo):
+    """
+    Inicios de los intervalos que cubren [desde, hasta), en hora local. Se
+    avanza sobre la hora local, de modo que los días y semanas siguen el
+    calendario aunque cambie el horario; las horas locales inexistentes se
+    descartan y las repetidas se cuentan una vez, como lo hace Trunc.
+    """
+    zona = _zona()
+    paso = INTERVALOS[intervalo][1]
+    if (hasta - desde) / paso > MAX_INTERVALOS:
+        raise HistogramaInvalido(f'El rango supera {MAX_INTERVALOS} intervalos; use un intervalo mayor')
+
+    inicios = []
+    local = _inicio_local(desde.astimezone(zona).replace(tzinfo=None), intervalo)
+    while True:
+        inicio = local.replace(tzinfo=zona)
+        if inicio >= hasta:
+            break
+        # replace() no normaliza las horas inexistentes: se comparan instantes
+        if not inicios or inicio.astimezone(dt_timezone.utc) > inicios[-1].astimezone(dt_timezone.utc):
+            inicios.append(inicio)
+        local += paso
+    return inicios
+
+
+def leer_fecha(valor, nombre):
+    """Fecha ISO (con o sin hora y zona) como datetime con zona; sin zona se usa la local"""
+    try:
+        fecha = parse_datetime(valor)
+        if fecha is None:
+            dia = parse_date(valor)
+            fecha = dia and datetime(dia.year, dia.month, dia.day)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise HistogramaInvalido(f"'{nombre}' debe ser una fecha ISO 8601")
+    if timezone.is_naive(fecha):
+        fecha = fecha.replace(tzinfo=_zona())
+    return fecha
+
+
+def _filas_eventos(queryset, desde, hasta, intervalo, campos, departamento_id):
+    tipo, _ = INTERVALOS[intervalo]
+    consulta = (
+        queryset.filter(fecha__gte=desde, fecha__lt=hasta).order_by()
+        .annotate(inicio=Trunc('fecha', tipo, tzinfo=_zona()))
+        .values('inicio', *campos)
+        .annotate(total=Count('pk'))
+    )
+    for alias in sharding.bases(departamento_id):
+        yield from consulta.using(alias)
+
+
+def _filas_resumen(filtros, desde, hasta, intervalo, campos):
+    tipo, _ = INTERVALOS[intervalo]
+    return (
+        EventoResumenHora.objects.filter(hora__gte=desde, hora__lt=hasta, **filtros).order_by()
+        .annotate(inicio=Trunc('hora', tipo, tzinfo=_zona()))
+        .values('inicio', *campos)
+        .annotate(total=Sum('total'))
+    )
+
+
+def _tramo_resumen(desde, hasta, intervalo, filtros):
+    """
+    Horas completas de [desde, hasta) que puede responder el resumen, como
+    (inicio, fin), o None. La hora parcial del comienzo y lo posterior al
+    corte (incluida la hora parcial del final) se leen de la tabla de eventos.
+    """
+    if intervalo == 'minuto' or filtros is None:
+        return None
+    inicio = _hora(desde)
+    if inicio < desde:
+        inicio += timedelta(hours=1)
+    limite = corte()
+    fin = min(_hora(hasta), limite) if limite is not None else None
+    if fin is None or fin <= inicio:
+        return None
+    return inicio, fin
+
+
+def histograma(queryset, desde, hasta, intervalo, agrupar_por=None, departamento_id=None):
+    """
+    Número de eventos del queryset (ya filtrado) por intervalo entre `desde`
+    y `hasta`, opcionalmente separado por los valores de `agrupar_por`.
+    `departamento_id` limita la consulta a su shard. Con el resumen, la hora
+    parcial del comienzo y el tramo posterior al corte se cuentan en la tabla
+    de eventos.
+    """
+    if intervalo not in INTERVALOS:
+        raise HistogramaInvalido(f"Intervalo inválido; opciones: {', '.join(INTERVALOS)}")
+    if agrupar_por is not None and agrupar_por not in CAMPOS_AGRUPABLES:
+        raise HistogramaInvalido(f"Campo de agrupación inválido; opciones: {', '.join(CAMPOS_AGRUPABLES)}")
+    if hasta <= desde:
+        raise HistogramaInvalido("'hasta' debe ser posterior a 'desde'")
+
+    inicios = inicios_de_intervalo(desde, hasta, intervalo)
+    campos = [agrupar_por] if agrupar_por else []
+    filtros = filtros_de_igualdad(queryset, CAMPOS_RESUMEN)
+    tramo = _tramo_resumen(desde, hasta, intervalo, filtros)
+    if tramo:
+        inicio, fin = tramo
+        filas = _filas_resumen(filtros, inicio, fin, intervalo, campos)
+        # Hora parcial del comienzo y cola sin resumir: se leen de la tabla de eventos
+        if desde < inicio:
+            filas = chain(filas, _filas_eventos(queryset, desde, inicio, intervalo, campos, departamento_id))
+        if fin < hasta:
+            filas = chain(filas, _filas_eventos(queryset, fin, hasta, intervalo, campos, departamento_id))
+    else:
+        filas = _filas_eventos(queryset, desde, hasta, intervalo, campos, departamento_id)
+
+    totales = Counter()
+    for fila in filas:
+        clave = fila[agrupar_por] if agrupar_por else 'total'
+        totales[(fila['inicio'].astimezone(dt_timezone.utc), clave)] += fila['total']
+
+    if agrupar_por:
+        claves = [valor for valor, _ in CAMPOS_AGRUPABLES[agrupar_por]]
+        claves += sorted({clave for _, clave in totales if clave not in claves})
+    else:
+        claves = ['total']
+    instantes = [inicio.astimezone(dt_timezone.utc) for inicio in inicios]
+    zona = _zona()
+    return {
+        'desde': desde.astimezone(zona).isoformat(),
+        'hasta': hasta.astimezone(zona).isoformat(),
+        'intervalo': intervalo,
+        'zona_horaria': settings.TIME_ZONE,
+        'agrupar_por': agrupar_por,
+        'fuente': 'resumen' if tramo else 'eventos',
+        'intervalos': [inicio.astimezone(zona).isoformat() for inicio in inicios],
+        'series': {
+            clave: [totales.get((instante, clave), 0) for instante in instantes]
+            for clave in claves
+        },
+    }
+
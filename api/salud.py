@@ -0,0 +1,199 @@
+"""
+Endpoints de salud para el balanceador de carga.
+
+- GET /healthz (liveness): responde "ok" desde el primer middleware, sin pasar
+  por el resto de los middlewares, el enrutamiento, DRF, la autenticación ni
+  la base de datos. Solo indica que el proceso atiende solicitudes.
+- GET /readyz (readiness): 200 con {"ok": true} si el worker puede recibir
+  tráfico y 503 con {"ok": false} si no. El endpoint es público: el detalle
+  de los chequeos (nombres de bases de datos, errores, cola) no se expone y
+  se registra en el log cuando cambian los motivos. Solo se evalúa lo propio
+  del worker; deja de estar listo cuando:
+  - una base de datos (default, réplicas y shards de eventos) no responde o
+    su SELECT 1 tarda más de SALUD['LATENCIA_BD_MS'];
+  - el worker atiende más de SALUD['EN_CURSO'] solicitudes a la vez;
+  - la latencia media de sus solicitudes de los últimos VENTANA_SEGUNDOS
+    supera SALUD['LATENCIA_SOLICITUDES_MS'].
+  La cola de jobs es compartida por todos los workers: su profundidad va en
+  el detalle registrado pero no retira al worker, porque el balanceador los
+  retiraría a todos a la vez sin que eso vacíe la cola.
+
+Los chequeos de base de datos y cola se cachean SALUD['CACHE_SEGUNDOS'] por
+proceso y los ejecuta una sola solicitud a la vez, así un balanceador que
+consulta seguido no agrega carga a la base de datos. Las solicitudes en curso
+y la latencia se miden en el mismo middleware y no consultan nada. Un umbral
+en 0 desactiva su chequeo.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+RUTAS_LIVENESS = ('/healthz', '/healthz/')
+RUTAS_READINESS = ('/readyz', '/readyz/')
+
+VENTANA_SEGUNDOS = 10
+
+_candado = threading.Lock()
+_candado_chequeo = threading.Lock()
+_en_curso = 0
+# (segundo, suma de duraciones en ms, cantidad) de las solicitudes terminadas
+_ventana = deque()
+# (instante, resultado) del último chequeo de base de datos y cola
+_chequeo = None
+# Motivos del último cambio de estado registrado en el log
+_motivos_registrados = []
+
+
+def _configuracion(clave):
+    return settings.SALUD.get(clave, 0)
+
+
+def _registrar_solicitud(ms):
+    segundo = int(time.monotonic())
+    with _candado:
+        if _ventana and _ventana[-1][0] == segundo:
+            _, suma, cantidad = _ventana[-1]
+            _ventana[-1] = (segundo, suma + ms, cantidad + 1)
+        else:
+            _ventana.append((segundo, ms, 1))
+        while _ventana[0][0] <= segundo - VENTANA_SEGUNDOS:
+            _ventana.popleft()
+
+
+def latencia_solicitudes():
+    """Latencia media (ms) de las solicitudes terminadas en los últimos VENTANA_SEGUNDOS, o None"""
+    limite = int(time.monotonic()) - VENTANA_SEGUNDOS
+    with _candado:
+        recientes = [(suma, cantidad) for segundo, suma, cantidad in _ventana if segundo > limite]
+    cantidad = sum(c for _, c in recientes)
+    return sum(s for s, _ in recientes) / cantidad if cantidad else None
+
+
+def _chequear_dependencias():
+    """Latencia de cada base de datos y profundidad de la cola de jobs"""
+    bases = {}
+    for alias in dict.fromkeys(['default', *settings.DATABASE_REPLICAS, *settings.EVENTO_SHARDS]):
+        inicio = time.perf_counter()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+        except Exception as error:
+            bases[alias] = {'ok': False, 'error': str(error) or error.__class__.__name__}
+        else:
+            bases[alias] = {'ok': True, 'latencia_ms': round((time.perf_counter() - inicio) * 1000, 2)}
+
+    try:
+        jobs_pendientes = Job.objects.filter(estado=Job.PENDIENTE).count()
+    except Exception:
+        jobs_pendientes = None
+    return {'bases_de_datos': bases, 'jobs_pendientes': jobs_pendientes}
+
+
+def dependencias():
+    """
+    Resultado cacheado de _chequear_dependencias(). Si otra solicitud ya lo
+    está recalculando se devuelve el anterior en lugar de esperar.
+    """
+    global _chequeo
+    vigente = _chequeo
+    if vigente is not None and time.monotonic() - vigente[0] < _configuracion('CACHE_SEGUNDOS'):
+        return vigente[1]
+    if not _candado_chequeo.acquire(blocking=vigente is None):
+        return vigente[1]
+    try:
+        if _chequeo is not vigente:
+            return _chequeo[1]
+        resultado = _chequear_dependencias()
+        _chequeo = (time.monotonic(), resultado)
+        return resultado
+    finally:
+        _candado_chequeo.release()
+
+
+def estado_readiness():
+    """(listo, detalle) del worker"""
+    detalle = dict(dependencias())
+    detalle['en_curso'] = _en_curso
+    latencia = latencia_solicitudes()
+    detalle['latencia_solicitudes_ms'] = round(latencia, 2) if latencia is not None else None
+
+    motivos = []
+    latencia_bd = _configuracion('LATENCIA_BD_MS')
+    for alias, base in detalle['bases_de_datos'].items():
+        if not base['ok']:
+            motivos.append(f"Base de datos '{alias}' sin conexión")
+        elif latencia_bd and base['latencia_ms'] > latencia_bd:
+            motivos.append(f"Base de datos '{alias}' lenta ({base['latencia_ms']} ms)")
+
+    en_curso_maximo = _configuracion('EN_CURSO')
+    if en_curso_maximo and _en_curso > en_curso_maximo:
+        motivos.append(f'Worker con {_en_curso} solicitudes en curso')
+
+    latencia_maxima = _configuracion('LATENCIA_SOLICITUDES_MS')
+    if latencia_maxima and latencia is not None and latencia > latencia_maxima:
+        motivos.append(f'Latencia media de {latencia:.0f} ms')
+
+    detalle['motivos'] = motivos
+    return not motivos, detalle
+
+
+def _registrar_estado(listo, detalle):
+    """Registra el detalle en el log cuando cambian los motivos, no en cada consulta del balanceador"""
+    global _motivos_registrados
+    if detalle['motivos'] == _motivos_registrados:
+        return
+    _motivos_registrados = detalle['motivos']
+    if listo:
+        logger.info('Worker listo nuevamente')
+    else:
+        logger.warning('Worker no listo: %s; detalle: %s', '; '.join(detalle['motivos']), detalle)
+
+
+def readyz():
+    listo, detalle = estado_readiness()
+    _registrar_estado(listo, detalle)
+    respuesta = JsonResponse({'ok': listo}, status=200 if listo else 503)
+    respuesta['Cache-Control'] = 'no-store'
+    if not listo:
+        respuesta['Retry-After'] = max(int(_configuracion('CACHE_SEGUNDOS')), 1)
+    return respuesta
+
+
+class SaludMiddleware:
+    """
+    Primer middleware de la cadena: atiende /healthz y /readyz sin pasar por
+    el resto, y cuenta las solicitudes en curso y su duración para /readyz.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        global _en_curso
+        if request.path in RUTAS_LIVENESS:
+            respuesta = HttpResponse('ok', content_type='text/plain')
+            respuesta['Cache-Control'] = 'no-store'
+            return respuesta
+        if request.path in RUTAS_READINESS:
+            return readyz()
+
+        with _candado:
+            _en_curso += 1
+        inicio = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            with _candado:
+                _en_curso -= 1
+            _registrar_solicitud((time.perf_counter() - inicio) * 1000)
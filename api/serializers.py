@@ -1,9 +1,56 @@
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera
+from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera, Job, TransicionEstado
+from .jobs import tareas_registradas
+from . import estados
+
+
+def _lista_parametro(valor):
+    """Convierte 'a,b, c' en ['a', 'b', 'c']"""
+    return [parte.strip() for parte in (valor or '').split(',') if parte.strip()]
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin de serializer que permite elegir los campos de la respuesta:
+    
+    - ?fields=id,fecha devuelve solo esos campos.
+    - ?expand=departamento reemplaza un campo por su objeto anidado, según
+      los serializers declarados en Meta.expandibles.
+    
+    Sin parámetros la respuesta no cambia. Solo aplica en lecturas y al
+    serializer raíz (no a los serializers anidados).
+    """
+    
+    def _es_raiz(self):
+        padre = self.parent
+        return padre is None or (isinstance(padre, serializers.ListSerializer) and padre.parent is None)
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD') or not self._es_raiz():
+            return fields
+        
+        expandir = _lista_parametro(request.query_params.get('expand'))
+        expandibles = getattr(self.Meta, 'expandibles', {})
+        for nombre in expandir:
+            if nombre in expandibles:
+                fields[nombre] = expandibles[nombre](read_only=True)
+        
+        campos = _lista_parametro(request.query_params.get('fields'))
+        if campos:
+            permitidos = set(campos) | set(expandir)
+            for nombre in list(fields):
+                if nombre not in permitidos:
+                    fields.pop(nombre)
+        return fields
 
 
-class DepartamentoSerializer(serializers.ModelSerializer):
+class DepartamentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo Departamento"""
     
     class Meta:
@@ -18,7 +65,7 @@ class DepartamentoSerializer(serializers.ModelSerializer):
         return value
 
 
-class RolSerializer(serializers.ModelSerializer):
+class RolSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo Rol"""
     nombre_display = serializers.CharField(source='get_nombre_display', read_only=True)
     
@@ -28,7 +75,17 @@ class RolSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'fecha_creacion', 'nombre_display']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class RolResumenSerializer(serializers.ModelSerializer):
+    """Datos del rol anidados en la representación del perfil de usuario"""
+    nombre_display = serializers.CharField(source='get_nombre_display', read_only=True)
+    
+    class Meta:
+        model = Rol
+        fields = ['id', 'nombre', 'nombre_display']
+        read_only_fields = fields
+
+
+class UserSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer básico para el modelo User de Django"""
     
     class Meta:
@@ -37,7 +94,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class PerfilUsuarioSerializer(serializers.ModelSerializer):
+class PerfilUsuarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo PerfilUsuario con datos anidados del usuario"""
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
@@ -52,6 +109,7 @@ class PerfilUsuarioSerializer(serializers.ModelSerializer):
         queryset=Rol.objects.all(),
         write_only=True
     )
+    rol = RolResumenSerializer(read_only=True)
     
     class Meta:
         model = PerfilUsuario
@@ -62,22 +120,13 @@ class PerfilUsuarioSerializer(serializers.ModelSerializer):
             'rol_nombre',
             'user_id',
             'rol_id',
-            'fecha_creacion'
+            'fecha_creacion',
+            'rol'
         ]
-        read_only_fields = ['id', 'username', 'email', 'rol_nombre', 'fecha_creacion']
-    
-    def to_representation(self, instance):
-        """Personaliza la representación de salida"""
-        representation = super().to_representation(instance)
-        representation['rol'] = {
-            'id': instance.rol.id,
-            'nombre': instance.rol.nombre,
-            'nombre_display': instance.rol.get_nombre_display()
-        }
-        return representation
+        read_only_fields = ['id', 'username', 'email', 'rol_nombre', 'fecha_creacion', 'rol']
 
 
-class SensorSerializer(serializers.ModelSerializer):
+class SensorSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo Sensor con información anidada"""
     departamento_nombre = serializers.CharField(source='departamento.nombre', read_only=True)
     usuario_username = serializers.CharField(source='usuario_asociado.username', read_only=True, allow_null=True)
@@ -95,9 +144,21 @@ class SensorSerializer(serializers.ModelSerializer):
             'usuario_asociado',
             'usuario_username',
             'fecha_creacion',
-            'fecha_actualizacion'
+            'fecha_actualizacion',
+            'version'
         ]
-        read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion', 'estado_display']
+        read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion', 'estado_display', 'version']
+        # Incluye los sensores eliminados: conservan su UID hasta que se purgan sus eventos
+        extra_kwargs = {
+            'uid': {'validators': [UniqueValidator(
+                queryset=Sensor.todos.all(),
+                message='Ya existe un sensor con este UID (o uno eliminado cuyos eventos aún se están purgando)'
+            )]},
+        }
+        expandibles = {
+            'departamento': DepartamentoSerializer,
+            'usuario_asociado': UserSerializer,
+        }
     
     def validate_uid(self, value):
         """Validación del UID del sensor"""
@@ -124,11 +185,12 @@ class SensorSimpleSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'estado_display']
 
 
-class EventoSerializer(serializers.ModelSerializer):
+class EventoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo Evento con datos anidados del sensor"""
     sensor_data = SensorSimpleSerializer(source='sensor', read_only=True)
     tipo_evento_display = serializers.CharField(source='get_tipo_evento_display', read_only=True)
     resultado_display = serializers.CharField(source='get_resultado_display', read_only=True)
+    descripcion = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     
     class Meta:
         model = Evento
@@ -140,10 +202,17 @@ class EventoSerializer(serializers.ModelSerializer):
             'tipo_evento_display',
             'resultado',
             'resultado_display',
+            'barrera',
+            'departamento',
+            'usuario',
             'fecha',
             'descripcion'
         ]
-        read_only_fields = ['id', 'fecha', 'sensor_data', 'tipo_evento_display', 'resultado_display']
+        read_only_fields = ['id', 'fecha', 'departamento', 'usuario', 'sensor_data', 'tipo_evento_display', 'resultado_display']
+        expandibles = {
+            'sensor': SensorSerializer,
+            'departamento': DepartamentoSerializer,
+        }
     
     def validate_sensor(self, value):
         """Validación del sensor"""
@@ -160,10 +229,11 @@ class EventoSerializer(serializers.ModelSerializer):
 
 class EventoCreateSerializer(serializers.ModelSerializer):
     """Serializer específico para la creación de eventos con validaciones estrictas"""
+    descripcion = serializers.CharField(required=False, allow_blank=True, allow_null=True)
     
     class Meta:
         model = Evento
-        fields = ['sensor', 'tipo_evento', 'resultado', 'descripcion']
+        fields = ['sensor', 'tipo_evento', 'resultado', 'barrera', 'descripcion']
     
     def validate_sensor(self, value):
         """Validación del sensor al crear evento"""
@@ -178,7 +248,7 @@ class EventoCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class BarreraSerializer(serializers.ModelSerializer):
+class BarreraSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para el modelo Barrera"""
     departamento_nombre = serializers.CharField(source='departamento.nombre', read_only=True, allow_null=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
@@ -192,10 +262,15 @@ class BarreraSerializer(serializers.ModelSerializer):
             'estado_display',
             'departamento',
             'departamento_nombre',
+            'sentido',
             'fecha_creacion',
-            'fecha_actualizacion'
+            'fecha_actualizacion',
+            'version'
         ]
-        read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion', 'estado_display']
+        read_only_fields = ['id', 'fecha_creacion', 'fecha_actualizacion', 'estado_display', 'version']
+        expandibles = {
+            'departamento': DepartamentoSerializer,
+        }
     
     def validate_nombre(self, value):
         """Validación adicional para el nombre de la barrera"""
@@ -205,24 +280,155 @@ class BarreraSerializer(serializers.ModelSerializer):
 
 
 class BarreraEstadoSerializer(serializers.ModelSerializer):
-    """Serializer específico para actualizar solo el estado de la barrera"""
+    """
+    Serializer específico para actualizar solo el estado de la barrera.
+    Acepta 'estado_anterior' opcional y la versión esperada en el contexto
+    ('version', tomada del header If-Match) para un cambio condicional.
+    """
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    estado_anterior = serializers.ChoiceField(
+        choices=Barrera.ESTADO_CHOICES,
+        write_only=True,
+        required=False
+    )
     
     class Meta:
         model = Barrera
-        fields = ['id', 'estado', 'estado_display']
-        read_only_fields = ['id', 'estado_display']
+        fields = ['id', 'estado', 'estado_display', 'estado_anterior', 'version']
+        read_only_fields = ['id', 'estado_display', 'version']
     
     def update(self, instance, validated_data):
-        """Actualiza solo el estado de la barrera"""
-        instance.estado = validated_data.get('estado', instance.estado)
-        instance.save()
-        return instance
+        """
+        Actualiza solo el estado de la barrera con un UPDATE condicional.
+        Lanza estados.ConflictoEstado si la barrera cambió entretanto.
+        """
+        request = self.context.get('request')
+        return estados.cambiar_estado_condicional(
+            instance,
+            validated_data.get('estado', instance.estado),
+            version=self.context.get('version'),
+            estado_anterior=validated_data.get('estado_anterior'),
+            usuario=request.user if request else None
+        )
 
 
-# Serializer personalizado para login con mensajes en español
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from django.contrib.auth import authenticate
+class EstadoMasivoSerializer(serializers.Serializer):
+    """
+    Serializer base para cambios de estado masivos.
+    Recibe el nuevo estado y al menos un filtro (departamento, estado actual o ids).
+    """
+    MAXIMO_IDS = 5000
+    
+    departamento = serializers.PrimaryKeyRelatedField(
+        queryset=Departamento.objects.all(),
+        required=False
+    )
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=MAXIMO_IDS
+    )
+
+    def validate(self, data):
+        """Exige al menos un filtro para evitar cambios globales accidentales"""
+        if not any(campo in data for campo in ('departamento', 'estado_actual', 'ids')):
+            raise serializers.ValidationError(
+                "Debe indicar al menos un filtro: 'departamento', 'estado_actual' o 'ids'"
+            )
+        return data
+
+    def filtrar(self, queryset):
+        """
+        Aplica los filtros validados de departamento y estado actual al
+        queryset recibido; los ids se entregan aparte a
+        estados.cambiar_estado_masivo, que los consulta en bloques.
+        """
+        data = self.validated_data
+        if 'departamento' in data:
+            queryset = queryset.filter(departamento=data['departamento'])
+        if 'estado_actual' in data:
+            queryset = queryset.filter(estado=data['estado_actual'])
+        return queryset
+
+
+class SensorEstadoMasivoSerializer(EstadoMasivoSerializer):
+    """Serializer para cambiar el estado de varios sensores a la vez"""
+    estado = serializers.ChoiceField(choices=Sensor.ESTADO_CHOICES)
+    estado_actual = serializers.ChoiceField(choices=Sensor.ESTADO_CHOICES, required=False)
+
+
+class BarreraEstadoMasivoSerializer(EstadoMasivoSerializer):
+    """Serializer para abrir o cerrar varias barreras a la vez"""
+    estado = serializers.ChoiceField(choices=Barrera.ESTADO_CHOICES)
+    estado_actual = serializers.ChoiceField(choices=Barrera.ESTADO_CHOICES, required=False)
+
+
+class SensorBusquedaUidSerializer(serializers.Serializer):
+    """Lista de UID a resolver en una sola consulta"""
+    MAXIMO_UIDS = 5000
+    
+    uids = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        allow_empty=False,
+        max_length=MAXIMO_UIDS
+    )
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer para crear jobs en segundo plano y consultar su avance"""
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    porcentaje = serializers.FloatField(read_only=True)
+    creado_por_username = serializers.CharField(source='creado_por.username', read_only=True, default=None)
+    
+    class Meta:
+        model = Job
+        fields = [
+            'id',
+            'tipo',
+            'parametros',
+            'estado',
+            'estado_display',
+            'progreso',
+            'total',
+            'porcentaje',
+            'resultado',
+            'error',
+            'intentos',
+            'creado_por',
+            'creado_por_username',
+            'fecha_creacion',
+            'fecha_inicio',
+            'fecha_fin'
+        ]
+        read_only_fields = [
+            'id', 'estado', 'progreso', 'total', 'resultado', 'error', 'intentos',
+            'creado_por', 'fecha_creacion', 'fecha_inicio', 'fecha_fin'
+        ]
+    
+    def validate_tipo(self, value):
+        tipos = sorted(tareas_registradas())
+        if value not in tipos:
+            raise serializers.ValidationError(f"Tipo de job inválido. Opciones: {tipos}")
+        return value
+    
+    def validate_parametros(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Los parámetros deben ser un objeto JSON")
+        return value
 
+
+class TransicionEstadoSerializer(serializers.ModelSerializer):
+    """Serializer de solo lectura para el historial de cambios de estado"""
+    usuario_username = serializers.CharField(source='usuario.username', read_only=True, default=None)
+    
+    class Meta:
+        model = TransicionEstado
+        fields = ['id', 'estado_anterior', 'estado_nuevo', 'usuario', 'usuario_username', 'fecha']
+        read_only_fields = fields
+
+
+# Serializer personalizado para login con mensajes en español
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     """Serializer personalizado para login con mensajes en español"""
     
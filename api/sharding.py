@@ -0,0 +1,312 @@
+"""
+Sharding horizontal opcional de Evento por departamento.
+
+Con settings.EVENTO_SHARDS definido (ver core/settings.py), cada evento se
+guarda en el shard de su departamento (Evento.departamento, el del sensor al
+momento de registrarse): EVENTO_SHARDS[departamento_id % len(EVENTO_SHARDS)]. Sensores, barreras y el
+resto de los modelos se mantienen en 'default'.
+
+- Escrituras: EventoShardRouter (api/db_routers.py) elige el shard a partir
+  de la instancia; actualizaciones y borrados van al shard de donde se leyó.
+- Identificadores: cada shard numera sus eventos desde (índice + 1) << 40,
+  así el id indica el shard y sigue siendo único entre todos ellos.
+- Lecturas: un filtro por departamento lee un solo shard; sin él se consulta
+  cada shard y se mezclan los resultados según el orden del queryset
+  (ConsultaDispersa). Los shards no tienen las tablas de sensores ni barreras,
+  así que las relaciones se cargan con prefetch desde 'default' en lugar de JOIN.
+- Activación: los eventos registrados antes de definir EVENTO_SHARDS quedan en
+  'default' y ninguna lectura los ve hasta moverlos con
+  `python manage.py mover_eventos_a_shards` (mover_desde_default). Mientras
+  queden, el chequeo api.W001 lo advierte en `migrate` y `check --database default`.
+
+Sin EVENTO_SHARDS todas las funciones se comportan como una única base de datos.
+"""
+import heapq
+from collections import defaultdict
+from itertools import chain
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.checks import Tags, Warning, register
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.db.models import QuerySet, prefetch_related_objects
+from django.db.models.signals import post_migrate, pre_delete
+from django.dispatch import receiver
+
+from .models import Barrera, Departamento, Evento, EventoDescripcion, Sensor
+
+
+BITS_SHARD = 40
+
+
+def activo():
+    return bool(settings.EVENTO_SHARDS)
+
+
+def shard_para_departamento(departamento_id):
+    """Alias del shard que guarda los eventos de un departamento"""
+    shards = settings.EVENTO_SHARDS
+    return shards[int(departamento_id or 0) % len(shards)]
+
+
+def shard_para_evento(evento):
+    """Alias del shard donde se guarda un evento nuevo"""
+    if evento.sensor_id is None:
+        return None
+    if evento.departamento_id is None:
+        Evento.asignar_datos_del_sensor([evento])
+    return shard_para_departamento(evento.departamento_id)
+
+
+def shard_de_id(evento_id):
+    """Alias del shard que contiene el evento con ese id, o None si no corresponde a ninguno"""
+    indice = (int(evento_id) >> BITS_SHARD) - 1
+    if 0 <= indice < len(settings.EVENTO_SHARDS):
+        return settings.EVENTO_SHARDS[indice]
+    return None
+
+
+def _rutas_select_related(arbol, prefijo=''):
+    for campo, subarbol in arbol.items():
+        ruta = prefijo + campo
+        yield ruta
+        yield from _rutas_select_related(subarbol, ruta + '__')
+
+
+def sin_joins(queryset):
+    """
+    Reemplaza los select_related del queryset por prefetch_related, ya que los
+    shards no contienen las tablas relacionadas.
+    """
+    select_related = queryset.query.select_related
+    if not select_related:
+        return queryset
+    rutas = list(_rutas_select_related(select_related)) if isinstance(select_related, dict) else []
+    return queryset.select_related(None).defer(None).prefetch_related(*rutas)
+
+
+def _campos_orden(queryset):
+    orden = queryset.query.order_by or queryset.model._meta.ordering
+    if not all(isinstance(campo, str) for campo in orden):
+        orden = ['-fecha']
+    return [campo for campo in orden if campo != '?']
+
+
+def _ordenar(filas, orden):
+    for campo in reversed(orden):
+        nombre = campo.lstrip('-')
+        filas.sort(key=attrgetter('pk' if nombre in ('pk', 'id') else nombre), reverse=campo.startswith('-'))
+    return filas
+
+
+class ConsultaDispersa:
+    """
+    Queryset de solo lectura repartido en todos los shards (scatter-gather).
+
+    Implementa lo que necesitan el Paginator y los serializers: count(),
+    len(), iteración y slicing. Un slice [a:b] lee las primeras b filas de
+    cada shard, las mezcla según el orden del queryset y luego aplica el
+    prefetch solo a las filas devueltas.
+    """
+    ordered = True
+
+    def __init__(self, queryset, alias=None):
+        self.model = queryset.model
+        self.queryset = queryset.prefetch_related(None)
+        self.prefetch = queryset._prefetch_related_lookups
+        self.alias = list(alias or settings.EVENTO_SHARDS)
+        self.orden = _campos_orden(queryset)
+
+    def count(self):
+        return sum(self.queryset.using(alias).count() for alias in self.alias)
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, indice):
+        if isinstance(indice, int):
+            filas = self[indice:indice + 1]
+            if not filas:
+                raise IndexError('Índice fuera de rango')
+            return filas[0]
+
+        inicio, fin = indice.start or 0, indice.stop
+        partes = []
+        for alias in self.alias:
+            queryset = self.queryset.using(alias)
+            partes.append(queryset[:fin] if fin is not None else queryset)
+        filas = _ordenar(list(chain.from_iterable(partes)), self.orden)[inicio:fin]
+        if self.prefetch:
+            prefetch_related_objects(filas, *self.prefetch)
+        return filas
+
+
+def distribuir(queryset, departamento_id=None):
+    """
+    Asigna el queryset de Evento a los shards que corresponden: uno solo si se
+    conoce el departamento, todos (ConsultaDispersa) en otro caso.
+    """
+    if not activo():
+        return queryset
+    queryset = sin_joins(queryset)
+    if departamento_id is not None:
+        return queryset.using(shard_para_departamento(departamento_id))
+    return ConsultaDispersa(queryset)
+
+
+def para_id(queryset, evento_id):
+    """Queryset de Evento ubicado en el shard que contiene `evento_id`"""
+    if not activo():
+        return queryset
+    try:
+        alias = shard_de_id(evento_id)
+    except (TypeError, ValueError):
+        alias = None
+    return sin_joins(queryset).using(alias or 'default')
+
+
+def bases(departamento_id=None):
+    """
+    Alias donde consultar eventos para agregarlos: el shard del departamento,
+    todos los shards, o [None] (el router decide) sin sharding
+    """
+    if not activo():
+        return [None]
+    if departamento_id is not None:
+        return [shard_para_departamento(departamento_id)]
+    return list(settings.EVENTO_SHARDS)
+
+
+def contar(queryset):
+    """COUNT(*) de un queryset de Evento sumando todos los shards"""
+    if not activo():
+        return queryset.count()
+    return sum(queryset.using(alias).count() for alias in settings.EVENTO_SHARDS)
+
+
+def iterar(queryset, tamano_lote=2000):
+    """
+    Recorre un queryset de Evento de todos los shards en el orden del queryset,
+    leyendo por lotes y mezclando los flujos sin cargarlos completos en memoria.
+    El orden debe ser ascendente en todos sus campos.
+    """
+    if not activo():
+        return queryset.iterator(chunk_size=tamano_lote)
+    queryset = sin_joins(queryset)
+    clave = attrgetter(*('pk' if campo in ('pk', 'id') else campo for campo in _campos_orden(queryset)))
+    flujos = [queryset.using(alias).iterator(chunk_size=tamano_lote) for alias in settings.EVENTO_SHARDS]
+    return heapq.merge(*flujos, key=clave)
+
+
+def mover_desde_default(tamano_lote=2000):
+    """
+    Mueve a su shard los eventos que quedaron en 'default' de antes de activar
+    el sharding, por lotes de `tamano_lote`. Cada evento recibe un id nuevo del
+    rango de su shard; la fecha y la descripción se conservan. El lote se borra
+    de 'default' en la misma transacción que lo inserta en el shard. No toca el
+    resumen por hora (los totales no cambian); los contadores de filas deben
+    recalcularse después. Retorna el número de eventos movidos.
+    """
+    if not activo():
+        return 0
+    campos = [campo.attname for campo in Evento._meta.concrete_fields if not campo.primary_key]
+    movidos = 0
+    while True:
+        lote = list(Evento.objects.using(DEFAULT_DB_ALIAS).order_by('pk')[:tamano_lote])
+        if not lote:
+            return movidos
+        Evento.asignar_datos_del_sensor(lote)
+        textos = dict(
+            EventoDescripcion.objects.using(DEFAULT_DB_ALIAS)
+            .filter(evento_id__in=[evento.pk for evento in lote])
+            .values_list('evento_id', 'texto')
+        )
+        por_shard = defaultdict(list)
+        for evento in lote:
+            por_shard[shard_para_departamento(evento.departamento_id)].append(evento)
+
+        for alias, eventos in por_shard.items():
+            with transaction.atomic(using=DEFAULT_DB_ALIAS), transaction.atomic(using=alias):
+                copias = [Evento(**{campo: getattr(evento, campo) for campo in campos}) for evento in eventos]
+                # QuerySet base: sin sumar al resumen por hora ni crear descripciones
+                QuerySet(Evento, using=alias).bulk_create(copias)
+                # auto_now_add reemplaza la fecha al insertar; se restaura la original
+                for copia, evento in zip(copias, eventos):
+                    copia.fecha = evento.fecha
+                QuerySet(Evento, using=alias).bulk_update(copias, ['fecha'])
+                EventoDescripcion.objects.using(alias).bulk_create(
+                    EventoDescripcion(evento_id=copia.pk, texto=textos[evento.pk])
+                    for copia, evento in zip(copias, eventos) if evento.pk in textos
+                )
+                Evento.objects.using(DEFAULT_DB_ALIAS).filter(pk__in=[evento.pk for evento in eventos]).delete()
+            movidos += len(eventos)
+
+
+@register(Tags.database)
+def eventos_fuera_de_shards(app_configs, databases=None, **kwargs):
+    """Advierte cuando hay shards definidos y 'default' todavía guarda eventos"""
+    if not activo() or DEFAULT_DB_ALIAS not in (databases or ()):
+        return []
+    try:
+        pendientes = Evento.objects.using(DEFAULT_DB_ALIAS).exists()
+    except DatabaseError:
+        # Base de datos sin migrar
+        return []
+    if not pendientes:
+        return []
+    return [Warning(
+        "Hay eventos en 'default' con EVENTO_SHARDS definido: las consultas de eventos no los incluyen",
+        hint='Ejecute python manage.py mover_eventos_a_shards',
+        id='api.W001',
+    )]
+
+
+@receiver(post_migrate)
+def reservar_rango_ids(sender, using, **kwargs):
+    """Hace que cada shard numere sus eventos desde su propio rango de ids"""
+    if sender.name != 'api' or using not in settings.EVENTO_SHARDS:
+        return
+    inicio = (settings.EVENTO_SHARDS.index(using) + 1) << BITS_SHARD
+    tabla = Evento._meta.db_table
+    conexion = connections[using]
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'sqlite':
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s', [inicio, tabla, inicio])
+            cursor.execute('SELECT 1 FROM sqlite_sequence WHERE name = %s', [tabla])
+            if cursor.fetchone() is None:
+                cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [tabla, inicio])
+        elif conexion.vendor == 'postgresql':
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {conexion.ops.quote_name(tabla)})))",
+                [tabla, inicio]
+            )
+
+
+# Los borrados en cascada de Django solo alcanzan la base de datos del objeto
+# borrado; los eventos de los shards se limpian aquí
+@receiver(pre_delete, sender=Sensor)
+def sensor_eliminado(sender, instance, **kwargs):
+    for alias in settings.EVENTO_SHARDS:
+        Evento.objects.using(alias).filter(sensor_id=instance.pk).delete()
+
+
+@receiver(pre_delete, sender=Departamento)
+def departamento_eliminado(sender, instance, **kwargs):
+    for alias in settings.EVENTO_SHARDS:
+        Evento.objects.using(alias).filter(departamento_id=instance.pk).update(departamento=None)
+
+
+@receiver(pre_delete, sender=Barrera)
+def barrera_eliminada(sender, instance, **kwargs):
+    for alias in settings.EVENTO_SHARDS:
+        Evento.objects.using(alias).filter(barrera_id=instance.pk).update(barrera=None)
+
+
+@receiver(pre_delete, sender=User)
+def usuario_eliminado(sender, instance, **kwargs):
+    for alias in settings.EVENTO_SHARDS:
+        Evento.objects.using(alias).filter(usuario_id=instance.pk).update(usuario=None)
@@ -0,0 +1,12 @@
+from django.dispatch import Signal
+
+
+# Señal emitida una sola vez por lote cuando el estado de uno o varios objetos
+# cambia mediante un UPDATE directo (sin pasar por save(), por lo que
+# post_save no se dispara). Se envía dentro de la misma transacción que el
+# UPDATE; los receptores que deban actuar tras el commit (por ejemplo para
+# invalidar cachés) deben usar transaction.on_commit.
+#
+# Argumentos: sender (modelo), ids, estado, usuario, anteriores ({id: estado
+# previo}) y fecha (la fecha_actualizacion escrita)
+estado_actualizado = Signal()
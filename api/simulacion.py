@@ -0,0 +1,618 @@
+"""
+Flota simulada de lectores RFID para pruebas de carga de larga duración.
+
+Cada lector es un hilo que se comporta como el controlador de una barrera
+contra un servidor en ejecución: inicia sesión en /api/auth/login/, consulta
+periódicamente el feed /api/sync/ y el catálogo de barreras de su
+departamento, y por cada lectura resuelve el UID (/api/sensores/buscar_uids/),
+registra el evento (/api/eventos/) y abre y cierra su barrera
+(/api/barreras/{id}/estado/).
+
+Las lecturas llegan como un proceso de Poisson cuya tasa sube en torno a los
+cambios de turno. Una fracción de los UID leídos es desconocida y otra
+corresponde a sensores bloqueados o perdidos (el servidor rechaza sus eventos
+con 400). Ante un timeout el lector reintenta con espera exponencial solo
+las solicitudes sin efectos (GET, inicio de sesión y búsqueda de UID): un
+POST o PATCH que escribe pudo haberse aplicado en el servidor, así que
+cuenta como un timeout y no se repite. Las latencias se acumulan en
+histogramas logarítmicos de tamaño fijo, así una corrida de varias horas no
+crece en memoria.
+
+Solo usa la biblioteca estándar (http.client) para no sumar dependencias.
+"""
+import http.client
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+
+OPERACIONES = ('login', 'sync', 'catalogo', 'buscar_uid', 'evento', 'barrera')
+
+# Resultado de cada intento de solicitud
+OK = 'ok'
+RECHAZO = 'rechazo'  # respuesta 4xx esperada (sensor bloqueado, conflicto de versión)
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+# Clases de UID leídos por los lectores
+VALIDO = 'valido'
+DESCONOCIDO = 'desconocido'
+BLOQUEADO = 'bloqueado'
+PERDIDO = 'perdido'
+
+ESPERA_BASE_REINTENTO = 0.5
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+ESPERA_MAXIMA_REINTENTO = 8.0
+
+
+class Histograma:
+    """
+    Latencias en milisegundos agrupadas en buckets logarítmicos: el bucket i
+    cubre (MINIMO * FACTOR ** (i - 1), MINIMO * FACTOR ** i], así cada
+    percentil se informa con un error relativo menor al 5 %.
+    """
+    MINIMO = 0.1
+    FACTOR = 1.05
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.total = 0
+        self.maximo = 0.0
+
+    def registrar(self, ms):
+        indice = 0 if ms <= self.MINIMO else math.ceil(math.log(ms / self.MINIMO, self.FACTOR))
+        self.buckets[indice] += 1
+        self.total += 1
+        self.maximo = max(self.maximo, ms)
+
+    def sumar(self, otro):
+        self.buckets.update(otro.buckets)
+        self.total += otro.total
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def percentil(self, p):
+        """Límite superior del bucket que contiene el percentil p (0-100), o None sin datos"""
+        if not self.total:
+            return None
+        objetivo = max(math.ceil(self.total * p / 100), 1)
+        acumulado = 0
+        for indice in sorted(self.buckets):
+            acumulado += self.buckets[indice]
+            if acumulado >= objetivo:
+                return min(self.MINIMO * self.FACTOR ** indice, self.maximo)
+        return self.maximo
+
+
+class Estadisticas:
+    """Intentos por resultado y latencias de una operación"""
+
+    def __init__(self):
+        self.resultados = Counter()
+        self.latencias = Histograma()
+        self.reintentos = 0
+
+    def sumar(self, otra):
+        self.resultados.update(otra.resultados)
+        self.latencias.sumar(otra.latencias)
+        self.reintentos += otra.reintentos
+
+    def resumen(self, segundos):
+        intentos = sum(self.resultados.values())
+        fallidos = self.resultados[ERROR] + self.resultados[TIMEOUT]
+        return {
+            'intentos': intentos,
+            'por_segundo': intentos / segundos if segundos else 0.0,
+            'ok': self.resultados[OK],
+            'rechazos': self.resultados[RECHAZO],
+            'errores': self.resultados[ERROR],
+            'timeouts': self.resultados[TIMEOUT],
+            'reintentos': self.reintentos,
+            'tasa_error': fallidos / intentos if intentos else 0.0,
+            'p50_ms': self.latencias.percentil(50),
+            'p95_ms': self.latencias.percentil(95),
+            'p99_ms': self.latencias.percentil(99),
+            'max_ms': self.latencias.maximo if intentos else None,
+        }
+
+
+class Metricas:
+    """
+    Métricas compartidas por todos los lectores. Acumula por operación el
+    período en curso y el total de la corrida; cortar() cierra el período.
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self._periodo = defaultdict(Estadisticas)
+        self._lecturas_periodo = Counter()
+        self.total = defaultdict(Estadisticas)
+        self.lecturas = Counter()
+
+    def registrar(self, operacion, resultado, ms):
+        with self._candado:
+            for estadisticas in (self._periodo[operacion], self.total[operacion]):
+                estadisticas.resultados[resultado] += 1
+                estadisticas.latencias.registrar(ms)
+
+    def reintento(self, operacion):
+        with self._candado:
+            self._periodo[operacion].reintentos += 1
+            self.total[operacion].reintentos += 1
+
+    def lectura(self, clase):
+        with self._candado:
+            self._lecturas_periodo[clase] += 1
+            self.lecturas[clase] += 1
+
+    def cortar(self):
+        """Devuelve (estadísticas por operación, lecturas por clase) del período y empieza otro"""
+        with self._candado:
+            periodo, lecturas = self._periodo, self._lecturas_periodo
+            self._periodo, self._lecturas_periodo = defaultdict(Estadisticas), Counter()
+        return periodo, lecturas
+
+
+def resumir(estadisticas, lecturas, segundos):
+    """Resumen serializable de un período o de la corrida completa"""
+    global_ = Estadisticas()
+    for operacion in estadisticas.values():
+        global_.sumar(operacion)
+    resumen = global_.resumen(segundos)
+    resumen['segundos'] = segundos
+    resumen['eventos_por_segundo'] = estadisticas['evento'].resultados[OK] / segundos if segundos else 0.0
+    resumen['lecturas'] = dict(lecturas)
+    resumen['operaciones'] = {
+        operacion: estadisticas[operacion].resumen(segundos)
+        for operacion in OPERACIONES if operacion in estadisticas
+    }
+    return resumen
+
+
+class Cliente:
+    """
+    Conexión HTTP persistente de un lector. Reintenta los timeouts de las
+    solicitudes seguras con espera exponencial y vuelve a iniciar sesión si el
+    token de acceso expiró.
+    """
+
+    def __init__(self, url, usuario, password, metricas, timeout=10.0, reintentos=3, aleatorio=None):
+        partes = urlsplit(url)
+        self.clase_conexion = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self.host = partes.netloc
+        self.prefijo = partes.path.rstrip('/') + '/api'
+        self.usuario = usuario
+        self.password = password
+        self.metricas = metricas
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.aleatorio = aleatorio or random.Random()
+        self.token = None
+        self._conexion = None
+
+    def cerrar(self):
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    def iniciar_sesion(self):
+        estado, datos = self.solicitud(
+            'login', 'POST', '/auth/login/', {'username': self.usuario, 'password': self.password},
+            autenticar=False, reintentable=True
+        )
+        self.token = datos.get('access') if estado == 200 else None
+        return self.token is not None
+
+    def solicitud(self, operacion, metodo, ruta, datos=None, esperados=(), autenticar=True, reintentable=None):
+        """
+        Envía la solicitud y devuelve (estado HTTP, cuerpo JSON) o (None, None)
+        si no hubo respuesta. Los estados de `esperados` cuentan como rechazo
+        y no como error. Los timeouts se reintentan solo si la solicitud es
+        `reintentable` (por defecto, los métodos seguros).
+        """
+        if reintentable is None:
+            reintentable = metodo in METODOS_SEGUROS
+        cuerpo = json.dumps(datos).encode() if datos is not None else None
+        reautenticado = False
+        intento = 0
+        while True:
+            inicio = time.perf_counter()
+            try:
+                estado, respuesta = self._enviar(metodo, ruta, cuerpo, autenticar)
+            except TimeoutError:
+                self.cerrar()
+                self.metricas.registrar(operacion, TIMEOUT, (time.perf_counter() - inicio) * 1000)
+                if not reintentable or intento >= self.reintentos:
+                    return None, None
+                intento += 1
+                self.metricas.reintento(operacion)
+                espera = min(ESPERA_BASE_REINTENTO * 2 ** (intento - 1), ESPERA_MAXIMA_REINTENTO)
+                time.sleep(espera * self.aleatorio.uniform(0.5, 1.0))
+                continue
+            except (OSError, http.client.HTTPException):
+                self.cerrar()
+                self.metricas.registrar(operacion, ERROR, (time.perf_counter() - inicio) * 1000)
+                return None, None
+            ms = (time.perf_counter() - inicio) * 1000
+
+            if estado == 401 and autenticar and not reautenticado:
+                self.metricas.registrar(operacion, RECHAZO, ms)
+                reautenticado = True
+                if self.iniciar_sesion():
+                    continue
+                return estado, respuesta
+
+            if 200 <= estado < 400:
+                resultado = OK
+            elif estado in esperados:
+                resultado = RECHAZO
+            else:
+                resultado = ERROR
+            self.metricas.registrar(operacion, resultado, ms)
+            return estado, respuesta
+
+    def _enviar(self, metodo, ruta, cuerpo, autenticar):
+        if self._conexion is None:
+            self._conexion = self.clase_conexion(self.host, timeout=self.timeout)
+        encabezados = {'Accept': 'application/json'}
+        if cuerpo is not None:
+            encabezados['Content-Type'] = 'application/json'
+        if autenticar and self.token:
+            encabezados['Authorization'] = f'Bearer {self.token}'
+        self._conexion.request(metodo, self.prefijo + ruta, body=cuerpo, headers=encabezados)
+        respuesta = self._conexion.getresponse()
+        contenido = respuesta.read()
+        if respuesta.will_close:
+            self.cerrar()
+        try:
+            datos = json.loads(contenido) if contenido else {}
+        except ValueError:
+            datos = {}
+        return respuesta.status, datos
+
+
+class Catalogo:
+    """
+    Réplica local de sensores, barreras y departamentos armada con el feed
+    /api/sync/. La comparten todos los lectores; cada uno la actualiza con su
+    propio cursor.
+    """
+
+    def __init__(self):
+        self._candado = threading.Lock()
+        self.sensores = {}
+        self.barreras = {}
+        self.departamentos = {}
+        self.cursor = 0
+        self._pools = None
+
+    def aplicar(self, cambios):
+        with self._candado:
+            for clave, destino in (
+                ('sensores', self.sensores), ('barreras', self.barreras), ('departamentos', self.departamentos)
+            ):
+                seccion = cambios.get(clave) or {}
+                for fila in seccion.get('actualizados', []):
+                    destino[fila['id']] = fila
+                for objeto_id in seccion.get('eliminados', []):
+                    destino.pop(objeto_id, None)
+            if cambios.get('sensores'):
+                self._pools = None
+
+    def sincronizar(self, cliente, cursor=0):
+        """Aplica el feed desde `cursor` hasta ponerse al día y devuelve el nuevo cursor"""
+        while True:
+            estado, datos = cliente.solicitud('sync', 'GET', f'/sync/?{urlencode({"since": cursor})}')
+            if estado != 200:
+                return cursor
+            self.aplicar(datos)
+            cursor = datos['cursor']
+            with self._candado:
+                self.cursor = max(self.cursor, cursor)
+            if not datos.get('hay_mas'):
+                return cursor
+
+    def uids(self, departamento_id, estado):
+        """UID de los sensores del departamento con ese estado"""
+        with self._candado:
+            if self._pools is None:
+                pools = defaultdict(list)
+                for sensor in self.sensores.values():
+                    pools[(sensor['departamento_id'], sensor['estado'])].append(sensor['uid'])
+                self._pools = pools
+            return self._pools.get((departamento_id, estado), [])
+
+    def barreras_de(self, departamento_id):
+        with self._candado:
+            return sorted(b['id'] for b in self.barreras.values() if b['departamento_id'] == departamento_id)
+
+
+class Simulacion:
+    """
+    Configuración de la flota y reloj simulado de turnos.
+
+    El reloj simulado empieza en `hora_inicio` (minutos desde la medianoche) y
+    avanza `escala` minutos por cada minuto real, así una corrida corta puede
+    atravesar varios cambios de turno. La tasa de lecturas de cada lector es
+    `lecturas_por_minuto` y se multiplica hasta por `factor_turno` con una
+    campana gaussiana de ancho `ventana_turno` minutos alrededor de cada turno.
+    """
+
+    def __init__(self, url, usuario, password, lectores=20, lecturas_por_minuto=6.0, turnos=(420, 900, 1380),
+                 factor_turno=6.0, ventana_turno=10.0, hora_inicio=0.0, escala=1.0, desconocidos=0.03,
+                 bloqueados=0.02, perdidos=0.01, intervalo_catalogo=60.0, apertura=4.0, timeout=10.0,
+                 reintentos=3, rampa=10.0, semilla=None):
+        self.url = url
+        self.usuario = usuario
+        self.password = password
+        self.lectores = lectores
+        self.lecturas_por_minuto = lecturas_por_minuto
+        self.turnos = list(turnos)
+        self.factor_turno = max(factor_turno, 1.0)
+        self.ventana_turno = ventana_turno
+        self.hora_inicio = hora_inicio
+        self.escala = escala
+        self.desconocidos = desconocidos
+        self.bloqueados = bloqueados
+        self.perdidos = perdidos
+        self.intervalo_catalogo = intervalo_catalogo
+        self.apertura = apertura
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.rampa = rampa
+        self.semilla = semilla if semilla is not None else random.randrange(1 << 30)
+        self.metricas = Metricas()
+        self.catalogo = Catalogo()
+        self.detener = threading.Event()
+        self.inicio = None
+        self.throughput_periodos = []
+
+    def cliente(self, numero=0):
+        return Cliente(
+            self.url, self.usuario, self.password, self.metricas,
+            timeout=self.timeout, reintentos=self.reintentos, aleatorio=random.Random(self.semilla + numero)
+        )
+
+    def minuto_simulado(self, instante):
+        """Minuto del día (0-1440) en el reloj simulado para un instante de time.monotonic()"""
+        transcurrido = (instante - self.inicio) / 60 * self.escala
+        return (self.hora_inicio + transcurrido) % 1440
+
+    def tasa(self, instante):
+        """Lecturas por segundo de un lector en ese instante"""
+        base = self.lecturas_por_minuto / 60
+        if not self.turnos or self.factor_turno == 1.0:
+            return base
+        minuto = self.minuto_simulado(instante)
+        distancia = min(min(abs(minuto - turno), 1440 - abs(minuto - turno)) for turno in self.turnos)
+        return base * (1 + (self.factor_turno - 1) * math.exp(-0.5 * (distancia / self.ventana_turno) ** 2))
+
+    def siguiente_lectura(self, desde, aleatorio):
+        """Instante de la próxima lectura (Poisson no homogéneo por thinning)"""
+        tasa_maxima = self.lecturas_por_minuto / 60 * self.factor_turno
+        if tasa_maxima <= 0:
+            return math.inf
+        instante = desde
+        while True:
+            instante += aleatorio.expovariate(tasa_maxima)
+            if aleatorio.random() * tasa_maxima <= self.tasa(instante):
+                return instante
+
+    def preparar(self, cliente, departamentos, barreras, sensores, informar=print):
+        """
+        Crea por la API los departamentos, barreras y sensores de la simulación
+        que aún no existen. En cada departamento uno de cada 20 sensores queda
+        bloqueado y otro perdido.
+        """
+        self.catalogo.sincronizar(cliente)
+        existentes = {d['nombre']: d['id'] for d in self.catalogo.departamentos.values()}
+        nombres_barreras = {b['nombre'] for b in self.catalogo.barreras.values()}
+        uids = {s['uid'] for s in self.catalogo.sensores.values()}
+        creados = Counter()
+
+        def crear(tipo, ruta, datos):
+            estado, respuesta = cliente.solicitud('catalogo', 'POST', ruta, datos)
+            if estado != 201:
+                raise RuntimeError(f'No se pudo crear {tipo} {datos}: {estado} {respuesta}')
+            creados[tipo] += 1
+            return respuesta
+
+        for numero in range(1, departamentos + 1):
+            nombre = f'Simulación {numero:03d}'
+            departamento_id = existentes.get(nombre)
+            if departamento_id is None:
+                departamento_id = crear('departamentos', '/departamentos/', {
+                    'nombre': nombre, 'descripcion': 'Creado por simular_lectores'
+                })['id']
+            for b in range(1, barreras + 1):
+                nombre_barrera = f'SIM-{numero:03d}-B{b:02d}'
+                if nombre_barrera not in nombres_barreras:
+                    crear('barreras', '/barreras/', {'nombre': nombre_barrera, 'departamento': departamento_id})
+            for s in range(1, sensores + 1):
+                uid = f'SIM-{numero:03d}-{s:05d}'
+                if uid in uids:
+                    continue
+                estado = {0: BLOQUEADO, 1: PERDIDO}.get(s % 20, 'activo')
+                crear('sensores', '/sensores/', {'uid': uid, 'estado': estado, 'departamento': departamento_id})
+
+        # El feed entrega los cambios recién asentados (SYNC_ASENTAMIENTO en
+        # el servidor): se espera hasta ver los objetos creados
+        plazo = time.monotonic() + 30
+        while True:
+            self.catalogo.sincronizar(cliente, self.catalogo.cursor)
+            with self.catalogo._candado:
+                vistos = len(self.catalogo.departamentos) + len(self.catalogo.barreras) + len(self.catalogo.sensores)
+            esperados = len(existentes) + len(nombres_barreras) + len(uids) + sum(creados.values())
+            if vistos >= esperados or time.monotonic() > plazo:
+                break
+            time.sleep(0.5)
+        informar(', '.join(f'{tipo}: {cantidad}' for tipo, cantidad in creados.items()) or 'ninguno')
+        return [f'Simulación {numero:03d}' for numero in range(1, departamentos + 1)]
+
+    def elegir_departamentos(self, cantidad, nombres=None):
+        """Ids de los departamentos donde se ubican los lectores"""
+        if nombres:
+            por_nombre = {d['nombre']: d['id'] for d in self.catalogo.departamentos.values()}
+            return [por_nombre[nombre] for nombre in nombres if nombre in por_nombre][:cantidad]
+        return [
+            departamento_id for departamento_id in sorted(self.catalogo.departamentos)
+            if self.catalogo.uids(departamento_id, 'activo')
+        ][:cantidad]
+
+    def ejecutar(self, departamentos, duracion, reporte=60.0, informar=None):
+        """
+        Lanza los lectores repartidos entre `departamentos` (y entre las
+        barreras de cada uno) durante `duracion` segundos o hasta que se active
+        `detener`. Llama a informar(resumen) al cerrar cada período de
+        `reporte` segundos y devuelve el resumen de la corrida completa.
+        """
+        self.inicio = time.monotonic()
+        lectores = []
+        for numero in range(self.lectores):
+            departamento_id = departamentos[numero % len(departamentos)]
+            barreras = self.catalogo.barreras_de(departamento_id)
+            barrera_id = barreras[(numero // len(departamentos)) % len(barreras)] if barreras else None
+            retraso = self.rampa * numero / self.lectores
+            lectores.append(Lector(self, numero, departamento_id, barrera_id, retraso))
+        for lector in lectores:
+            lector.start()
+
+        fin = self.inicio + duracion
+        ultimo_corte = self.inicio
+        try:
+            while not self.detener.is_set():
+                ahora = time.monotonic()
+                if ahora >= fin:
+                    break
+                if self.detener.wait(min(ultimo_corte + reporte, fin) - ahora):
+                    break
+                ahora = time.monotonic()
+                if ahora - ultimo_corte >= reporte:
+                    self._cortar(ahora - ultimo_corte, informar)
+                    ultimo_corte = ahora
+        finally:
+            self.detener.set()
+            for lector in lectores:
+                lector.join()
+
+        ahora = time.monotonic()
+        if ahora - ultimo_corte >= 1:
+            self._cortar(ahora - ultimo_corte, informar, completo=False)
+        resumen = resumir(self.metricas.total, self.metricas.lecturas, ahora - self.inicio)
+        resumen['lectores'] = self.lectores
+        resumen['departamentos'] = len(departamentos)
+        resumen['minimo_por_segundo'] = min(self.throughput_periodos) if self.throughput_periodos else None
+        return resumen
+
+    def _cortar(self, segundos, informar, completo=True):
+        periodo, lecturas = self.metricas.cortar()
+        resumen = resumir(periodo, lecturas, segundos)
+        if completo:
+            self.throughput_periodos.append(resumen['por_segundo'])
+        resumen['transcurrido'] = time.monotonic() - self.inicio
+        resumen['minuto_simulado'] = self.minuto_simulado(time.monotonic())
+        if informar:
+            informar(resumen)
+
+
+class Lector(threading.Thread):
+    """Un lector RFID ubicado en una barrera de un departamento"""
+
+    def __init__(self, simulacion, numero, departamento_id, barrera_id, retraso=0.0):
+        super().__init__(name=f'lector-{numero}', daemon=True)
+        self.simulacion = simulacion
+        self.departamento_id = departamento_id
+        self.barrera_id = barrera_id
+        self.retraso = retraso
+        self.aleatorio = random.Random(simulacion.semilla * 1000003 + numero)
+        self.cliente = simulacion.cliente(numero)
+        self.cursor = simulacion.catalogo.cursor
+
+    def run(self):
+        simulacion = self.simulacion
+        if simulacion.detener.wait(self.retraso):
+            return
+        try:
+            while not self.cliente.iniciar_sesion():
+                if simulacion.detener.wait(5):
+                    return
+            self._ciclo()
+        finally:
+            self.cliente.cerrar()
+
+    def _ciclo(self):
+        simulacion = self.simulacion
+        ahora = time.monotonic()
+        proxima_lectura = simulacion.siguiente_lectura(ahora, self.aleatorio)
+        proximo_catalogo = ahora + self.aleatorio.uniform(0, simulacion.intervalo_catalogo)
+        cerrar_en = None
+        while not simulacion.detener.is_set():
+            ahora = time.monotonic()
+            if cerrar_en is not None and ahora >= cerrar_en:
+                self._cambiar_barrera('cerrada')
+                cerrar_en = None
+            elif ahora >= proximo_catalogo:
+                self._consultar_catalogo()
+                proximo_catalogo = time.monotonic() + simulacion.intervalo_catalogo
+            elif ahora >= proxima_lectura:
+                if self._leer() and self.barrera_id is not None:
+                    self._cambiar_barrera('abierta')
+                    cerrar_en = time.monotonic() + simulacion.apertura
+                proxima_lectura = simulacion.siguiente_lectura(time.monotonic(), self.aleatorio)
+            else:
+                siguiente = min(proxima_lectura, proximo_catalogo, cerrar_en if cerrar_en is not None else math.inf)
+                simulacion.detener.wait(siguiente - ahora)
+
+    def _elegir_uid(self):
+        """(clase, uid) de la próxima tarjeta leída"""
+        simulacion = self.simulacion
+        azar = self.aleatorio.random()
+        for clase, fraccion in ((DESCONOCIDO, simulacion.desconocidos), (BLOQUEADO, simulacion.bloqueados),
+                                (PERDIDO, simulacion.perdidos)):
+            if azar < fraccion:
+                if clase == DESCONOCIDO:
+                    return clase, f'SIM-X-{uuid.UUID(int=self.aleatorio.getrandbits(128)).hex[:12]}'
+                uids = simulacion.catalogo.uids(self.departamento_id, clase)
+                if uids:
+                    return clase, self.aleatorio.choice(uids)
+                break
+            azar -= fraccion
+        uids = simulacion.catalogo.uids(self.departamento_id, 'activo')
+        return (VALIDO, self.aleatorio.choice(uids)) if uids else (None, None)
+
+    def _leer(self):
+        """Procesa una lectura y devuelve True si el acceso fue permitido"""
+        clase, uid = self._elegir_uid()
+        if uid is None:
+            return False
+        self.simulacion.metricas.lectura(clase)
+        # POST de solo lectura: se puede reintentar
+        estado, datos = self.cliente.solicitud(
+            'buscar_uid', 'POST', '/sensores/buscar_uids/', {'uids': [uid]}, reintentable=True
+        )
+        if estado != 200 or not datos.get(uid, {}).get('encontrado'):
+            return False
+
+        sensor = datos[uid]
+        permitido = sensor['estado'] == 'activo'
+        # El lector registra también los intentos con tarjetas no activas; la API los rechaza con 400
+        estado, _ = self.cliente.solicitud('evento', 'POST', '/eventos/', {
+            'sensor': sensor['id'],
+            'tipo_evento': 'acceso',
+            'resultado': 'permitido' if permitido else 'denegado',
+            'barrera': self.barrera_id,
+        }, esperados=() if permitido else (400,))
+        return permitido and estado == 201
+
+    def _cambiar_barrera(self, estado):
+        self.cliente.solicitud(
+            'barrera', 'PATCH', f'/barreras/{self.barrera_id}/estado/', {'estado': estado}, esperados=(409,)
+        )
+
+    def _consultar_catalogo(self):
+        self.cursor = self.simulacion.catalogo.sincronizar(self.cliente, self.cursor)
+        self.cliente.solicitud('catalogo', 'GET', f'/barreras/?{urlencode({"departamento": self.departamento_id})}')
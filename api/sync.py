@@ -0,0 +1,147 @@
+"""
+Feed incremental de cambios para controladores de borde.
+
+Cada creación, actualización o eliminación de Sensor, Barrera o Departamento
+agrega una fila a CambioSync dentro de la misma transacción. El endpoint
+GET /api/sync/?since=<cursor> entrega solo las filas modificadas desde ese
+cursor y las eliminaciones como tombstones (solo el id).
+
+El id autoincremental se asigna al insertar, no al confirmar: una transacción
+larga puede confirmar el id 10 después de que otra confirmó el 11. Para que el
+cursor no salte ids todavía invisibles, el feed solo entrega entradas con más
+de SYNC_ASENTAMIENTO segundos de antigüedad y se detiene en la primera más
+reciente (marca de agua segura).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CambioSync, Departamento, Sensor, Barrera
+from .signals import estado_actualizado
+
+
+MODELOS_SYNC = {
+    Sensor: CambioSync.SENSOR,
+    Barrera: CambioSync.BARRERA,
+    Departamento: CambioSync.DEPARTAMENTO,
+}
+
+# Campos mínimos que necesita un controlador para replicar cada modelo
+CAMPOS_SYNC = {
+    CambioSync.SENSOR: ('id', 'uid', 'estado', 'departamento_id', 'version', 'fecha_actualizacion'),
+    CambioSync.BARRERA: ('id', 'nombre', 'estado', 'departamento_id', 'version', 'fecha_actualizacion'),
+    CambioSync.DEPARTAMENTO: ('id', 'nombre'),
+}
+
+# Nombre de cada colección en la respuesta del feed
+CLAVES_RESPUESTA = {
+    CambioSync.SENSOR: 'sensores',
+    CambioSync.BARRERA: 'barreras',
+    CambioSync.DEPARTAMENTO: 'departamentos',
+}
+
+LIMITE_POR_DEFECTO = 1000
+LIMITE_MAXIMO = 10000
+
+
+def registrar_guardado(sender, instance, raw=False, **kwargs):
+    modelo = MODELOS_SYNC.get(sender)
+    if modelo is None or raw:
+        return
+    CambioSync.objects.create(modelo=modelo, objeto_id=instance.pk, operacion=CambioSync.ACTUALIZADO)
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    modelo = MODELOS_SYNC.get(sender)
+    if modelo is None:
+        return
+    CambioSync.objects.create(modelo=modelo, objeto_id=instance.pk, operacion=CambioSync.ELIMINADO)
+
+
+@receiver(estado_actualizado)
+def registrar_cambio_estado(sender, ids, **kwargs):
+    modelo = MODELOS_SYNC.get(sender)
+    if modelo is None:
+        return
+    CambioSync.objects.bulk_create([
+        CambioSync(modelo=modelo, objeto_id=objeto_id, operacion=CambioSync.ACTUALIZADO)
+        for objeto_id in ids
+    ])
+
+
+# Se conectan por modelo (y no a todos los senders) para no desactivar el
+# borrado rápido en cascada de los demás modelos, como Evento.
+for _clase in MODELOS_SYNC:
+    post_save.connect(registrar_guardado, sender=_clase)
+    post_delete.connect(registrar_eliminacion, sender=_clase)
+
+
+def obtener_cambios(since, limite=LIMITE_POR_DEFECTO):
+    """
+    Construye la respuesta del feed a partir del cursor `since`.
+
+    Se leen como máximo `limite` entradas del registro; si un objeto aparece
+    varias veces solo cuenta su última operación. Las filas vigentes se leen
+    con una consulta `pk__in` por modelo. La lectura se corta en la primera
+    entrada sin asentar (ver docstring del módulo); esas entradas se entregan
+    en una consulta posterior.
+    """
+    umbral = timezone.now() - timedelta(seconds=settings.SYNC_ASENTAMIENTO)
+    cambios = list(
+        CambioSync.objects.filter(id__gt=since)
+        .order_by('id')
+        .values_list('id', 'modelo', 'objeto_id', 'operacion', 'fecha')[:limite + 1]
+    )
+    asentados = next((i for i, cambio in enumerate(cambios) if cambio[4] > umbral), len(cambios))
+    hay_mas = asentados > limite
+    cambios = cambios[:min(asentados, limite)]
+    
+    ultima_operacion = {}
+    for _, modelo, objeto_id, operacion, _ in cambios:
+        ultima_operacion[(modelo, objeto_id)] = operacion
+    
+    respuesta = {
+        'cursor': cambios[-1][0] if cambios else since,
+        'hay_mas': hay_mas,
+    }
+    for clase, modelo in MODELOS_SYNC.items():
+        actualizados_ids = [
+            objeto_id for (m, objeto_id), operacion in ultima_operacion.items()
+            if m == modelo and operacion == CambioSync.ACTUALIZADO
+        ]
+        eliminados = [
+            objeto_id for (m, objeto_id), operacion in ultima_operacion.items()
+            if m == modelo and operacion == CambioSync.ELIMINADO
+        ]
+        actualizados = list(
+            clase.objects.filter(pk__in=actualizados_ids).order_by('pk').values(*CAMPOS_SYNC[modelo])
+        ) if actualizados_ids else []
+        
+        # Un objeto actualizado y luego eliminado fuera de esta página ya no existe
+        encontrados = {fila['id'] for fila in actualizados}
+        eliminados.extend(objeto_id for objeto_id in actualizados_ids if objeto_id not in encontrados)
+        
+        respuesta[CLAVES_RESPUESTA[modelo]] = {
+            'actualizados': actualizados,
+            'eliminados': sorted(eliminados),
+        }
+    return respuesta
+
+
+def podar_cambios(hasta_fecha):
+    """
+    Elimina las entradas anteriores a `hasta_fecha`, conservando siempre la
+    última entrada de cada objeto. Como toda entrada podada tiene una entrada
+    posterior del mismo objeto, cualquier cursor sigue obteniendo el estado
+    correcto (incluidos los tombstones).
+    """
+    ultimas = (
+        CambioSync.objects.values('modelo', 'objeto_id')
+        .annotate(ultimo=Max('id'))
+        .values_list('ultimo', flat=True)
+    )
+    return CambioSync.objects.filter(fecha__lt=hasta_fecha).exclude(id__in=ultimas).delete()[0]
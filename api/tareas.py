@@ -0,0 +1,268 @@
+"""
+Tareas disponibles como jobs en segundo plano (ver api/jobs.py).
+
+Cada tarea recibe los parámetros del job y su Progreso; las que recorren
+muchas filas lo hacen por bloques ordenados por id y guardan como checkpoint
+el último id procesado, para continuar desde ahí si el job se reanuda.
+"""
+import contextlib
+import csv
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+from . import allowlist, contadores, estados, historial, ocupacion, resumenes, sharding
+from .jobs import encolar, tarea
+from .models import Evento, Sensor
+from .serializers import SensorSerializer
+from .sync import podar_cambios
+
+
+TAMANO_LOTE = 2000
+
+COLUMNAS_EXPORTACION = [
+    'id', 'fecha', 'sensor', 'sensor_uid', 'departamento', 'barrera',
+    'tipo_evento', 'resultado', 'descripcion',
+]
+
+
+def _alias_eventos():
+    """Bases de datos con eventos, en orden creciente de ids (ver api/sharding.py)"""
+    return settings.EVENTO_SHARDS or [DEFAULT_DB_ALIAS]
+
+
+def _lotes_por_id(queryset, ultimo_id, alias=(DEFAULT_DB_ALIAS,)):
+    """Recorre el queryset por bloques de TAMANO_LOTE filas con id mayor a `ultimo_id`"""
+    for base in alias:
+        while True:
+            lote = list(queryset.using(base).filter(pk__gt=ultimo_id).order_by('pk')[:TAMANO_LOTE])
+            if not lote:
+                break
+            ultimo_id = lote[-1].pk
+            yield lote
+
+
+@tarea('exportar_eventos')
+def exportar_eventos(parametros, progreso):
+    """
+    Exporta eventos a CSV en settings.JOBS_DIR.
+    Parámetros opcionales: departamento, desde, hasta (fechas ISO).
+    """
+    eventos = Evento.objects.select_related('detalle')
+    if parametros.get('departamento'):
+        eventos = eventos.filter(departamento_id=parametros['departamento'])
+    if parametros.get('desde'):
+        eventos = eventos.filter(fecha__gte=parametros['desde'])
+    if parametros.get('hasta'):
+        eventos = eventos.filter(fecha__lt=parametros['hasta'])
+
+    os.makedirs(settings.JOBS_DIR, exist_ok=True)
+    nombre = f'eventos-job-{progreso.job_id}.csv'
+    ruta = os.path.join(settings.JOBS_DIR, nombre)
+    checkpoint = progreso.checkpoint or {}
+
+    if checkpoint:
+        # Descartar lo escrito después del último bloque confirmado
+        archivo = open(ruta, 'r+', newline='', encoding='utf-8')
+        archivo.truncate(checkpoint['bytes'])
+        archivo.seek(checkpoint['bytes'])
+    else:
+        archivo = open(ruta, 'w', newline='', encoding='utf-8')
+        csv.writer(archivo).writerow(COLUMNAS_EXPORTACION)
+        progreso.definir_total(sharding.contar(eventos))
+
+    ultimo_id = checkpoint.get('ultimo_id', 0)
+    with archivo:
+        escritor = csv.writer(archivo)
+        for lote in _lotes_por_id(eventos, ultimo_id, _alias_eventos()):
+            uids = dict(Sensor.todos.filter(pk__in={evento.sensor_id for evento in lote}).values_list('pk', 'uid'))
+            escritor.writerows(
+                [
+                    evento.pk, evento.fecha.isoformat(), evento.sensor_id, uids.get(evento.sensor_id, ''),
+                    evento.departamento_id or '', evento.barrera_id or '',
+                    evento.tipo_evento, evento.resultado, evento.descripcion or '',
+                ]
+                for evento in lote
+            )
+            archivo.flush()
+            ultimo_id = lote[-1].pk
+            progreso.avanzar(len(lote), {'ultimo_id': ultimo_id, 'bytes': archivo.tell()})
+
+    return {'archivo': nombre, 'filas': progreso.progreso}
+
+
+@tarea('cambiar_estado_sensores')
+def cambiar_estado_sensores(parametros, progreso):
+    """
+    Cambia el estado de los sensores filtrados, un UPDATE por bloque.
+    Parámetros: estado; opcionales: departamento, estado_actual.
+    """
+    nuevo_estado = parametros.get('estado')
+    if nuevo_estado not in dict(Sensor.ESTADO_CHOICES):
+        raise ValueError(f"Estado inválido: '{nuevo_estado}'")
+
+    sensores = Sensor.objects.exclude(estado=nuevo_estado)
+    if parametros.get('departamento'):
+        sensores = sensores.filter(departamento_id=parametros['departamento'])
+    if parametros.get('estado_actual'):
+        sensores = sensores.filter(estado=parametros['estado_actual'])
+
+    checkpoint = progreso.checkpoint or {'ultimo_id': 0, 'actualizados': 0}
+    if progreso.total is None:
+        progreso.definir_total(sensores.count())
+
+    for lote in _lotes_por_id(sensores.only('pk'), checkpoint['ultimo_id']):
+        ids = [sensor.pk for sensor in lote]
+        actualizados = estados.cambiar_estado_masivo(Sensor.objects.all(), nuevo_estado, progreso.usuario, ids=ids)
+        checkpoint = {'ultimo_id': ids[-1], 'actualizados': checkpoint['actualizados'] + len(actualizados)}
+        progreso.avanzar(len(ids), checkpoint)
+
+    return {'estado': nuevo_estado, 'actualizados': checkpoint['actualizados']}
+
+
+@tarea('importar_sensores')
+def importar_sensores(parametros, progreso):
+    """
+    Crea sensores a partir de parametros['sensores'], una lista de objetos con
+    los campos de SensorSerializer. Los inválidos se informan en el resultado.
+    """
+    filas = parametros.get('sensores') or []
+    checkpoint = progreso.checkpoint or {'siguiente': 0, 'creados': 0, 'errores': []}
+    if progreso.total is None:
+        progreso.definir_total(len(filas))
+
+    for inicio in range(checkpoint['siguiente'], len(filas), TAMANO_LOTE):
+        bloque = filas[inicio:inicio + TAMANO_LOTE]
+        creados, errores = 0, []
+        for indice, datos in enumerate(bloque, start=inicio):
+            serializer = SensorSerializer(data=datos)
+            if serializer.is_valid():
+                with historial.usuario_actual(progreso.usuario):
+                    serializer.save()
+                creados += 1
+            else:
+                errores.append({'fila': indice, 'errores': serializer.errors})
+        checkpoint = {
+            'siguiente': inicio + len(bloque),
+            'creados': checkpoint['creados'] + creados,
+            'errores': checkpoint['errores'] + errores,
+        }
+        progreso.avanzar(len(bloque), checkpoint)
+
+    return {'creados': checkpoint['creados'], 'errores': checkpoint['errores']}
+
+
+def eliminar_sensores(sensores, usuario=None):
+    """
+    Borrado lógico de los sensores y un job 'purgar_sensores' que elimina sus
+    eventos en segundo plano; retorna el Job
+    """
+    sensores = list(sensores)
+    with transaction.atomic():
+        for sensor in sensores:
+            sensor.marcar_eliminado()
+        return encolar('purgar_sensores', {'sensores': [sensor.pk for sensor in sensores]}, usuario)
+
+
+@tarea('purgar_sensores')
+def purgar_sensores(parametros, progreso):
+    """
+    Borra por lotes los eventos de los sensores eliminados (ver
+    Sensor.marcar_eliminado) y al final las filas de los sensores. Cada lote
+    se borra en su propia transacción, así la base de datos nunca queda
+    bloqueada más que lo que tarda un bloque de TAMANO_LOTE eventos.
+    Parámetros opcionales: sensores (ids; por defecto todos los eliminados) y
+    archivar (true: antes de borrarlos guarda los eventos en un CSV de
+    settings.JOBS_DIR con las columnas de exportar_eventos).
+    """
+    sensores = Sensor.todos.filter(fecha_eliminacion__isnull=False)
+    if parametros.get('sensores'):
+        sensores = sensores.filter(pk__in=parametros['sensores'])
+    sensor_ids = list(sensores.order_by('pk').values_list('pk', flat=True))
+    eventos = Evento.objects.filter(sensor_id__in=sensor_ids)
+    if parametros.get('archivar'):
+        eventos = eventos.select_related('detalle')
+    else:
+        eventos = eventos.only('sensor', 'fecha', 'departamento', 'tipo_evento', 'resultado')
+
+    checkpoint = progreso.checkpoint or {'eliminados': 0}
+    if progreso.total is None:
+        progreso.definir_total(sharding.contar(eventos))
+
+    nombre = None
+    archivo = contextlib.nullcontext()
+    if parametros.get('archivar'):
+        uids = dict(Sensor.todos.filter(pk__in=sensor_ids).values_list('pk', 'uid'))
+        os.makedirs(settings.JOBS_DIR, exist_ok=True)
+        nombre = f'eventos-purgados-job-{progreso.job_id}.csv'
+        ruta = os.path.join(settings.JOBS_DIR, nombre)
+        # Al reanudar se agrega al final: un lote escrito cuyo borrado no
+        # llegó a confirmarse queda repetido, pero nunca se pierde
+        nuevo = not checkpoint.get('archivo')
+        archivo = open(ruta, 'w' if nuevo else 'a', newline='', encoding='utf-8')
+        if nuevo:
+            csv.writer(archivo).writerow(COLUMNAS_EXPORTACION)
+        checkpoint['archivo'] = nombre
+
+    with archivo:
+        for alias in _alias_eventos():
+            while True:
+                lote = list(eventos.using(alias).order_by('pk')[:TAMANO_LOTE])
+                if not lote:
+                    break
+                if nombre:
+                    csv.writer(archivo).writerows(
+                        [
+                            evento.pk, evento.fecha.isoformat(), evento.sensor_id, uids.get(evento.sensor_id, ''),
+                            evento.departamento_id or '', evento.barrera_id or '',
+                            evento.tipo_evento, evento.resultado, evento.descripcion or '',
+                        ]
+                        for evento in lote
+                    )
+                    archivo.flush()
+                    os.fsync(archivo.fileno())
+                with transaction.atomic(using=alias):
+                    Evento.objects.using(alias).filter(pk__in=[evento.pk for evento in lote]).delete()
+                    contadores.ajustar(lote, -1)
+                    resumenes.ajustar(lote, -1)
+                checkpoint = {**checkpoint, 'eliminados': checkpoint['eliminados'] + len(lote)}
+                progreso.avanzar(len(lote), checkpoint)
+
+    for sensor in Sensor.todos.filter(pk__in=sensor_ids, fecha_eliminacion__isnull=False):
+        sensor.delete()
+
+    return {'sensores': len(sensor_ids), 'eventos_eliminados': checkpoint['eliminados'], 'archivo': nombre}
+
+
+@tarea('recalcular_contadores')
+def recalcular_contadores(parametros, progreso):
+    return {'recalculados': contadores.recalcular()}
+
+
+@tarea('reconstruir_ocupacion')
+def reconstruir_ocupacion(parametros, progreso):
+    return {'ocupantes': ocupacion.reconstruir()}
+
+
+@tarea('reconstruir_resumenes')
+def reconstruir_resumenes(parametros, progreso):
+    if parametros.get('incremental'):
+        return {'filas': resumenes.poner_al_dia()}
+    return {'filas': resumenes.reconstruir()}
+
+
+@tarea('construir_allowlists')
+def construir_allowlists(parametros, progreso):
+    """Reconstruye los snapshots de allowlist desactualizados; parámetro opcional: tipos"""
+    tipos = parametros.get('tipos') or list(allowlist.TIPOS)
+    return {'construidos': len(allowlist.construir_pendientes(tipos))}
+
+
+@tarea('podar_cambios_sync')
+def podar_cambios_sync(parametros, progreso):
+    """Archiva el registro de sincronización; parámetro opcional: dias (30)"""
+    dias = int(parametros.get('dias', 30))
+    return {'eliminadas': podar_cambios(timezone.now() - timedelta(days=dias))}
@@ -1,3 +1,1657 @@
-from django.test import TestCase
+"""
+Presupuesto de consultas SQL por endpoint.
 
-# Create your tests here.
+Cada prueba fija el número máximo de consultas de una acción y verifica que
+ese número no crece con el tamaño de página o la cantidad de objetos
+relacionados, para detectar consultas N+1 (por ejemplo, quitar un
+select_related de un queryset o consultar el rol dentro de un serializer).
+"""
+import csv
+import hashlib
+import os
+import random
+import sys
+import tempfile
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Sum
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.serializers import Serializer
+from rest_framework.test import APIClient
+
+from . import (
+    allowlist, anomalias, contadores, db_routers, estados, ocupacion, perfilado, resumenes, salud, sharding, simulacion,
+    tareas, warmup
+)
+from . import cache as cache_api
+from . import sync as sync_feed
+from .models import (
+    Barrera, CambioSync, ContadorFilas, Departamento, Evento, EventoDescripcion, EventoResumenHora, Job, PerfilUsuario, Presencia,
+    Rol, Sensor, TransicionEstado
+)
+from .serializers import SensorEstadoMasivoSerializer, SensorSerializer
+
+
+class ArchivosTemporalesMixin:
+    """Las allowlists que escriben las pruebas van a un directorio temporal y no al del repositorio"""
+
+    @classmethod
+    def setUpClass(cls):
+        directorio = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directorio.cleanup)
+        ajustes = override_settings(ALLOWLIST_DIR=directorio.name)
+        ajustes.enable()
+        cls.addClassCleanup(ajustes.disable)
+        super().setUpClass()
+
+
+class BasesSQLiteMixin:
+    """
+    Agrega a la prueba las bases `bases_sqlite`, cada una en su propio archivo
+    SQLite temporal con todas las migraciones, vacía e independiente de
+    'default' (por ejemplo, una réplica con lag o un shard).
+    """
+    bases_sqlite = ()
+
+    @classmethod
+    def setUpClass(cls):
+        directorio = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directorio.cleanup)
+        for alias in cls.bases_sqlite:
+            connections.settings[alias] = {
+                **connections.settings[DEFAULT_DB_ALIAS],
+                'NAME': os.path.join(directorio.name, f'{alias}.sqlite3'),
+                'TEST': {'NAME': None, 'MIRROR': None},
+            }
+            cls.addClassCleanup(cls._quitar_base, alias)
+            call_command('migrate', database=alias, verbosity=0)
+        cls.databases = {DEFAULT_DB_ALIAS, *cls.bases_sqlite}
+        super().setUpClass()
+
+    @staticmethod
+    def _quitar_base(alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PresupuestoConsultasTestCase(ArchivosTemporalesMixin, TestCase):
+    """Datos de prueba y utilidades para medir consultas por solicitud"""
+
+    def setUp(self):
+        cache.clear()
+        anomalias._detector = None
+
+        self.rol_admin = Rol.objects.create(nombre=Rol.ADMIN)
+        self.rol_operador = Rol.objects.create(nombre=Rol.OPERADOR)
+        self.admin = User.objects.create_user('admin', password='clave-admin-123')
+        PerfilUsuario.objects.create(user=self.admin, rol=self.rol_admin)
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+        self.departamentos = []
+        self.sensores = []
+        self.barreras = []
+        self.agregar_datos(2)
+
+    def agregar_datos(self, cantidad):
+        """Agrega `cantidad` departamentos, cada uno con usuarios, sensores, barreras y eventos"""
+        for _ in range(cantidad):
+            indice = len(self.departamentos)
+            departamento = Departamento.objects.create(nombre=f'Departamento {indice}')
+            self.departamentos.append(departamento)
+            for numero in range(3):
+                usuario = User.objects.create_user(f'usuario-{indice}-{numero}', password='clave-usuario-123')
+                PerfilUsuario.objects.create(user=usuario, rol=self.rol_operador)
+                sensor = Sensor.objects.create(
+                    uid=f'UID-{indice:03d}-{numero}',
+                    departamento=departamento,
+                    usuario_asociado=usuario
+                )
+                self.sensores.append(sensor)
+                Evento.objects.bulk_create([
+                    Evento(sensor=sensor, resultado=resultado)
+                    for resultado in (Evento.PERMITIDO, Evento.DENEGADO, Evento.PERMITIDO)
+                ])
+            for numero in range(2):
+                self.barreras.append(Barrera.objects.create(
+                    nombre=f'Barrera {indice}-{numero}',
+                    departamento=departamento,
+                    estado=Barrera.ABIERTA
+                ))
+
+    def contar_consultas(self, solicitud, status_esperado=200):
+        """Ejecuta la solicitud con la caché vacía y retorna el número de consultas"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = solicitud()
+        self.assertEqual(respuesta.status_code, status_esperado, getattr(respuesta, 'data', respuesta))
+        return len(contexto)
+
+    def assertPresupuesto(self, presupuesto, solicitud, status_esperado=200, crecer=None):
+        """
+        Verifica que la solicitud no supere `presupuesto` consultas y que el
+        número no crezca al agregar datos y al agrandar el tamaño de página.
+        """
+        consultas = self.contar_consultas(solicitud, status_esperado)
+        self.assertLessEqual(consultas, presupuesto, f'{consultas} consultas, presupuesto {presupuesto}')
+        if crecer is None:
+            return
+
+        crecer()
+        with mock.patch.object(PageNumberPagination, 'page_size', 100):
+            consultas_con_mas_datos = self.contar_consultas(solicitud, status_esperado)
+        self.assertLessEqual(
+            consultas_con_mas_datos, consultas,
+            'El número de consultas crece con la cantidad de datos (posible N+1)'
+        )
+
+    def crecer(self):
+        self.agregar_datos(8)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ApiTestCase(ArchivosTemporalesMixin, TestCase):
+    """Base de las pruebas funcionales: un admin autenticado y un departamento vacío"""
+
+    def setUp(self):
+        cache.clear()
+        anomalias._detector = None
+
+        self.admin = User.objects.create_user('admin', password='clave-admin-123')
+        PerfilUsuario.objects.create(user=self.admin, rol=Rol.objects.create(nombre=Rol.ADMIN))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.departamento = Departamento.objects.create(nombre='Departamento A')
+
+    def crear_sensor(self, uid, departamento=None, **campos):
+        return Sensor.objects.create(uid=uid, departamento=departamento or self.departamento, **campos)
+
+    def crear_eventos(self, sensor, *resultados):
+        return Evento.objects.bulk_create(Evento(sensor=sensor, resultado=resultado) for resultado in resultados)
+
+
+class DepartamentoConsultasTest(PresupuestoConsultasTestCase):
+
+    def test_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/departamentos/'), crecer=self.crecer)
+
+    def test_retrieve(self):
+        departamento = self.departamentos[0]
+        self.assertPresupuesto(2, lambda: self.client.get(f'/api/departamentos/{departamento.id}/'))
+
+    def test_create(self):
+        self.assertPresupuesto(
+            4,
+            lambda: self.client.post('/api/departamentos/', {'nombre': 'Operaciones'}, format='json'),
+            status_esperado=201
+        )
+
+    def test_ocupacion(self):
+        departamento = self.departamentos[0]
+        url = f'/api/departamentos/{departamento.id}/ocupacion/'
+
+        def ocupar():
+            # Los eventos sembrados con bulk_create no actualizan la presencia (api/ocupacion.py)
+            ocupados = set(Presencia.objects.values_list('sensor_id', flat=True))
+            Presencia.objects.bulk_create(
+                Presencia(
+                    sensor=sensor, departamento=departamento,
+                    usuario_id=sensor.usuario_asociado_id, fecha_entrada=timezone.now()
+                )
+                for sensor in self.sensores if sensor.pk not in ocupados
+            )
+
+        def crecer():
+            self.crecer()
+            ocupar()
+
+        ocupar()
+        self.assertPresupuesto(2, lambda: self.client.get(url), crecer=crecer)
+        self.assertEqual(self.client.get(url).data['total'], len(self.sensores))
+
+
+class RolYUsuarioConsultasTest(PresupuestoConsultasTestCase):
+
+    def test_roles_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/roles/'))
+
+    def test_usuarios_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/usuarios/'), crecer=self.crecer)
+
+    def test_usuarios_retrieve(self):
+        perfil = PerfilUsuario.objects.get(user=self.admin)
+        self.assertPresupuesto(2, lambda: self.client.get(f'/api/usuarios/{perfil.id}/'))
+
+    def test_usuarios_accesos(self):
+        perfil = PerfilUsuario.objects.get(user=self.sensores[0].usuario_asociado)
+        self.assertPresupuesto(
+            3, lambda: self.client.get(f'/api/usuarios/{perfil.id}/accesos/'), crecer=self.crecer
+        )
+
+
+class AccesosUsuarioTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rol_operador = Rol.objects.create(nombre=Rol.OPERADOR)
+        self.perfiles, self.sensores = [], []
+        for numero in range(2):
+            usuario = User.objects.create_user(f'usuario-{numero}', password='clave-usuario-123')
+            self.perfiles.append(PerfilUsuario.objects.create(user=usuario, rol=rol_operador))
+            sensor = self.crear_sensor(f'UID-{numero}', usuario_asociado=usuario)
+            self.crear_eventos(sensor, Evento.PERMITIDO, Evento.DENEGADO, Evento.PERMITIDO)
+            self.sensores.append(sensor)
+
+    def test_historial_sobrevive_reasignacion(self):
+        sensor = self.sensores[0]
+        anterior, nuevo = self.perfiles
+        sensor.usuario_asociado = nuevo.user
+        sensor.save()
+        respuesta = self.client.post('/api/eventos/', {'sensor': sensor.id, 'resultado': Evento.PERMITIDO}, format='json')
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+
+        accesos_anterior = self.client.get(f'/api/usuarios/{anterior.id}/accesos/').data
+        accesos_nuevo = self.client.get(f'/api/usuarios/{nuevo.id}/accesos/').data
+        self.assertEqual(accesos_anterior['count'], 3)
+        self.assertEqual({evento['sensor'] for evento in accesos_anterior['results']}, {sensor.id})
+        self.assertEqual(accesos_nuevo['count'], 4)
+        self.assertEqual(accesos_nuevo['results'][0]['sensor'], sensor.id)
+        self.assertEqual(accesos_nuevo['results'][0]['usuario'], nuevo.user_id)
+
+    def test_rango_de_fechas(self):
+        url = f'/api/usuarios/{self.perfiles[0].id}/accesos/'
+        self.assertEqual(self.client.get(url, {'desde': '2000-01-01T00:00:00Z'}).data['count'], 3)
+        self.assertEqual(self.client.get(url, {'hasta': '2000-01-01T00:00:00Z'}).data['count'], 0)
+        self.assertEqual(self.client.get(url, {'desde': 'ayer'}).status_code, 400)
+
+
+class SensorConsultasTest(PresupuestoConsultasTestCase):
+
+    def test_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/sensores/'), crecer=self.crecer)
+
+    def test_retrieve(self):
+        sensor = self.sensores[0]
+        self.assertPresupuesto(2, lambda: self.client.get(f'/api/sensores/{sensor.id}/'))
+
+    def test_create(self):
+        datos = {'uid': 'NUEVO-001', 'departamento': self.departamentos[0].id}
+        self.assertPresupuesto(
+            6, lambda: self.client.post('/api/sensores/', datos, format='json'), status_esperado=201
+        )
+
+    def test_cambiar_estado(self):
+        sensor = self.sensores[0]
+        self.assertPresupuesto(
+            9,
+            lambda: self.client.patch(f'/api/sensores/{sensor.id}/cambiar_estado/', {'estado': Sensor.INACTIVO}, format='json')
+        )
+
+    def test_buscar_uids(self):
+        def solicitud():
+            uids = [sensor.uid for sensor in self.sensores] + ['NO-EXISTE']
+            return self.client.post('/api/sensores/buscar_uids/', {'uids': uids}, format='json')
+
+        self.assertPresupuesto(1, solicitud, crecer=self.crecer)
+        respuesta = solicitud()
+        self.assertEqual(respuesta.data['NO-EXISTE'], {'encontrado': False})
+        self.assertEqual(respuesta.data[self.sensores[0].uid]['id'], self.sensores[0].id)
+
+
+class BorradoSensorTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(2)]
+        for sensor in self.sensores:
+            self.crear_eventos(sensor, Evento.PERMITIDO, Evento.DENEGADO, Evento.PERMITIDO)
+
+    def purgar(self):
+        from . import jobs
+
+        job = jobs.reclamar('trabajador-1')
+        with mock.patch.object(tareas, 'TAMANO_LOTE', 2):
+            jobs.ejecutar(job.pk, 'trabajador-1')
+        job.refresh_from_db()
+        return job
+
+    def test_destroy_es_logico_y_la_purga_borra_por_lotes(self):
+        sensor = self.sensores[0]
+        Presencia.objects.create(sensor=sensor, departamento=sensor.departamento, fecha_entrada=timezone.now())
+        contadores.estimar(Evento.objects.all())  # inicializa el contador de filas
+        # Eventos de horas ya resumidas, para que la purga los descuente del resumen
+        Evento.objects.update(fecha=timezone.now() - timedelta(hours=2))
+        resumenes.reconstruir()
+
+        respuesta = self.client.delete(f'/api/sensores/{sensor.id}/')
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(Evento.objects.filter(sensor=sensor).count(), 3)
+        self.assertFalse(Presencia.objects.filter(sensor=sensor).exists())
+        self.assertEqual(self.client.get(f'/api/sensores/{sensor.id}/').status_code, 404)
+        self.assertEqual(
+            self.client.post('/api/sensores/buscar_uids/', {'uids': [sensor.uid]}, format='json').data,
+            {sensor.uid: {'encontrado': False}}
+        )
+        datos = {'uid': sensor.uid, 'departamento': self.departamento.id}
+        self.assertEqual(self.client.post('/api/sensores/', datos, format='json').status_code, 400)
+
+        job = self.purgar()
+        self.assertEqual(job.pk, respuesta.data['job'])
+        self.assertEqual(job.estado, Job.COMPLETADO, job.error)
+        self.assertEqual(job.progreso, 3)
+        self.assertEqual(job.resultado['eventos_eliminados'], 3)
+        self.assertFalse(Sensor.todos.filter(pk=sensor.pk).exists())
+        self.assertEqual(Evento.objects.count(), 3)
+        self.assertEqual(EventoResumenHora.objects.aggregate(total=Sum('total'))['total'], 3)
+        self.assertEqual(ContadorFilas.objects.get(clave='evento').total, 3)
+
+    def test_purga_archivando_eventos(self):
+        from . import jobs
+
+        sensor = self.sensores[1]
+        sensor.marcar_eliminado()
+        jobs.encolar('purgar_sensores', {'archivar': True})
+        with tempfile.TemporaryDirectory() as directorio, self.settings(JOBS_DIR=directorio):
+            job = self.purgar()
+            with open(os.path.join(directorio, job.resultado['archivo']), encoding='utf-8') as archivo:
+                filas = list(csv.reader(archivo))
+        self.assertEqual(job.estado, Job.COMPLETADO, job.error)
+        self.assertEqual(len(filas), 4)
+        self.assertEqual({fila[3] for fila in filas[1:]}, {sensor.uid})
+        self.assertFalse(Evento.objects.filter(sensor_id=sensor.pk).exists())
+
+
+class EventoConsultasTest(PresupuestoConsultasTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # La primera lista inicializa el contador de filas (api/contadores.py)
+        self.client.get('/api/eventos/')
+
+    def test_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/eventos/'), crecer=self.crecer)
+
+    def test_retrieve(self):
+        evento = Evento.objects.first()
+        self.assertPresupuesto(1, lambda: self.client.get(f'/api/eventos/{evento.id}/'))
+
+    def test_create(self):
+        datos = {'sensor': self.sensores[0].id, 'resultado': Evento.PERMITIDO}
+        # Incluye el SAVEPOINT y RELEASE de la transacción del alta dentro de la de la prueba
+        self.assertPresupuesto(
+            9, lambda: self.client.post('/api/eventos/', datos, format='json'), status_esperado=201
+        )
+
+    def test_recientes(self):
+        self.assertPresupuesto(1, lambda: self.client.get('/api/eventos/recientes/'), crecer=self.crecer)
+
+    def test_por_sensor(self):
+        sensor = self.sensores[0]
+
+        def crecer():
+            Evento.objects.bulk_create([Evento(sensor=sensor, resultado=Evento.DENEGADO) for _ in range(50)])
+
+        self.assertPresupuesto(
+            1, lambda: self.client.get(f'/api/eventos/por_sensor/?sensor_id={sensor.id}'), crecer=crecer
+        )
+
+    def test_histograma(self):
+        # Sin 'hasta' (ahora) también se usa el resumen: corte, resumen y cola de eventos
+        self.assertPresupuesto(
+            3,
+            lambda: self.client.get('/api/eventos/histograma/?desde=2026-01-01&intervalo=semana&agrupar_por=resultado'),
+            crecer=self.crecer
+        )
+
+    def test_histograma_con_resumen(self):
+        # Corte, resumen hasta el corte y eventos posteriores
+        resumenes.reconstruir()
+        self.assertPresupuesto(
+            3,
+            lambda: self.client.get('/api/eventos/histograma/?desde=2026-01-01&hasta=2099-01-01&intervalo=semana'),
+            crecer=self.crecer
+        )
+
+
+class CamposDinamicosTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(3)]
+        for sensor in self.sensores:
+            self.crear_eventos(sensor, Evento.PERMITIDO, Evento.DENEGADO)
+        Evento.objects.bulk_create([Evento(sensor=self.sensores[0], resultado=Evento.PERMITIDO, descripcion='Visita')])
+
+    def test_fields_elige_los_campos(self):
+        filas = self.client.get('/api/eventos/?fields=id,fecha').data['results']
+        self.assertEqual(len(filas), 7)
+        self.assertTrue(all(set(fila) == {'id', 'fecha'} for fila in filas))
+
+        sensor = self.client.get(f'/api/sensores/{self.sensores[0].id}/?fields=uid,departamento_nombre').data
+        self.assertEqual(sensor, {'uid': 'UID-0', 'departamento_nombre': self.departamento.nombre})
+
+    def test_expand_anida_la_relacion(self):
+        filas = self.client.get('/api/eventos/?fields=id&expand=departamento').data['results']
+        self.assertTrue(all(set(fila) == {'id', 'departamento'} for fila in filas))
+        self.assertEqual(filas[0]['departamento']['nombre'], self.departamento.nombre)
+
+        filas = self.client.get('/api/eventos/?expand=sensor').data['results']
+        self.assertIn('sensor_data', filas[0])
+        self.assertEqual(filas[0]['sensor']['departamento_nombre'], self.departamento.nombre)
+
+    def test_propiedad_y_serializer_anidado_sin_n_mas_1(self):
+        # descripcion es una propiedad (sin columna): se conservan los JOIN de la vista
+        url = '/api/eventos/?fields=descripcion,sensor_data'
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as contexto:
+                filas = self.client.get(url).data['results']
+            self.assertTrue(all(set(fila) == {'descripcion', 'sensor_data'} for fila in filas))
+            self.assertEqual([fila['descripcion'] for fila in filas].count('Visita'), 1)
+            sql = [consulta['sql'] for consulta in contexto.captured_queries]
+            listado = [consulta for consulta in sql if 'ORDER BY "api_evento"."fecha"' in consulta]
+            self.assertEqual(len(listado), 1)
+            self.assertIn('JOIN "api_sensor"', listado[0])
+            self.assertIn('JOIN "api_eventodescripcion"', listado[0])
+            self.assertFalse([consulta for consulta in sql if 'FROM "api_sensor"' in consulta or 'FROM "api_eventodescripcion"' in consulta])
+            for sensor in self.sensores:
+                self.crear_eventos(sensor, Evento.DENEGADO, Evento.DENEGADO)
+
+
+class HistogramaTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(2)]
+        for sensor in self.sensores:
+            self.crear_eventos(sensor, Evento.PERMITIDO, Evento.DENEGADO, Evento.PERMITIDO)
+
+    def mover_eventos_sin_resumir(self, fechas):
+        """Reparte los eventos existentes entre `fechas`"""
+        eventos = list(Evento.objects.order_by('pk'))
+        for indice, evento in enumerate(eventos):
+            Evento.objects.filter(pk=evento.pk).update(fecha=fechas[indice % len(fechas)])
+        return eventos
+
+    def mover_eventos(self, fechas):
+        """Reparte los eventos existentes entre `fechas` y reconstruye el resumen por hora"""
+        eventos = self.mover_eventos_sin_resumir(fechas)
+        resumenes.reconstruir()
+        return eventos
+
+    def test_resumen_y_eventos_coinciden(self):
+        zona = ZoneInfo('America/Santiago')
+        self.mover_eventos([
+            datetime(2026, 10, 1, 8, 15, tzinfo=zona),
+            datetime(2026, 10, 1, 23, 59, tzinfo=zona),
+            datetime(2026, 10, 3, 0, 0, tzinfo=zona),
+        ])
+        url = '/api/eventos/histograma/?intervalo=dia&agrupar_por=resultado&hasta=2026-10-04'
+        por_resumen = self.client.get(url + '&desde=2026-10-01').data
+        hora_parcial = self.client.get(url + '&desde=2026-10-01T08:15:30').data
+        ContadorFilas.objects.filter(clave=resumenes.CLAVE_CORTE).delete()
+        por_eventos = self.client.get(url + '&desde=2026-10-01').data
+
+        self.assertEqual(por_resumen['fuente'], 'resumen')
+        self.assertEqual(hora_parcial['fuente'], 'resumen')
+        self.assertEqual(por_eventos['fuente'], 'eventos')
+        self.assertEqual(por_resumen['series'], por_eventos['series'])
+        self.assertEqual(hora_parcial['series'][Evento.PERMITIDO], [0, 0, 2])
+        self.assertEqual(len(por_resumen['intervalos']), 3)
+        self.assertEqual(por_resumen['series'][Evento.PERMITIDO], [2, 0, 2])
+        self.assertEqual(por_resumen['series'][Evento.DENEGADO], [2, 0, 0])
+
+    def test_cambio_de_horario(self):
+        # El 5 de abril de 2026 Chile vuelve a UTC-4: las 23:00 del día 4 se repiten
+        # y, como en Trunc, ambas horas quedan en un mismo intervalo local
+        zona = ZoneInfo('America/Santiago')
+        self.mover_eventos([
+            datetime(2026, 4, 4, 23, 30, tzinfo=zona),
+            datetime(2026, 4, 4, 23, 30, fold=1, tzinfo=zona),
+        ])
+        for desde in ('2026-04-04', '2026-04-04T00:30'):
+            respuesta = self.client.get(f'/api/eventos/histograma/?desde={desde}&hasta=2026-04-06&intervalo=hora')
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertEqual(len(respuesta.data['intervalos']), 48)
+            self.assertEqual(respuesta.data['intervalos'][23], '2026-04-04T23:00:00-03:00')
+            self.assertEqual(respuesta.data['series']['total'][23], len(self.sensores) * 3)
+
+    def test_parametros_invalidos(self):
+        for consulta in ('', 'desde=ayer', 'desde=2026-01-01&intervalo=mes', 'desde=2020-01-01&intervalo=minuto'):
+            respuesta = self.client.get(f'/api/eventos/histograma/?{consulta}')
+            self.assertEqual(respuesta.status_code, 400, consulta)
+
+    def test_borrado_descuenta_resumen(self):
+        self.mover_eventos([timezone.now() - timedelta(hours=3)])
+        evento = Evento.objects.first()
+        total = EventoResumenHora.objects.aggregate(total=Sum('total'))['total']
+        self.assertEqual(total, Evento.objects.count())
+        self.client.delete(f'/api/eventos/{evento.id}/')
+        self.assertEqual(EventoResumenHora.objects.aggregate(total=Sum('total'))['total'], total - 1)
+
+    def test_alta_no_escribe_el_resumen_y_la_cola_se_lee_de_eventos(self):
+        resumenes.reconstruir()
+        filas = list(EventoResumenHora.objects.values_list('pk', 'total'))
+        respuesta = self.client.post('/api/eventos/', {'sensor': self.sensores[0].id, 'resultado': Evento.DENEGADO})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(list(EventoResumenHora.objects.values_list('pk', 'total')), filas)
+
+        ahora = timezone.now()
+        desde = (ahora - timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+        hasta = ahora.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        datos = self.client.get(
+            '/api/eventos/histograma/',
+            {'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'intervalo': 'dia', 'agrupar_por': 'resultado'}
+        ).data
+        self.assertEqual(datos['fuente'], 'resumen')
+        self.assertEqual(sum(datos['series'][Evento.DENEGADO]), 3)
+        self.assertEqual(sum(datos['series'][Evento.PERMITIDO]), 4)
+
+    def test_hasta_por_defecto_usa_el_resumen(self):
+        hace_un_dia = timezone.now() - timedelta(days=1)
+        self.mover_eventos([hace_un_dia, timezone.now()])
+        desde = hace_un_dia.replace(minute=0, second=0, microsecond=0)
+        datos = self.client.get('/api/eventos/histograma/', {'desde': desde.isoformat(), 'intervalo': 'hora'}).data
+        self.assertEqual(datos['fuente'], 'resumen')
+        self.assertEqual(sum(datos['series']['total']), Evento.objects.count())
+
+    def test_puesta_al_dia_incremental(self):
+        antes = timezone.now() - timedelta(hours=5)
+        ContadorFilas.objects.update_or_create(
+            clave=resumenes.CLAVE_CORTE, defaults={'total': int(antes.replace(minute=0, second=0, microsecond=0).timestamp())}
+        )
+        self.mover_eventos_sin_resumir([timezone.now() - timedelta(hours=2)])
+        self.assertFalse(EventoResumenHora.objects.exists())
+
+        self.assertGreater(resumenes.poner_al_dia(), 0)
+        self.assertEqual(resumenes.poner_al_dia(), 0)
+        self.assertEqual(EventoResumenHora.objects.aggregate(total=Sum('total'))['total'], Evento.objects.count())
+        self.assertEqual(resumenes.corte(), timezone.now().astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0))
+
+
+@override_settings(CONTADORES_INTERVALO=3600)
+class ContadoresTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.crear_eventos(self.sensor, Evento.PERMITIDO, Evento.DENEGADO)
+        contadores.poner_al_dia()
+        contadores.estimar(Evento.objects.all())
+        contadores.estimar(Evento.objects.filter(resultado=Evento.PERMITIDO))
+
+    def total(self, clave='evento'):
+        return ContadorFilas.objects.get(clave=clave).total
+
+    def test_insertar_no_escribe_contadores(self):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.post(
+                '/api/eventos/', {'sensor': self.sensor.id, 'resultado': Evento.PERMITIDO}, format='json'
+            )
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertFalse([consulta for consulta in contexto if 'api_contadorfilas' in consulta['sql']])
+        self.assertEqual(self.total(), 2)
+
+        self.crear_eventos(self.sensor, Evento.DENEGADO)
+        self.assertEqual(contadores.poner_al_dia(), 2)
+        self.assertEqual(self.total(), 4)
+        self.assertEqual(self.total(f'evento:resultado={Evento.PERMITIDO}'), 2)
+        self.assertEqual(contadores.poner_al_dia(), 0)
+
+    def test_estimar_pone_al_dia_cada_intervalo(self):
+        self.crear_eventos(self.sensor, Evento.PERMITIDO)
+        self.assertEqual(contadores.estimar(Evento.objects.all()), 2)
+        with self.settings(CONTADORES_INTERVALO=0):
+            self.assertEqual(contadores.estimar(Evento.objects.all()), 3)
+
+    def test_marca_desactualizada_no_suma_dos_veces(self):
+        self.crear_eventos(self.sensor, Evento.PERMITIDO)
+        marca = ContadorFilas.objects.get(clave='marca:default')
+        ContadorFilas.objects.filter(pk=marca.pk).update(total=marca.total + 1)
+        with mock.patch.object(contadores, 'marcas', return_value={'default': marca.total}):
+            self.assertEqual(contadores.poner_al_dia(), 0)
+        self.assertEqual(self.total(), 2)
+
+    def test_borrar_descuenta_solo_eventos_contados(self):
+        contado = Evento.objects.order_by('pk').first()
+        nuevo = self.crear_eventos(self.sensor, Evento.DENEGADO)[0]
+        self.client.delete(f'/api/eventos/{nuevo.pk}/')
+        self.client.delete(f'/api/eventos/{contado.pk}/')
+        self.assertEqual(self.total(), 1)
+        contadores.poner_al_dia()
+        self.assertEqual(self.total(), 1)
+        self.assertEqual(self.total(), Evento.objects.count())
+
+    def test_recalcular(self):
+        self.crear_eventos(self.sensor, Evento.PERMITIDO)
+        Evento.objects.filter(resultado=Evento.DENEGADO).delete()
+        self.assertEqual(contadores.recalcular(), 2)
+        self.assertEqual(self.total(), 2)
+        self.assertEqual(self.total(f'evento:resultado={Evento.PERMITIDO}'), 2)
+        self.assertEqual(contadores.poner_al_dia(), 0)
+
+
+class AnomaliasTest(ApiTestCase):
+    REGLAS = {
+        **settings.ANOMALIAS,
+        'DENEGADOS_MAXIMO': 3, 'DENEGADOS_VENTANA': 60, 'CAMBIO_DEPARTAMENTO_VENTANA': 120, 'ACCION': 'bloquear',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.otro_departamento = Departamento.objects.create(nombre='Departamento B')
+        self.barreras = [
+            Barrera.objects.create(nombre=f'Barrera {departamento.nombre}', departamento=departamento)
+            for departamento in (self.departamento, self.otro_departamento)
+        ]
+        self.inicio = timezone.now()
+        registro = mock.patch.object(anomalias.logger, 'warning')
+        self.registro = registro.start()
+        self.addCleanup(registro.stop)
+
+    def registrar(self, detector, segundos, resultado=Evento.PERMITIDO, barrera=None):
+        evento = Evento.objects.create(sensor=self.sensor, resultado=resultado, barrera=barrera)
+        evento.fecha = self.inicio + timedelta(seconds=segundos)
+        return detector.registrar(evento)
+
+    def anomalias(self):
+        return list(Evento.objects.filter(tipo_evento=Evento.ANOMALIA).order_by('id').values_list('detalle__texto', flat=True))
+
+    def test_denegados_en_la_ventana_bloquean_el_sensor(self):
+        detector = anomalias.DetectorAnomalias(self.REGLAS)
+        for segundos in (0, 50, 70):
+            self.assertEqual(self.registrar(detector, segundos, Evento.DENEGADO), [])
+        self.assertEqual(len(self.registrar(detector, 80, Evento.DENEGADO)), 1)
+        self.assertEqual(Sensor.objects.get(pk=self.sensor.pk).estado, Sensor.BLOQUEADO)
+        self.assertEqual(len(self.anomalias()), 1)
+        self.assertTrue(self.anomalias()[0].startswith('Sensor bloqueado automáticamente: 3 accesos denegados'))
+
+        # Ya bloqueado: se registra la anomalía sin volver a bloquear
+        for segundos in (90, 91, 92):
+            self.registrar(detector, segundos, Evento.DENEGADO)
+        self.assertTrue(self.anomalias()[-1].startswith('Anomalía detectada'))
+
+    def test_accion_marcar(self):
+        detector = anomalias.DetectorAnomalias({**self.REGLAS, 'ACCION': anomalias.MARCAR})
+        for segundos in (0, 1, 2):
+            self.registrar(detector, segundos, Evento.DENEGADO)
+        self.assertEqual(Sensor.objects.get(pk=self.sensor.pk).estado, Sensor.ACTIVO)
+        self.assertTrue(self.anomalias()[0].startswith('Anomalía detectada'))
+
+    def test_barreras_de_dos_departamentos(self):
+        detector = anomalias.DetectorAnomalias(self.REGLAS)
+        propia, ajena = self.barreras
+        self.assertEqual(self.registrar(detector, 0, barrera=propia), [])
+        self.assertEqual(self.registrar(detector, 200, barrera=ajena), [])
+        motivos = self.registrar(detector, 260, barrera=propia)
+        self.assertEqual(len(motivos), 1)
+        self.assertIn(f'departamentos {self.otro_departamento.id} y {self.departamento.id}', motivos[0])
+        self.assertEqual(Sensor.objects.get(pk=self.sensor.pk).estado, Sensor.BLOQUEADO)
+
+    def test_eventos_sin_barrera_no_cuentan_como_cambio_de_departamento(self):
+        detector = anomalias.DetectorAnomalias(self.REGLAS)
+        self.registrar(detector, 0, barrera=self.barreras[0])
+        Sensor.objects.filter(pk=self.sensor.pk).update(departamento=self.otro_departamento)
+        self.sensor.refresh_from_db()
+        self.assertEqual(self.registrar(detector, 10), [])
+        self.assertEqual(self.registrar(detector, 20), [])
+        self.assertEqual(self.anomalias(), [])
+
+    def test_desde_la_api(self):
+        for _ in range(settings.ANOMALIAS['DENEGADOS_MAXIMO']):
+            respuesta = self.client.post(
+                '/api/eventos/', {'sensor': self.sensor.id, 'resultado': Evento.DENEGADO}, format='json'
+            )
+            self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(Sensor.objects.get(pk=self.sensor.pk).estado, Sensor.BLOQUEADO)
+        self.assertEqual(len(self.anomalias()), 1)
+
+
+class EventoCompactoTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(2)]
+        for sensor in self.sensores:
+            self.crear_eventos(sensor, Evento.PERMITIDO, Evento.DENEGADO, Evento.PERMITIDO)
+
+    def test_alta_y_ocupacion_en_una_transaccion(self):
+        antes = Evento.objects.count()
+        with mock.patch.object(ocupacion, 'registrar_evento', side_effect=RuntimeError('falla la presencia')):
+            with self.assertRaises(RuntimeError):
+                self.client.post('/api/eventos/', {'sensor': self.sensores[0].id, 'resultado': Evento.PERMITIDO})
+        self.assertEqual(Evento.objects.count(), antes)
+
+    def test_filtro_por_departamento_actual_del_sensor(self):
+        otro = Departamento.objects.create(nombre='Departamento B')
+        self.sensores[1].departamento = otro
+        self.sensores[1].save()
+        self.crear_eventos(self.sensores[1], Evento.PERMITIDO)
+
+        for parametros, total in (
+            (f'departamento={self.departamento.pk}', 6),
+            (f'departamento={otro.pk}', 1),
+            (f'sensor__departamento={self.departamento.pk}', 3),
+            (f'sensor__departamento={otro.pk}', 4),
+        ):
+            self.assertEqual(self.client.get(f'/api/eventos/?{parametros}&conteo_exacto=1').data['count'], total, parametros)
+
+    def test_api_usa_texto_y_descripcion_aparte(self):
+        sensor = self.sensores[0]
+        datos = {'sensor': sensor.id, 'tipo_evento': Evento.MANUAL_ABIERTO, 'resultado': Evento.DENEGADO}
+        con_descripcion = self.client.post('/api/eventos/', {**datos, 'descripcion': 'Apertura de prueba'}, format='json')
+        sin_descripcion = self.client.post('/api/eventos/', datos, format='json')
+        self.assertEqual(con_descripcion.status_code, 201, con_descripcion.data)
+        self.assertEqual(EventoDescripcion.objects.count(), 1)
+
+        respuesta = self.client.get(f'/api/eventos/?tipo_evento={Evento.MANUAL_ABIERTO}&resultado={Evento.DENEGADO}')
+        self.assertEqual(respuesta.data['count'], 2)
+        self.assertEqual(
+            [(evento['tipo_evento'], evento['resultado'], evento['descripcion']) for evento in respuesta.data['results']],
+            [(Evento.MANUAL_ABIERTO, Evento.DENEGADO, None), (Evento.MANUAL_ABIERTO, Evento.DENEGADO, 'Apertura de prueba')]
+        )
+
+        self.assertEqual(sin_descripcion.status_code, 201, sin_descripcion.data)
+        evento = Evento.objects.get(tipo_evento=Evento.MANUAL_ABIERTO, detalle__isnull=True)
+        evento.descripcion = 'Agregada después'
+        evento.save()
+        self.assertEqual(Evento.objects.get(pk=evento.pk).descripcion, 'Agregada después')
+        evento.descripcion = ''
+        evento.save()
+        self.assertEqual(EventoDescripcion.objects.count(), 1)
+
+    def test_contador_por_resultado(self):
+        url = f'/api/eventos/?resultado={Evento.DENEGADO}'
+        antes = self.client.get(url).data['count']
+        self.client.post('/api/eventos/', {'sensor': self.sensores[0].id, 'resultado': Evento.DENEGADO}, format='json')
+        self.assertEqual(self.client.get(url).data['count'], antes + 1)
+
+    def test_valores_en_la_base_de_datos(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT DISTINCT resultado FROM api_evento ORDER BY resultado')
+            self.assertEqual([fila[0] for fila in cursor.fetchall()], [
+                Evento.RESULTADO_CODIGOS[Evento.PERMITIDO], Evento.RESULTADO_CODIGOS[Evento.DENEGADO]
+            ])
+        self.assertEqual(Evento.objects.filter(resultado=Evento.DENEGADO).count(), len(self.sensores))
+        self.assertEqual(
+            set(Evento.objects.values_list('resultado', flat=True)), {Evento.PERMITIDO, Evento.DENEGADO}
+        )
+
+
+class BarreraConsultasTest(PresupuestoConsultasTestCase):
+
+    def test_list(self):
+        self.assertPresupuesto(3, lambda: self.client.get('/api/barreras/'), crecer=self.crecer)
+
+    def test_retrieve(self):
+        barrera = self.barreras[0]
+        self.assertPresupuesto(2, lambda: self.client.get(f'/api/barreras/{barrera.id}/'))
+
+    def test_create(self):
+        datos = {'nombre': 'Barrera nueva', 'departamento': self.departamentos[0].id}
+        self.assertPresupuesto(
+            6, lambda: self.client.post('/api/barreras/', datos, format='json'), status_esperado=201
+        )
+
+    def test_estado(self):
+        barrera = self.barreras[0]
+        self.assertPresupuesto(
+            8,
+            lambda: self.client.patch(f'/api/barreras/{barrera.id}/estado/', {'estado': Barrera.CERRADA}, format='json')
+        )
+
+    def test_abiertas(self):
+        self.assertPresupuesto(1, lambda: self.client.get('/api/barreras/abiertas/'), crecer=self.crecer)
+
+
+class HistorialEstadoTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.barreras = [
+            Barrera.objects.create(nombre=f'Barrera {numero}', departamento=self.departamento, estado=Barrera.ABIERTA)
+            for numero in range(2)
+        ]
+
+    def transiciones(self, objeto):
+        entidad = TransicionEstado.SENSOR if isinstance(objeto, Sensor) else TransicionEstado.BARRERA
+        return list(
+            TransicionEstado.objects.filter(entidad=entidad, objeto_id=objeto.pk)
+            .order_by('id').values_list('estado_anterior', 'estado_nuevo', 'usuario_id')
+        )
+
+    def test_registra_cambios_individuales_masivos_y_por_save(self):
+        barrera, otra = self.barreras[0], self.barreras[1]
+        self.client.patch(f'/api/barreras/{barrera.id}/estado/', {'estado': Barrera.CERRADA}, format='json')
+        self.client.patch(f'/api/barreras/{barrera.id}/estado/', {'estado': Barrera.CERRADA}, format='json')
+        self.client.post(
+            '/api/barreras/estado_masivo/', {'estado': Barrera.CERRADA, 'ids': [barrera.id, otra.id]}, format='json'
+        )
+        self.assertEqual(self.transiciones(barrera), [
+            (None, Barrera.ABIERTA, None),
+            (Barrera.ABIERTA, Barrera.CERRADA, self.admin.pk),
+        ])
+        self.assertEqual(self.transiciones(otra)[-1], (Barrera.ABIERTA, Barrera.CERRADA, self.admin.pk))
+
+        sensor = self.sensor
+        self.client.patch(f'/api/sensores/{sensor.id}/', {'estado': Sensor.BLOQUEADO}, format='json')
+        self.client.patch(f'/api/sensores/{sensor.id}/', {'uid': 'UID-RENOMBRADO'}, format='json')
+        self.assertEqual(self.transiciones(sensor), [
+            (None, Sensor.ACTIVO, None),
+            (Sensor.ACTIVO, Sensor.BLOQUEADO, self.admin.pk),
+        ])
+
+    def test_estado_anterior_con_instancia_desactualizada(self):
+        sensor = self.sensor
+        Sensor.objects.filter(pk=sensor.pk).update(estado=Sensor.PERDIDO)
+        estados.cambiar_estado_condicional(sensor, Sensor.INACTIVO)
+        self.assertEqual(self.transiciones(sensor)[-1], (Sensor.PERDIDO, Sensor.INACTIVO, None))
+
+    def test_estado_en(self):
+        barrera = self.barreras[0]
+        self.client.patch(f'/api/barreras/{barrera.id}/estado/', {'estado': Barrera.CERRADA}, format='json')
+        cierre = TransicionEstado.objects.get(objeto_id=barrera.pk, estado_nuevo=Barrera.CERRADA).fecha
+
+        def estado_en(fecha):
+            return self.client.get(f'/api/barreras/{barrera.id}/estado_en/', {'fecha': fecha.isoformat()})
+
+        with self.assertNumQueries(2):
+            respuesta = estado_en(cierre)
+        self.assertEqual(respuesta.data['estado'], Barrera.CERRADA)
+        self.assertEqual(respuesta.data['usuario'], self.admin.pk)
+        self.assertEqual(estado_en(cierre - timedelta(microseconds=1)).data['estado'], Barrera.ABIERTA)
+        self.assertEqual(estado_en(barrera.fecha_creacion - timedelta(seconds=1)).status_code, 404)
+        self.assertEqual(self.client.get(f'/api/barreras/{barrera.id}/estado_en/').status_code, 400)
+
+        # Objetos anteriores al historial: el estado previo sale de la primera transición posterior
+        TransicionEstado.objects.filter(
+            entidad=TransicionEstado.BARRERA, objeto_id=barrera.pk, estado_anterior__isnull=True
+        ).delete()
+        respuesta = estado_en(cierre - timedelta(microseconds=1))
+        self.assertEqual((respuesta.data['estado'], respuesta.data['desde']), (Barrera.ABIERTA, None))
+
+        historial = self.client.get(f'/api/barreras/{barrera.id}/historial/').data
+        self.assertEqual([fila['estado_nuevo'] for fila in historial['results']], [Barrera.CERRADA])
+
+
+class CambioEstadoCondicionalTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.barrera = Barrera.objects.create(
+            nombre='Barrera 0', departamento=self.departamento, estado=Barrera.ABIERTA
+        )
+
+    def cambiar(self, estado, if_match=None, **datos):
+        encabezados = {'HTTP_IF_MATCH': if_match} if if_match is not None else {}
+        return self.client.patch(
+            f'/api/barreras/{self.barrera.id}/estado/', {'estado': estado, **datos}, format='json', **encabezados
+        )
+
+    def test_etag_e_if_match(self):
+        etag = self.client.get(f'/api/barreras/{self.barrera.id}/')['ETag']
+        self.assertEqual(etag, '"1"')
+        respuesta = self.cambiar(Barrera.CERRADA, if_match=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['ETag'], '"2"')
+        self.assertEqual(self.cambiar(Barrera.ABIERTA, if_match='W/"2"').status_code, 200)
+        self.assertEqual(self.cambiar(Barrera.CERRADA, if_match='*').status_code, 200)
+        self.assertEqual(self.cambiar(Barrera.ABIERTA, if_match='"x"').status_code, 400)
+
+    def test_version_desactualizada_responde_412(self):
+        self.assertEqual(self.cambiar(Barrera.CERRADA, if_match='"1"').status_code, 200)
+        respuesta = self.cambiar(Barrera.ABIERTA, if_match='"1"')
+        self.assertEqual(respuesta.status_code, 412)
+        barrera = Barrera.objects.get(pk=self.barrera.pk)
+        self.assertEqual((barrera.estado, barrera.version), (Barrera.CERRADA, 2))
+
+    def test_estado_anterior_distinto_responde_409(self):
+        respuesta = self.cambiar(Barrera.ABIERTA, estado_anterior=Barrera.CERRADA)
+        self.assertEqual(respuesta.status_code, 409)
+        self.assertEqual(Barrera.objects.get(pk=self.barrera.pk).version, 1)
+        self.assertEqual(self.cambiar(Barrera.CERRADA, estado_anterior=Barrera.ABIERTA).status_code, 200)
+
+    def test_sensor(self):
+        url = f'/api/sensores/{self.sensor.id}/cambiar_estado/'
+        respuesta = self.client.patch(url, {'estado': Sensor.BLOQUEADO}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual((respuesta.status_code, respuesta['ETag']), (200, '"2"'))
+        respuesta = self.client.patch(url, {'estado': Sensor.ACTIVO}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(respuesta.status_code, 412)
+        respuesta = self.client.patch(
+            url, {'estado': Sensor.ACTIVO, 'estado_anterior': Sensor.PERDIDO}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 409)
+
+    def test_sin_condicion_aplica_sobre_estado_desactualizado(self):
+        barrera = self.barrera
+        Barrera.objects.filter(pk=barrera.pk).update(estado=Barrera.CERRADA)
+        estados.cambiar_estado_condicional(barrera, Barrera.ABIERTA)
+        self.assertEqual(Barrera.objects.get(pk=barrera.pk).estado, Barrera.ABIERTA)
+        self.assertEqual(barrera.version, 2)
+
+
+class CacheEtiquetasTest(ApiTestCase):
+    """
+    Los cambios hechos con update() no emiten señales: la respuesta cacheada
+    sigue mostrando el valor anterior hasta que una escritura invalida su etiqueta.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.barrera = Barrera.objects.create(
+            nombre='Barrera 0', departamento=self.departamento, estado=Barrera.ABIERTA
+        )
+
+    def estados_barreras(self):
+        return {fila['nombre']: fila['estado'] for fila in self.client.get('/api/barreras/').data['results']}
+
+    def test_respuesta_cacheada_hasta_invalidar(self):
+        self.assertEqual(self.estados_barreras(), {'Barrera 0': Barrera.ABIERTA})
+        Barrera.objects.filter(pk=self.barrera.pk).update(estado=Barrera.CERRADA)
+        self.assertEqual(self.estados_barreras(), {'Barrera 0': Barrera.ABIERTA})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/barreras/{self.barrera.id}/estado/', {'estado': Barrera.ABIERTA}, format='json')
+        self.assertEqual(self.estados_barreras(), {'Barrera 0': Barrera.ABIERTA})
+        Barrera.objects.filter(pk=self.barrera.pk).update(estado=Barrera.CERRADA)
+        with self.captureOnCommitCallbacks(execute=True):
+            Barrera.objects.create(nombre='Barrera 1', departamento=self.departamento, estado=Barrera.ABIERTA)
+        self.assertEqual(self.estados_barreras(), {'Barrera 0': Barrera.CERRADA, 'Barrera 1': Barrera.ABIERTA})
+
+    def test_se_invalida_al_confirmar(self):
+        self.assertEqual(len(self.estados_barreras()), 1)
+        with self.captureOnCommitCallbacks() as callbacks:
+            Barrera.objects.create(nombre='Barrera 1', departamento=self.departamento)
+            self.assertEqual(len(self.estados_barreras()), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.estados_barreras()), 2)
+
+    def test_cambio_masivo_y_borrado(self):
+        url = f'/api/sensores/{self.sensor.id}/'
+        self.assertEqual(self.client.get(url).data['estado'], Sensor.ACTIVO)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                '/api/sensores/cambiar_estado_masivo/', {'estado': Sensor.BLOQUEADO, 'ids': [self.sensor.id]},
+                format='json'
+            )
+        self.assertEqual(self.client.get(url).data['estado'], Sensor.BLOQUEADO)
+
+        self.assertEqual(len(self.estados_barreras()), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.barrera.delete()
+        self.assertEqual(self.estados_barreras(), {})
+
+    def test_otras_etiquetas_no_invalidan(self):
+        self.client.get('/api/departamentos/')
+        Departamento.objects.filter(pk=self.departamento.pk).update(nombre='Renombrado')
+        with self.captureOnCommitCallbacks(execute=True):
+            estados.cambiar_estado_condicional(self.barrera, Barrera.CERRADA)
+        nombres = [fila['nombre'] for fila in self.client.get('/api/departamentos/').data['results']]
+        self.assertEqual(nombres, ['Departamento A'])
+
+        # Un cambio del propio departamento sí la invalida
+        with self.captureOnCommitCallbacks(execute=True):
+            Departamento.objects.get(pk=self.departamento.pk).save()
+        nombres = [fila['nombre'] for fila in self.client.get('/api/departamentos/').data['results']]
+        self.assertEqual(nombres, ['Renombrado'])
+
+    def test_sensores_por_uid(self):
+        self.assertEqual(cache_api.sensores_por_uid(['UID-0'])['UID-0']['estado'], Sensor.ACTIVO)
+        Sensor.objects.filter(pk=self.sensor.pk).update(estado=Sensor.PERDIDO)
+        self.assertEqual(cache_api.sensores_por_uid(['UID-0'])['UID-0']['estado'], Sensor.ACTIVO)
+        with self.captureOnCommitCallbacks(execute=True):
+            estados.cambiar_estado_condicional(self.sensor, Sensor.INACTIVO)
+        self.assertEqual(cache_api.sensores_por_uid(['UID-0'])['UID-0']['estado'], Sensor.INACTIVO)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_a', 'replica_b'])
+class ReplicaLecturaTest(BasesSQLiteMixin, ApiTestCase):
+    """Réplicas vacías en archivos propios: lo escrito en 'default' solo se ve leyendo la primaria"""
+    bases_sqlite = ('replica_a', 'replica_b')
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.crear_eventos(self.sensor, Evento.PERMITIDO)
+
+    def eventos(self, cliente=None):
+        return (cliente or self.client).get('/api/eventos/').data['count']
+
+    def test_una_replica_por_solicitud(self):
+        # Cada réplica con un número distinto de eventos y una página de uno,
+        # para que la lista haga varias consultas (conteo y página)
+        for alias, cantidad in (('replica_a', 2), ('replica_b', 3)):
+            departamento = Departamento(pk=self.departamento.pk, nombre=self.departamento.nombre)
+            Departamento.objects.using(alias).bulk_create([departamento])
+            sensor = Sensor(pk=self.sensor.pk, uid=self.sensor.uid, departamento=departamento)
+            Sensor.objects.using(alias).bulk_create([sensor])
+            Evento.objects.using(alias).bulk_create(
+                Evento(sensor=sensor, departamento=departamento, resultado=Evento.PERMITIDO) for _ in range(cantidad)
+            )
+
+        for _ in range(4):
+            consultas = {}
+            with mock.patch('api.db_routers.random.choice', wraps=random.choice) as eleccion, \
+                    mock.patch.object(PageNumberPagination, 'page_size', 1), \
+                    CaptureQueriesContext(connections['replica_a']) as consultas['replica_a'], \
+                    CaptureQueriesContext(connections['replica_b']) as consultas['replica_b']:
+                total = self.eventos()
+            eleccion.assert_called_once()
+            usadas = [alias for alias, contexto in consultas.items() if len(contexto)]
+            self.assertEqual(usadas, ['replica_a' if total == 2 else 'replica_b'])
+            self.assertGreater(len(consultas[usadas[0]]), 1)
+
+    def test_lee_sus_propias_escrituras(self):
+        respuesta = self.client.post(
+            '/api/eventos/', {'sensor': self.sensor.id, 'resultado': Evento.DENEGADO}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 201)
+        cookie = respuesta.cookies[db_routers.COOKIE_PRIMARIA]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_LAG_TOLERANCIA)
+        self.assertEqual(self.eventos(), 2)
+
+        # Sin la cookie, con la de otro usuario o alterada, se lee la réplica
+        otro = APIClient()
+        otro.force_authenticate(self.admin)
+        self.assertEqual(self.eventos(otro), 0)
+        ajeno = User.objects.create_user('otro')
+        PerfilUsuario.objects.create(user=ajeno, rol=Rol.objects.get(nombre=Rol.ADMIN))
+        otro.force_authenticate(ajeno)
+        otro.cookies[db_routers.COOKIE_PRIMARIA] = cookie.value
+        self.assertEqual(self.eventos(otro), 0)
+        otro.force_authenticate(self.admin)
+        otro.cookies[db_routers.COOKIE_PRIMARIA] = cookie.value.replace(':', ':0', 1)
+        self.assertEqual(self.eventos(otro), 0)
+        otro.cookies[db_routers.COOKIE_PRIMARIA] = cookie.value
+        self.assertEqual(self.eventos(otro), 2)
+
+
+class ShardingTest(BasesSQLiteMixin, ApiTestCase):
+    """Eventos repartidos en dos shards SQLite según el departamento de su sensor"""
+    bases_sqlite = ('eventos0', 'eventos1')
+
+    @classmethod
+    def setUpClass(cls):
+        # Antes de migrar los shards, para que post_migrate reserve sus rangos de ids
+        # y las migraciones, que leen EVENTO_SHARDS al importarse, creen las FK sin restricción
+        cls.addClassCleanup(cls._olvidar_migraciones)
+        ajustes = override_settings(EVENTO_SHARDS=list(cls.bases_sqlite))
+        ajustes.enable()
+        cls.addClassCleanup(ajustes.disable)
+        cls._olvidar_migraciones()
+        super().setUpClass()
+
+    @staticmethod
+    def _olvidar_migraciones():
+        for modulo in [modulo for modulo in sys.modules if modulo.startswith('api.migrations.')]:
+            del sys.modules[modulo]
+
+    def setUp(self):
+        super().setUp()
+        otro = Departamento.objects.create(nombre='Departamento B')
+        self.departamentos = sorted([self.departamento, otro], key=lambda departamento: departamento.pk % 2)
+        self.sensores = [
+            self.crear_sensor(f'UID-{indice}', departamento=departamento)
+            for indice, departamento in enumerate(self.departamentos)
+        ]
+        # Alternados entre los shards, cada uno más reciente que el anterior
+        self.eventos = [
+            Evento.objects.create(sensor=self.sensores[indice % 2], resultado=Evento.PERMITIDO)
+            for indice in range(6)
+        ]
+
+    def consultas_por_shard(self, url):
+        consultas = {}
+        with CaptureQueriesContext(connections['eventos0']) as consultas['eventos0'], \
+                CaptureQueriesContext(connections['eventos1']) as consultas['eventos1']:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, {alias: len(contexto) for alias, contexto in consultas.items()}
+
+    def test_eventos_en_el_shard_de_su_departamento(self):
+        for indice, alias in enumerate(self.bases_sqlite):
+            ids = set(Evento.objects.using(alias).values_list('pk', flat=True))
+            self.assertEqual(ids, {evento.pk for evento in self.eventos[indice::2]})
+            self.assertTrue(all(evento_id >> 40 == indice + 1 for evento_id in ids))
+        self.assertFalse(Evento.objects.using(DEFAULT_DB_ALIAS).exists())
+
+    def test_filtro_por_departamento_lee_un_shard(self):
+        for indice, departamento in enumerate(self.departamentos):
+            respuesta, consultas = self.consultas_por_shard(f'/api/eventos/?departamento={departamento.pk}')
+            self.assertEqual(
+                [evento['id'] for evento in respuesta.data['results']],
+                [evento.pk for evento in reversed(self.eventos[indice::2])]
+            )
+            self.assertGreater(consultas[self.bases_sqlite[indice]], 0)
+            self.assertEqual(consultas[self.bases_sqlite[1 - indice]], 0)
+
+    def test_filtro_por_departamento_actual_del_sensor(self):
+        Sensor.objects.filter(pk=self.sensores[0].pk).update(departamento=self.departamentos[1])
+        respuesta, consultas = self.consultas_por_shard(f'/api/eventos/?sensor__departamento={self.departamentos[1].pk}')
+        self.assertEqual([evento['id'] for evento in respuesta.data['results']], [evento.pk for evento in reversed(self.eventos)])
+        self.assertTrue(all(consultas.values()))
+
+    def test_lista_sin_filtro_mezcla_los_shards_por_fecha(self):
+        respuesta, consultas = self.consultas_por_shard('/api/eventos/')
+        self.assertEqual(respuesta.data['count'], 6)
+        self.assertEqual([evento['id'] for evento in respuesta.data['results']], [evento.pk for evento in reversed(self.eventos)])
+        self.assertTrue(all(consultas.values()))
+
+        respuesta, _ = self.consultas_por_shard('/api/eventos/?ordering=fecha')
+        self.assertEqual([evento['id'] for evento in respuesta.data['results']], [evento.pk for evento in self.eventos])
+
+    def test_detalle_va_al_shard_del_id(self):
+        for indice, evento in enumerate(self.eventos[:2]):
+            respuesta, consultas = self.consultas_por_shard(f'/api/eventos/{evento.pk}/')
+            self.assertEqual(respuesta.data['id'], evento.pk)
+            self.assertGreater(consultas[self.bases_sqlite[indice]], 0)
+            self.assertEqual(consultas[self.bases_sqlite[1 - indice]], 0)
+
+    def test_mover_eventos_de_default(self):
+        Evento.objects.using(self.bases_sqlite[0]).all().delete()
+        Evento.objects.using(self.bases_sqlite[1]).all().delete()
+        anteriores = Evento.objects.using(DEFAULT_DB_ALIAS).bulk_create(
+            Evento(sensor=self.sensores[indice % 2], resultado=Evento.DENEGADO) for indice in range(5)
+        )
+        Evento.objects.using(DEFAULT_DB_ALIAS).filter(pk=anteriores[0].pk).update(fecha=timezone.now() - timedelta(days=3))
+        EventoDescripcion.objects.using(DEFAULT_DB_ALIAS).create(evento_id=anteriores[1].pk, texto='Puerta forzada')
+        fechas = dict(Evento.objects.using(DEFAULT_DB_ALIAS).values_list('pk', 'fecha'))
+        self.assertEqual(
+            [aviso.id for aviso in sharding.eventos_fuera_de_shards(None, databases=[DEFAULT_DB_ALIAS])], ['api.W001']
+        )
+
+        call_command('mover_eventos_a_shards', lote=2, stdout=StringIO())
+
+        self.assertFalse(Evento.objects.using(DEFAULT_DB_ALIAS).exists())
+        self.assertEqual(sharding.eventos_fuera_de_shards(None, databases=[DEFAULT_DB_ALIAS]), [])
+        for indice, alias in enumerate(self.bases_sqlite):
+            movidos = list(Evento.objects.using(alias).order_by('fecha').values_list('pk', 'fecha', 'detalle__texto'))
+            esperados = [anterior for anterior in anteriores if anterior.sensor_id == self.sensores[indice].pk]
+            self.assertEqual([fecha for _, fecha, _ in movidos], sorted(fechas[anterior.pk] for anterior in esperados))
+            self.assertTrue(all(evento_id >> 40 == indice + 1 for evento_id, _, _ in movidos))
+        self.assertEqual(Evento.objects.using(self.bases_sqlite[1]).filter(detalle__texto='Puerta forzada').count(), 1)
+        respuesta = self.client.get('/api/eventos/')
+        self.assertEqual(respuesta.data['count'], 5)
+
+
+class AllowlistTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.activos = [self.crear_sensor(uid).uid for uid in ('UID-C', 'UID-A', 'UID-BB')]
+        self.crear_sensor('UID-BLOQUEADO', estado=Sensor.BLOQUEADO)
+        # Cada prueba parte sin snapshots ni marcadores
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = self.settings(ALLOWLIST_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.url = f'/api/departamentos/{self.departamento.id}/allowlist/'
+
+    def descargar(self, formato=allowlist.ORDENADA, **encabezados):
+        return self.client.get(self.url, {'formato': formato}, **encabezados)
+
+    def cabecera(self, contenido):
+        return allowlist.CABECERA.unpack_from(contenido)
+
+    def test_lista_ordenada(self):
+        allowlist.construir(self.departamento.id)
+        contenido = self.descargar().content
+        magic, formato, tipo, ancho, k, departamento, version, n = self.cabecera(contenido)
+        self.assertEqual((magic, formato, tipo, k), (b'SCAL', 2, 0, 0))
+        self.assertEqual((departamento, n, ancho), (self.departamento.id, 3, 6))
+        self.assertEqual(version, CambioSync.objects.order_by('-id').first().id)
+        cuerpo = contenido[allowlist.CABECERA.size:]
+        registros = [cuerpo[i:i + ancho].rstrip(b'\0').decode() for i in range(0, len(cuerpo), ancho)]
+        self.assertEqual(registros, sorted(self.activos))
+
+    def test_filtro_de_bloom(self):
+        allowlist.construir(self.departamento.id, allowlist.BLOOM)
+        contenido = self.descargar(allowlist.BLOOM).content
+        _, _, tipo, ancho, k, _, _, n = self.cabecera(contenido)
+        self.assertEqual((tipo, ancho, n), (1, 0, 3))
+        bits = contenido[allowlist.CABECERA.size:]
+        m = len(bits) * 8
+
+        def contiene(uid):
+            digest = hashlib.blake2b(uid.encode(), digest_size=16).digest()
+            h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+            return all(bits[(h1 + i * h2) % m >> 3] & 1 << ((h1 + i * h2) % m & 7) for i in range(k))
+
+        self.assertTrue(all(contiene(uid) for uid in self.activos))
+        self.assertFalse(contiene('UID-BLOQUEADO'))
+
+    def test_etag_y_304(self):
+        allowlist.construir(self.departamento.id)
+        respuesta = self.descargar()
+        self.assertEqual(respuesta.status_code, 200)
+        noventa = self.descargar(HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual((noventa.status_code, noventa['ETag']), (304, respuesta['ETag']))
+        self.assertEqual(self.descargar(HTTP_IF_NONE_MATCH='"otro"').status_code, 200)
+
+    def test_sin_snapshot_encola_la_construccion(self):
+        for _ in range(2):
+            respuesta = self.descargar()
+            self.assertEqual(respuesta.status_code, 503)
+            self.assertEqual(respuesta['Retry-After'], '5')
+        self.assertEqual(Job.objects.filter(tipo='construir_allowlists').count(), 1)
+
+        tareas.construir_allowlists({}, None)
+        self.assertEqual(self.descargar().status_code, 200)
+        self.assertEqual(self.descargar(allowlist.BLOOM).status_code, 200)
+
+    def test_cambios_por_version_de_sync(self):
+        anterior = allowlist.construir(self.departamento.id)
+        self.assertTrue(allowlist.esta_vigente(self.departamento.id, allowlist.ORDENADA))
+
+        sensor = Sensor.objects.get(uid='UID-A')
+        with self.captureOnCommitCallbacks(execute=True):
+            estados.cambiar_estado_condicional(sensor, Sensor.BLOQUEADO)
+        self.assertEqual(
+            allowlist.version_pendiente(self.departamento.id), CambioSync.objects.order_by('-id').first().id
+        )
+        self.assertFalse(allowlist.esta_vigente(self.departamento.id, allowlist.ORDENADA))
+
+        # Se entrega el snapshot anterior sin reconstruirlo y se encola el job
+        respuesta = self.descargar()
+        self.assertEqual(respuesta['ETag'], anterior.etag)
+        self.assertTrue(Job.objects.filter(tipo='construir_allowlists', estado=Job.PENDIENTE).exists())
+
+        tareas.construir_allowlists({'tipos': [allowlist.ORDENADA]}, None)
+        self.assertTrue(allowlist.esta_vigente(self.departamento.id, allowlist.ORDENADA))
+        self.assertEqual(self.cabecera(self.descargar().content)[7], 2)
+
+        # Los cambios de otros departamentos no lo invalidan
+        otro = Departamento.objects.create(nombre='Departamento B')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_sensor('UID-OTRO', otro)
+        self.assertTrue(allowlist.esta_vigente(self.departamento.id, allowlist.ORDENADA))
+
+
+@override_settings(SYNC_ASENTAMIENTO=0)
+class SyncTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensor = self.crear_sensor('UID-0')
+        self.barreras = [
+            Barrera.objects.create(nombre=f'Barrera {numero}', departamento=self.departamento, estado=Barrera.ABIERTA)
+            for numero in range(2)
+        ]
+
+    def sync(self, since=0, **parametros):
+        respuesta = self.client.get('/api/sync/', {'since': since, **parametros})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.data
+
+    def ids(self, datos, clave):
+        return [fila['id'] for fila in datos[clave]['actualizados']], datos[clave]['eliminados']
+
+    def test_cursor_incremental_y_tombstones(self):
+        inicial = self.sync()
+        self.assertEqual(self.ids(inicial, 'barreras'), ([barrera.pk for barrera in self.barreras], []))
+        self.assertEqual(self.ids(inicial, 'sensores'), ([self.sensor.pk], []))
+        self.assertEqual(self.sync(inicial['cursor'])['cursor'], inicial['cursor'])
+
+        barrera, otra = self.barreras
+        estados.cambiar_estado_condicional(barrera, Barrera.CERRADA)
+        otra_id = otra.pk
+        otra.delete()
+        cambios = self.sync(inicial['cursor'])
+        self.assertEqual(self.ids(cambios, 'barreras'), ([barrera.pk], [otra_id]))
+        self.assertEqual(cambios['barreras']['actualizados'][0]['estado'], Barrera.CERRADA)
+        self.assertEqual(self.ids(cambios, 'sensores'), ([], []))
+        self.assertGreater(cambios['cursor'], inicial['cursor'])
+
+    def test_limite_y_hay_mas(self):
+        primera = self.sync(limit=2)
+        self.assertTrue(primera['hay_mas'])
+        segunda = self.sync(primera['cursor'], limit=2)
+        self.assertFalse(segunda['hay_mas'])
+        vistos = self.ids(primera, 'barreras')[0] + self.ids(segunda, 'barreras')[0]
+        self.assertEqual(sorted(vistos), [barrera.pk for barrera in self.barreras])
+
+    @override_settings(SYNC_ASENTAMIENTO=60)
+    def test_no_entrega_entradas_sin_asentar(self):
+        datos = self.sync()
+        self.assertEqual(datos['cursor'], 0)
+        self.assertEqual(self.ids(datos, 'barreras'), ([], []))
+
+        # Solo las entradas anteriores a la primera sin asentar
+        hace_un_rato = timezone.now() - timedelta(minutes=5)
+        entradas = list(CambioSync.objects.order_by('id').values_list('id', flat=True))
+        CambioSync.objects.filter(id__in=[entradas[0], entradas[2]]).update(fecha=hace_un_rato)
+        datos = self.sync()
+        self.assertEqual(datos['cursor'], entradas[0])
+        self.assertFalse(datos['hay_mas'])
+
+    def test_poda_conserva_la_ultima_entrada_de_cada_objeto(self):
+        barrera, otra = self.barreras
+        for estado in (Barrera.CERRADA, Barrera.ABIERTA, Barrera.CERRADA):
+            estados.cambiar_estado_condicional(barrera, estado)
+        otra_id = otra.pk
+        otra.delete()
+        antes = self.sync()
+
+        eliminadas = sync_feed.podar_cambios(timezone.now() + timedelta(seconds=1))
+        self.assertEqual(eliminadas, 4)
+        self.assertEqual(CambioSync.objects.filter(modelo=CambioSync.BARRERA).count(), 2)
+        despues = self.sync()
+        self.assertEqual(self.ids(despues, 'barreras'), ([barrera.pk], [otra_id]))
+        self.assertEqual(despues['barreras'], antes['barreras'])
+        self.assertEqual(despues['cursor'], antes['cursor'])
+
+
+class EstadoMasivoTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.otro_departamento = Departamento.objects.create(nombre='Departamento B')
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(5)]
+        self.ajeno = self.crear_sensor('UID-AJENO', self.otro_departamento)
+        Sensor.objects.filter(pk=self.sensores[0].pk).update(estado=Sensor.BLOQUEADO)
+
+    def cambiar(self, **datos):
+        return self.client.post('/api/sensores/cambiar_estado_masivo/', datos, format='json')
+
+    def test_filtra_por_departamento_y_omite_los_que_ya_estan_en_el_estado(self):
+        cursor = CambioSync.objects.order_by('-id').values_list('id', flat=True).first()
+        respuesta = self.cambiar(estado=Sensor.BLOQUEADO, departamento=self.departamento.id)
+        esperados = sorted(sensor.pk for sensor in self.sensores[1:])
+        self.assertEqual(sorted(respuesta.data['ids']), esperados)
+        self.assertEqual(respuesta.data['actualizados'], 4)
+        self.assertEqual(Sensor.objects.get(pk=self.ajeno.pk).estado, Sensor.ACTIVO)
+        self.assertEqual(Sensor.objects.get(pk=self.sensores[0].pk).version, self.sensores[0].version)
+        sincronizados = CambioSync.objects.filter(id__gt=cursor).values_list('modelo', 'objeto_id')
+        self.assertEqual(sorted(sincronizados), [(CambioSync.SENSOR, pk) for pk in esperados])
+
+    def test_requiere_un_filtro(self):
+        self.assertEqual(self.cambiar(estado=Sensor.BLOQUEADO).status_code, 400)
+
+    def test_limita_la_cantidad_de_ids(self):
+        ids = list(range(1, SensorEstadoMasivoSerializer.MAXIMO_IDS + 2))
+        respuesta = self.cambiar(estado=Sensor.BLOQUEADO, ids=ids)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('ids', respuesta.data)
+
+    def test_select_y_update_en_bloques(self):
+        ids = [sensor.pk for sensor in self.sensores] + [self.ajeno.pk]
+        with mock.patch.object(estados, 'LOTE_IDS', 2), CaptureQueriesContext(connection) as contexto:
+            respuesta = self.cambiar(estado=Sensor.INACTIVO, ids=ids, departamento=self.departamento.id)
+        self.assertEqual(respuesta.data['actualizados'], 5)
+        self.assertEqual(Sensor.objects.get(pk=self.ajeno.pk).estado, Sensor.ACTIVO)
+        selects = [consulta for consulta in contexto if consulta['sql'].startswith('SELECT "api_sensor"."id" AS "pk", "api_sensor"."estado"')]
+        updates = [consulta for consulta in contexto if consulta['sql'].startswith('UPDATE "api_sensor"')]
+        self.assertEqual(len(selects), 3)
+        self.assertEqual(len(updates), 3)
+        self.assertFalse(Sensor.objects.filter(pk__in=ids[:-1]).exclude(estado=Sensor.INACTIVO).exists())
+
+
+class LoginConsultasTest(PresupuestoConsultasTestCase):
+
+    def test_login(self):
+        cliente = APIClient()
+        datos = {'username': 'admin', 'password': 'clave-admin-123'}
+        self.assertPresupuesto(1, lambda: cliente.post('/api/auth/login/', datos, format='json'))
+
+
+class JobTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sensores = [self.crear_sensor(f'UID-{numero}') for numero in range(3)]
+
+    def test_encolar_reclamar_y_ejecutar(self):
+        from . import jobs
+
+        respuesta = self.client.post(
+            '/api/jobs/', {'tipo': 'cambiar_estado_sensores', 'parametros': {'estado': Sensor.INACTIVO}}, format='json'
+        )
+        self.assertEqual(respuesta.status_code, 201, respuesta.data)
+        job_id = respuesta.data['id']
+
+        job = jobs.reclamar('trabajador-1')
+        self.assertEqual(job.pk, job_id)
+        self.assertIsNone(jobs.reclamar('trabajador-2'))
+
+        jobs.ejecutar(job.pk, 'trabajador-1')
+        progreso = self.client.get(f'/api/jobs/{job_id}/progreso/').data
+        self.assertEqual(progreso['estado'], Job.COMPLETADO)
+        self.assertEqual(progreso['progreso'], len(self.sensores))
+        self.assertEqual(progreso['porcentaje'], 100.0)
+        self.assertFalse(Sensor.objects.exclude(estado=Sensor.INACTIVO).exists())
+
+    def test_tipo_invalido(self):
+        respuesta = self.client.post('/api/jobs/', {'tipo': 'no_existe'}, format='json')
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_pool_interrumpido_reintenta_el_job(self):
+        from . import jobs
+
+        class PoolFalso:
+            """Pool en el mismo proceso; si está roto, sus jobs fallan como al morir un proceso hijo"""
+
+            def __init__(self, roto):
+                self.roto = roto
+                self.cerrado = False
+
+            def submit(self, funcion, job_id, trabajador):
+                futuro = Future()
+                if self.roto:
+                    futuro.set_exception(BrokenProcessPool('Un proceso del pool terminó abruptamente'))
+                else:
+                    jobs.ejecutar(job_id, trabajador)
+                    futuro.set_result(job_id)
+                return futuro
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                self.cerrado = True
+
+        job = jobs.encolar('cambiar_estado_sensores', {'estado': Sensor.INACTIVO})
+        pools = [PoolFalso(roto=True), PoolFalso(roto=False)]
+        with mock.patch('api.management.commands.procesar_jobs._crear_pool', side_effect=pools):
+            call_command('procesar_jobs', una_vez=True, procesos=1, intervalo=0, stdout=StringIO(), stderr=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.estado, Job.COMPLETADO)
+        self.assertEqual(job.intentos, 2)
+        self.assertTrue(all(pool.cerrado for pool in pools))
+
+
+class SimulacionTest(TestCase):
+
+    def test_percentiles_del_histograma(self):
+        histograma = simulacion.Histograma()
+        for ms in range(1, 1001):
+            histograma.registrar(float(ms))
+        for p, esperado in ((50, 500), (95, 950), (99, 990)):
+            self.assertAlmostEqual(histograma.percentil(p), esperado, delta=esperado * 0.05)
+        self.assertEqual(histograma.percentil(100), 1000)
+        self.assertIsNone(simulacion.Histograma().percentil(50))
+
+    def test_tasa_sube_en_el_cambio_de_turno(self):
+        sim = simulacion.Simulacion(
+            'http://localhost', 'u', 'p', lecturas_por_minuto=6, turnos=[420], factor_turno=5, hora_inicio=420
+        )
+        sim.inicio = 0
+        self.assertAlmostEqual(sim.tasa(0), 0.5)
+        self.assertAlmostEqual(sim.tasa(3 * 3600), 0.1)
+
+        aleatorio = random.Random(1)
+        llegadas, instante = 0, 0
+        while instante < 600:
+            instante = sim.siguiente_lectura(instante, aleatorio)
+            llegadas += 1
+        self.assertGreater(llegadas, 150)
+
+    def test_timeouts_se_reintentan_solo_en_solicitudes_sin_efectos(self):
+        metricas = simulacion.Metricas()
+        cliente = simulacion.Cliente('http://localhost', 'u', 'p', metricas, reintentos=2)
+        with mock.patch.object(cliente, '_enviar', side_effect=TimeoutError) as enviar, \
+                mock.patch('api.simulacion.time.sleep'):
+            self.assertEqual(cliente.solicitud('evento', 'POST', '/eventos/', {'sensor': 1}), (None, None))
+            self.assertEqual(enviar.call_count, 1)
+            cliente.solicitud('barrera', 'PATCH', '/barreras/1/estado/', {'estado': 'abierta'})
+            self.assertEqual(enviar.call_count, 2)
+            cliente.solicitud('catalogo', 'GET', '/barreras/')
+            self.assertEqual(enviar.call_count, 5)
+
+        totales = {operacion: estadisticas.resumen(1) for operacion, estadisticas in metricas.total.items()}
+        self.assertEqual((totales['evento']['timeouts'], totales['evento']['reintentos']), (1, 0))
+        self.assertEqual((totales['barrera']['timeouts'], totales['barrera']['reintentos']), (1, 0))
+        self.assertEqual((totales['catalogo']['timeouts'], totales['catalogo']['reintentos']), (3, 2))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SimulacionServidorTest(ArchivosTemporalesMixin, LiveServerTestCase):
+    """Corrida corta de la flota simulada contra un servidor real"""
+
+    def test_corrida_contra_el_servidor(self):
+        usuario = User.objects.create_user('simulador', password='clave-sim-123')
+        PerfilUsuario.objects.create(user=usuario, rol=Rol.objects.create(nombre=Rol.ADMIN))
+        sim = simulacion.Simulacion(
+            self.live_server_url, 'simulador', 'clave-sim-123', lectores=1, lecturas_por_minuto=600,
+            turnos=[], desconocidos=0.2, bloqueados=0.2, perdidos=0, apertura=0, rampa=0, semilla=7
+        )
+        cliente = sim.cliente()
+        self.assertTrue(cliente.iniciar_sesion())
+        nombres = sim.preparar(cliente, departamentos=1, barreras=1, sensores=20, informar=lambda texto: None)
+        cliente.cerrar()
+        departamentos = sim.elegir_departamentos(1, nombres)
+
+        resumen = sim.ejecutar(departamentos, duracion=2, reporte=60)
+
+        self.assertEqual(resumen['errores'] + resumen['timeouts'], 0, resumen['operaciones'])
+        eventos = resumen['operaciones']['evento']
+        self.assertGreater(eventos['ok'], 0)
+        self.assertEqual(Evento.objects.count(), eventos['ok'])
+        self.assertEqual(eventos['rechazos'], resumen['lecturas'].get(simulacion.BLOQUEADO, 0))
+        self.assertGreater(resumen['operaciones']['barrera']['ok'], 0)
+        self.assertEqual(Sensor.objects.filter(estado=Sensor.BLOQUEADO).count(), 1)
+
+
+class PrecalentamientoTest(TestCase):
+
+    def test_abre_solo_default_y_registra_los_fallos(self):
+        conexion = mock.Mock(**{'ensure_connection.side_effect': OSError('sin base de datos')})
+        with mock.patch.object(warmup, 'connections', {DEFAULT_DB_ALIAS: conexion}) as conexiones, \
+                self.assertLogs(warmup.logger, 'WARNING') as registro:
+            tiempos = warmup.precalentar()
+        conexion.ensure_connection.assert_called_once_with()
+        self.assertEqual(list(conexiones), [DEFAULT_DB_ALIAS])
+        self.assertIn('base_de_datos', registro.output[0])
+        self.assertIn('caches', tiempos)
+
+    def test_sin_conexion_bajo_asgi(self):
+        with mock.patch.object(warmup, '_abrir_conexion') as abrir:
+            tiempos = warmup.precalentar(conexion=False)
+        abrir.assert_not_called()
+        self.assertNotIn('base_de_datos', tiempos)
+
+
+class SaludTest(TestCase):
+
+    def setUp(self):
+        salud._chequeo = None
+        salud._motivos_registrados = []
+        salud._ventana.clear()
+
+    def test_healthz_no_consulta_la_base_de_datos(self):
+        with self.assertNumQueries(0):
+            respuesta = self.client.get('/healthz')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.content, b'ok')
+
+    def test_readyz_cachea_los_chequeos(self):
+        with self.assertNumQueries(2):
+            respuesta = self.client.get('/readyz')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json(), {'ok': True})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/readyz/').status_code, 200)
+
+    def test_readyz_no_depende_de_la_cola_de_jobs(self):
+        from .models import Job
+
+        Job.objects.bulk_create(Job(tipo='exportar_eventos') for _ in range(3))
+        self.assertEqual(self.client.get('/readyz').status_code, 200)
+        self.assertEqual(salud.estado_readiness()[1]['jobs_pendientes'], 3)
+
+    def test_readyz_no_listo_con_la_base_de_datos_lenta(self):
+        from .models import Job
+
+        Job.objects.bulk_create(Job(tipo='exportar_eventos') for _ in range(3))
+        with mock.patch.object(salud.time, 'perf_counter', side_effect=range(100)), \
+                self.assertLogs('api.salud', 'WARNING') as registro:
+            respuesta = self.client.get('/readyz')
+            self.client.get('/readyz')
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertEqual(respuesta['Retry-After'], '2')
+        # El detalle solo va al log, una vez mientras no cambien los motivos
+        self.assertEqual(respuesta.json(), {'ok': False})
+        self.assertEqual(len(registro.records), 1)
+        self.assertIn("Base de datos 'default' lenta (1000 ms)", registro.output[0])
+        self.assertIn("'jobs_pendientes': 3", registro.output[0])
+
+    def test_readyz_no_listo_con_latencia_alta(self):
+        salud._registrar_solicitud(5000)
+        with self.assertLogs('api.salud', 'WARNING'):
+            respuesta = self.client.get('/readyz')
+        self.assertEqual(salud.estado_readiness()[1]['motivos'], ['Latencia media de 5000 ms'])
+        salud._ventana.clear()
+        self.assertEqual(respuesta.status_code, 503)
+
+
+class PerfiladoTest(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ajustes = self.settings(PERFILADO_DIR=directorio.name)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.crear_sensor('UID-0')
+
+    def test_admin_perfila_la_solicitud(self):
+        respuesta = self.client.get('/api/sensores/', HTTP_X_PERFILAR='1')
+        self.assertEqual(respuesta.status_code, 200)
+        perfil = perfilado.leer(respuesta['X-Perfil-Id'])
+        self.assertIn('SensorSerializer.uid', perfil['serializers'])
+        self.assertTrue(perfil['sql'])
+        self.assertTrue(all('params' not in sentencia for sentencia in perfil['sql']))
+        # La instrumentación no modifica las clases de DRF ni del serializer
+        self.assertEqual(vars(Serializer)['_readable_fields'].fget.__module__, 'rest_framework.serializers')
+        self.assertNotIn('_readable_fields', vars(SensorSerializer))
+
+    def test_solo_admin_puede_perfilar(self):
+        operador = User.objects.create_user('operador')
+        PerfilUsuario.objects.create(user=operador, rol=Rol.objects.create(nombre=Rol.OPERADOR))
+        self.client.force_authenticate(operador)
+        for cliente in (self.client, APIClient()):
+            for parametros in ({'HTTP_X_PERFILAR': '1'}, {'QUERY_STRING': 'perfilar=respuesta'}):
+                respuesta = cliente.get('/api/sensores/', **parametros)
+                self.assertNotIn('X-Perfil-Id', respuesta)
+                self.assertNotIn('funciones', respuesta.json())
+        self.assertEqual(perfilado.listar(), [])
@@ -5,12 +5,15 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from .views import (
     api_info,
+    sync,
+    perfiles,
     DepartamentoViewSet,
     RolViewSet,
     PerfilUsuarioViewSet,
     SensorViewSet,
     EventoViewSet,
     BarreraViewSet,
+    JobViewSet,
     CustomTokenObtainPairView
 )
 
@@ -22,11 +25,19 @@ router.register(r'usuarios', PerfilUsuarioViewSet, basename='usuario')
 router.register(r'sensores', SensorViewSet, basename='sensor')
 router.register(r'eventos', EventoViewSet, basename='evento')
 router.register(r'barreras', BarreraViewSet, basename='barrera')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     # Endpoint de información de la API
     path('info/', api_info, name='api_info'),
     
+    # Feed incremental para controladores de borde
+    path('sync/', sync, name='sync'),
+    
+    # Perfiles de solicitudes (solo Admin)
+    path('perfiles/', perfiles, name='perfiles'),
+    path('perfiles/<str:perfil_id>/', perfiles, name='perfil'),
+    
     # Autenticación JWT con mensajes en español
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
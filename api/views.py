@@ -1,13 +1,32 @@
-from rest_framework import viewsets, status
+import os
+
+from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import api_view, action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.http import FileResponse, HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from rest_framework_simplejwt.views import TokenObtainPairView
 
-from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera
+from .models import Departamento, Rol, PerfilUsuario, Sensor, Evento, Barrera, Presencia, Job
+from . import sync as sync_feed
+from . import allowlist
+from . import contadores
+from . import anomalias
+from . import ocupacion
+from . import sharding
+from . import perfilado
+from . import cache as cache_api
+from . import jobs
+from . import resumenes
+from . import tareas
+from .filters import EventoFilter
+from .pagination import ConteoEstimadoPagination
 from .serializers import (
     DepartamentoSerializer,
     RolSerializer,
@@ -17,9 +36,24 @@ from .serializers import (
     EventoCreateSerializer,
     BarreraSerializer,
     BarreraEstadoSerializer,
+    SensorEstadoMasivoSerializer,
+    SensorBusquedaUidSerializer,
+    JobSerializer,
+    BarreraEstadoMasivoSerializer,
     CustomTokenObtainPairSerializer
 )
 from .permissions import IsAdminOrReadOnly, IsAdminOnly, IsOwnerOrAdmin
+from . import estados
+from .mixins import (
+    HistorialEstadoMixin,
+    VersionETagMixin,
+    LecturaReplicaMixin,
+    RespuestaCacheMixin,
+    CamposDinamicosViewMixin,
+    etag_version,
+    status_conflicto,
+    version_if_match
+)
 
 
 # Vista personalizada para login con mensajes en español
@@ -40,7 +74,52 @@ def api_info(request):
     })
 
 
-class DepartamentoViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sync(request):
+    """
+    Feed incremental de cambios de Sensores, Barreras y Departamentos
+    GET /api/sync/?since=<cursor>&limit=1000
+    
+    Devuelve las filas creadas o actualizadas y los ids eliminados desde el
+    cursor, junto al nuevo cursor. Con since=0 se obtiene el estado completo.
+    """
+    try:
+        since = int(request.query_params.get('since', 0))
+        limite = int(request.query_params.get('limit', sync_feed.LIMITE_POR_DEFECTO))
+    except ValueError:
+        return Response(
+            {"error": "Los parámetros 'since' y 'limit' deben ser enteros"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    if since < 0 or not 1 <= limite <= sync_feed.LIMITE_MAXIMO:
+        return Response(
+            {"error": f"'since' debe ser >= 0 y 'limit' estar entre 1 y {sync_feed.LIMITE_MAXIMO}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    return Response(sync_feed.obtener_cambios(since, limite))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdminOnly])
+def perfiles(request, perfil_id=None):
+    """
+    Perfiles de solicitudes guardados (ver api/perfilado.py)
+    GET /api/perfiles/ - ids, del más reciente al más antiguo
+    GET /api/perfiles/{id}/ - perfil completo
+    """
+    if perfil_id is None:
+        return Response({"perfiles": perfilado.listar()})
+    
+    perfil = perfilado.leer(perfil_id)
+    if perfil is None:
+        return Response({"error": "Perfil no encontrado"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(perfil)
+
+
+class DepartamentoViewSet(RespuestaCacheMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Departamentos
     
@@ -53,9 +132,78 @@ class DepartamentoViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['nombre', 'descripcion']
     ordering_fields = ['nombre', 'fecha_creacion']
+    cache_etiquetas = ['departamento']
+    
+    @action(detail=True, methods=['get'])
+    def allowlist(self, request, pk=None):
+        """
+        Snapshot binario con los UID de los sensores activos del departamento
+        GET /api/departamentos/{id}/allowlist/?formato=ordenada|bloom
+        
+        Responde con ETag; si el header If-None-Match coincide devuelve 304.
+        El formato binario está documentado en api/allowlist.py. Si hay cambios
+        sin incluir se entrega el último snapshot y se encola su reconstrucción;
+        si todavía no existe responde 503 con Retry-After.
+        """
+        departamento = self.get_object()
+        formato = request.query_params.get('formato', allowlist.ORDENADA)
+        if formato not in allowlist.TIPOS:
+            return Response(
+                {"error": f"Formato inválido. Opciones: {list(allowlist.TIPOS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        snapshot = allowlist.obtener(departamento.id, formato)
+        if snapshot is None or snapshot.version < allowlist.version_pendiente(departamento.id):
+            if not Job.objects.filter(tipo='construir_allowlists', estado=Job.PENDIENTE).exists():
+                jobs.encolar('construir_allowlists', usuario=request.user)
+        if snapshot is None:
+            response = Response(
+                {"error": "La allowlist se está construyendo. Reintente en unos segundos."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+            response['Retry-After'] = '5'
+            return response
+        if request.headers.get('If-None-Match') == snapshot.etag:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(snapshot.contenido, content_type='application/octet-stream')
+            response['Content-Disposition'] = (
+                f'attachment; filename="allowlist-{departamento.id}-{formato}.bin"'
+            )
+        response['ETag'] = snapshot.etag
+        return response
+    
+    @action(detail=True, methods=['get'])
+    def ocupacion(self, request, pk=None):
+        """
+        Sensores (y usuarios) que están dentro del departamento
+        GET /api/departamentos/{id}/ocupacion/
+        """
+        departamento = self.get_object()
+        presentes = (
+            Presencia.objects.filter(departamento=departamento)
+            .select_related('sensor', 'usuario')
+            .order_by('fecha_entrada')
+        )
+        ocupantes = [
+            {
+                'sensor': presencia.sensor_id,
+                'sensor_uid': presencia.sensor.uid,
+                'usuario': presencia.usuario_id,
+                'usuario_username': presencia.usuario.username if presencia.usuario else None,
+                'fecha_entrada': presencia.fecha_entrada,
+            }
+            for presencia in presentes
+        ]
+        return Response({
+            'departamento': departamento.id,
+            'total': len(ocupantes),
+            'ocupantes': ocupantes,
+        })
 
 
-class RolViewSet(viewsets.ModelViewSet):
+class RolViewSet(RespuestaCacheMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Roles
     
@@ -65,9 +213,10 @@ class RolViewSet(viewsets.ModelViewSet):
     queryset = Rol.objects.all().order_by('nombre')
     serializer_class = RolSerializer
     permission_classes = [IsAuthenticated, IsAdminOnly]
+    cache_etiquetas = ['rol']
 
 
-class PerfilUsuarioViewSet(viewsets.ModelViewSet):
+class PerfilUsuarioViewSet(RespuestaCacheMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Perfiles de Usuario
     
@@ -80,13 +229,39 @@ class PerfilUsuarioViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['rol']
     search_fields = ['user__username', 'user__email']
+    cache_etiquetas = ['perfil', 'rol', 'usuario']
     
     def perform_create(self, serializer):
         """Crear un nuevo perfil de usuario"""
         serializer.save()
+    
+    @action(detail=True, methods=['get'])
+    def accesos(self, request, pk=None):
+        """
+        Historial de eventos del usuario del perfil, del más reciente al más antiguo
+        GET /api/usuarios/{id}/accesos/?desde=2026-09-01&hasta=2026-10-01
+        
+        Usa Evento.usuario (el usuario asociado al sensor al momento del
+        evento) y el índice (usuario, -fecha). Acepta los filtros del listado
+        de eventos (tipo_evento, resultado, sensor, departamento).
+        """
+        perfil = self.get_object()
+        filtro = EventoFilter(
+            request.query_params,
+            queryset=Evento.objects.filter(usuario_id=perfil.user_id).select_related('sensor', 'detalle').order_by('-fecha'),
+            request=request
+        )
+        if not filtro.is_valid():
+            return Response(filtro.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        eventos = sharding.distribuir(filtro.qs)
+        paginador = ConteoEstimadoPagination()
+        pagina = paginador.paginate_queryset(eventos, request, view=self)
+        serializer = EventoSerializer(pagina, many=True, context=self.get_serializer_context())
+        return paginador.get_paginated_response(serializer.data)
 
 
-class SensorViewSet(viewsets.ModelViewSet):
+class SensorViewSet(HistorialEstadoMixin, RespuestaCacheMixin, LecturaReplicaMixin, VersionETagMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Sensores RFID
     
@@ -101,13 +276,27 @@ class SensorViewSet(viewsets.ModelViewSet):
     filterset_fields = ['estado', 'departamento', 'usuario_asociado']
     search_fields = ['uid', 'departamento__nombre']
     ordering_fields = ['fecha_creacion', 'uid', 'estado']
+    cache_etiquetas = ['sensor', 'departamento', 'usuario']
+    
+    def destroy(self, request, *args, **kwargs):
+        """
+        Borrado lógico: el sensor deja de existir para la API de inmediato y sus
+        eventos se eliminan por lotes en segundo plano (job 'purgar_sensores')
+        DELETE /api/sensores/{id}/
+        Respuesta 202: {"id": 5, "job": 12} (avance en /api/jobs/{job}/progreso/)
+        """
+        sensor = self.get_object()
+        job = tareas.eliminar_sensores([sensor], request.user)
+        return Response({"id": sensor.pk, "job": job.pk}, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated, IsAdminOnly])
     def cambiar_estado(self, request, pk=None):
         """
         Endpoint para cambiar el estado de un sensor
         PATCH /api/sensores/{id}/cambiar_estado/
-        Body: {"estado": "activo"|"inactivo"|"bloqueado"|"perdido"}
+        Body: {"estado": "activo"|"inactivo"|"bloqueado"|"perdido", "estado_anterior": opcional}
+        Header opcional: If-Match: "<version>" (412 si la versión cambió,
+        409 si el estado no es estado_anterior)
         """
         sensor = self.get_object()
         nuevo_estado = request.data.get('estado')
@@ -125,14 +314,74 @@ class SensorViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        sensor.estado = nuevo_estado
-        sensor.save()
+        try:
+            estados.cambiar_estado_condicional(
+                sensor,
+                nuevo_estado,
+                version=version_if_match(request),
+                estado_anterior=request.data.get('estado_anterior'),
+                usuario=request.user
+            )
+        except estados.ConflictoEstado as conflicto:
+            return Response(
+                {"error": "El sensor fue modificado por otra solicitud. Vuelva a consultarlo."},
+                status=status_conflicto(conflicto)
+            )
         
         serializer = self.get_serializer(sensor)
-        return Response(serializer.data)
+        response = Response(serializer.data)
+        response['ETag'] = etag_version(sensor)
+        return response
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def buscar_uids(self, request):
+        """
+        Resolver varios UID a id, estado y departamento en una sola solicitud
+        POST /api/sensores/buscar_uids/
+        Body: {"uids": ["A1B2C3", "D4E5F6", ...]} (hasta 5000)
+        Respuesta: {"A1B2C3": {"encontrado": true, "id": 1, "estado": "activo", "departamento": 2},
+                    "D4E5F6": {"encontrado": false}}
+        """
+        serializer = SensorBusquedaUidSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        resultado = {}
+        for uid, sensor in cache_api.sensores_por_uid(serializer.validated_data['uids']).items():
+            if sensor is None:
+                resultado[uid] = {"encontrado": False}
+            else:
+                resultado[uid] = {
+                    "encontrado": True,
+                    "id": sensor['id'],
+                    "estado": sensor['estado'],
+                    "departamento": sensor['departamento_id'],
+                }
+        return Response(resultado)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOnly])
+    def cambiar_estado_masivo(self, request):
+        """
+        Endpoint para cambiar el estado de varios sensores con un único UPDATE
+        POST /api/sensores/cambiar_estado_masivo/
+        Body: {"estado": "bloqueado", "departamento": 1, "estado_actual": "activo", "ids": [1, 2]}
+        (se requiere al menos uno de los filtros)
+        """
+        serializer = SensorEstadoMasivoSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        nuevo_estado = serializer.validated_data['estado']
+        ids = estados.cambiar_estado_masivo(
+            serializer.filtrar(Sensor.objects.all()), nuevo_estado, request.user,
+            ids=serializer.validated_data.get('ids')
+        )
+        return Response({"estado": nuevo_estado, "actualizados": len(ids), "ids": ids})
 
 
-class EventoViewSet(viewsets.ModelViewSet):
+class EventoViewSet(LecturaReplicaMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Eventos de acceso
     
@@ -141,11 +390,12 @@ class EventoViewSet(viewsets.ModelViewSet):
     - Admin: CRUD completo
     - Operador: Solo lectura
     """
-    queryset = Evento.objects.all().select_related('sensor', 'sensor__departamento').order_by('-fecha')
+    queryset = Evento.objects.all().select_related('sensor', 'detalle').order_by('-fecha')
     permission_classes = [IsAuthenticated, IsAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['tipo_evento', 'resultado', 'sensor', 'sensor__departamento']
+    filterset_class = EventoFilter
     ordering_fields = ['fecha']
+    pagination_class = ConteoEstimadoPagination
     
     def get_serializer_class(self):
         """Usar serializer diferente según la acción"""
@@ -153,9 +403,33 @@ class EventoViewSet(viewsets.ModelViewSet):
             return EventoCreateSerializer
         return EventoSerializer
     
+    def filter_queryset(self, queryset):
+        """Con sharding, leer solo el shard del departamento o del id pedido, o todos"""
+        queryset = super().filter_queryset(queryset)
+        if self.lookup_field in self.kwargs:
+            return sharding.para_id(queryset, self.kwargs[self.lookup_field])
+        parametros = self.request.query_params
+        # sensor__departamento no define el shard: un sensor puede haber cambiado de departamento
+        departamento = parametros.get('departamento') or None
+        return sharding.distribuir(queryset, departamento)
+    
     def perform_create(self, serializer):
-        """Crear un nuevo evento con validaciones"""
-        serializer.save()
+        """
+        Crear un nuevo evento y actualizar la ocupación en una misma transacción
+        (con sharding el evento se guarda en su shard, fuera de ella); después
+        pasarlo al detector de anomalías
+        """
+        with transaction.atomic():
+            evento = serializer.save()
+            ocupacion.registrar_evento(evento)
+        anomalias.registrar_evento(evento)
+    
+    def perform_destroy(self, instance):
+        """Eliminar el evento y descontarlo de los contadores de filas y del resumen por hora"""
+        with transaction.atomic():
+            contadores.ajustar([instance], -1)
+            instance.delete()
+        resumenes.ajustar([instance], -1)
     
     @action(detail=False, methods=['get'])
     def recientes(self, request):
@@ -163,8 +437,8 @@ class EventoViewSet(viewsets.ModelViewSet):
         Obtener los últimos 10 eventos
         GET /api/eventos/recientes/
         """
-        eventos = self.queryset[:10]
-        serializer = EventoSerializer(eventos, many=True)
+        eventos = sharding.distribuir(self.get_queryset())[:10]
+        serializer = self.get_serializer(eventos, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
@@ -180,12 +454,54 @@ class EventoViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        eventos = self.queryset.filter(sensor_id=sensor_id)
-        serializer = EventoSerializer(eventos, many=True)
+        eventos = sharding.distribuir(self.get_queryset().filter(sensor_id=sensor_id))
+        serializer = self.get_serializer(eventos, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def histograma(self, request):
+        """
+        Número de eventos por intervalo de tiempo, calculado en la base de datos
+        GET /api/eventos/histograma/?desde=2026-10-01&hasta=2026-10-08&intervalo=dia&agrupar_por=resultado
+        intervalo: minuto|hora|dia|semana (por defecto hora); hasta: por defecto ahora;
+        agrupar_por (opcional): resultado|tipo_evento. Acepta los mismos filtros que el listado.
+        Los intervalos están en la zona horaria del servidor y los vacíos se devuelven con 0.
+        """
+        parametros = request.query_params
+        if not parametros.get('desde'):
+            return Response(
+                {"error": "El parámetro 'desde' es requerido"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Filtros del listado sin repartir entre shards (el histograma agrega en cada uno);
+        # el rango de fechas lo aplica el histograma, que decide si puede usar el resumen
+        parametros_filtro = parametros.copy()
+        for nombre in ('desde', 'hasta'):
+            parametros_filtro.pop(nombre, None)
+        filtro = EventoFilter(parametros_filtro, queryset=self.get_queryset(), request=request)
+        if not filtro.is_valid():
+            return Response(filtro.errors, status=status.HTTP_400_BAD_REQUEST)
+        eventos = filtro.qs
+        # sensor__departamento no define el shard: un sensor puede haber cambiado de departamento
+        departamento = parametros.get('departamento') or None
+        try:
+            desde = resumenes.leer_fecha(parametros['desde'], 'desde')
+            hasta = resumenes.leer_fecha(parametros['hasta'], 'hasta') if parametros.get('hasta') else timezone.now()
+            datos = resumenes.histograma(
+                eventos,
+                desde,
+                hasta,
+                parametros.get('intervalo', 'hora'),
+                parametros.get('agrupar_por') or None,
+                departamento
+            )
+        except resumenes.HistogramaInvalido as error:
+            return Response({"error": str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(datos)
 
 
-class BarreraViewSet(viewsets.ModelViewSet):
+class BarreraViewSet(HistorialEstadoMixin, RespuestaCacheMixin, VersionETagMixin, CamposDinamicosViewMixin, viewsets.ModelViewSet):
     """
     ViewSet para gestión de Barreras de acceso
     
@@ -199,20 +515,36 @@ class BarreraViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['estado', 'departamento']
     search_fields = ['nombre']
+    cache_etiquetas = ['barrera', 'departamento']
     
     @action(detail=True, methods=['patch'], permission_classes=[IsAuthenticated, IsAdminOnly])
     def estado(self, request, pk=None):
         """
         Endpoint para cambiar solo el estado de una barrera
         PATCH /api/barreras/{id}/estado/
-        Body: {"estado": "abierta"|"cerrada"}
+        Body: {"estado": "abierta"|"cerrada", "estado_anterior": opcional}
+        Header opcional: If-Match: "<version>" (412 si la versión cambió,
+        409 si el estado no es estado_anterior)
         """
         barrera = self.get_object()
-        serializer = BarreraEstadoSerializer(barrera, data=request.data, partial=True)
+        serializer = BarreraEstadoSerializer(
+            barrera,
+            data=request.data,
+            partial=True,
+            context={'request': request, 'version': version_if_match(request)}
+        )
         
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            try:
+                serializer.save()
+            except estados.ConflictoEstado as conflicto:
+                return Response(
+                    {"error": "La barrera fue modificada por otra solicitud. Vuelva a consultarla."},
+                    status=status_conflicto(conflicto)
+                )
+            response = Response(serializer.data)
+            response['ETag'] = etag_version(barrera)
+            return response
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -225,6 +557,91 @@ class BarreraViewSet(viewsets.ModelViewSet):
         barreras = self.queryset.filter(estado=Barrera.ABIERTA)
         serializer = self.get_serializer(barreras, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminOnly])
+    def estado_masivo(self, request):
+        """
+        Endpoint para abrir o cerrar varias barreras con un único UPDATE
+        POST /api/barreras/estado_masivo/
+        Body: {"estado": "cerrada", "departamento": 1, "estado_actual": "abierta", "ids": [1, 2]}
+        (se requiere al menos uno de los filtros)
+        """
+        serializer = BarreraEstadoMasivoSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        nuevo_estado = serializer.validated_data['estado']
+        ids = estados.cambiar_estado_masivo(
+            serializer.filtrar(Barrera.objects.all()), nuevo_estado, request.user,
+            ids=serializer.validated_data.get('ids')
+        )
+        return Response({"estado": nuevo_estado, "actualizados": len(ids), "ids": ids})
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    ViewSet para trabajos pesados en segundo plano (solo Admin)
+    
+    - POST: encola un job ({"tipo": "...", "parametros": {...}}); lo ejecuta
+      `python manage.py procesar_jobs`
+    - GET: estado, progreso y resultado
+    """
+    queryset = Job.objects.all().select_related('creado_por').order_by('-fecha_creacion')
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsAdminOnly]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['estado', 'tipo']
+    
+    def perform_create(self, serializer):
+        serializer.save(creado_por=self.request.user)
+    
+    @action(detail=True, methods=['get'])
+    def progreso(self, request, pk=None):
+        """
+        Avance de un job, sin el resultado completo
+        GET /api/jobs/{id}/progreso/
+        """
+        job = self.get_object()
+        return Response({
+            "id": job.id,
+            "estado": job.estado,
+            "progreso": job.progreso,
+            "total": job.total,
+            "porcentaje": job.porcentaje,
+            "latido": job.latido,
+        })
+    
+    @action(detail=True, methods=['post'])
+    def cancelar(self, request, pk=None):
+        """
+        Cancelar un job pendiente o en proceso
+        POST /api/jobs/{id}/cancelar/
+        """
+        job = self.get_object()
+        if not jobs.cancelar(job):
+            return Response(
+                {"error": f"El job ya terminó ({job.get_estado_display()})"},
+                status=status.HTTP_409_CONFLICT
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+    
+    @action(detail=True, methods=['get'])
+    def descargar(self, request, pk=None):
+        """
+        Descargar el archivo generado por un job (por ejemplo, exportar_eventos)
+        GET /api/jobs/{id}/descargar/
+        """
+        job = self.get_object()
+        archivo = (job.resultado or {}).get('archivo') if job.estado == Job.COMPLETADO else None
+        ruta = os.path.join(settings.JOBS_DIR, archivo) if archivo else None
+        if not ruta or not os.path.isfile(ruta):
+            return Response(
+                {"error": "El job no tiene un archivo disponible"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=archivo)
 
 
 # ============================================
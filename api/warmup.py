@@ -0,0 +1,143 @@
+"""
+Precalentamiento de un worker antes de que acepte tráfico.
+
+Un worker recién creado paga en sus primeras solicitudes la importación de
+DRF y simplejwt, la apertura de la conexión a la base de datos, la
+construcción de los campos de los serializers, la compilación de las rutas
+del router y la inicialización de las cachés. precalentar() hace todo eso
+por adelantado. Se invoca desde core/wsgi.py y core/asgi.py (desactivable
+con PRECALENTAR=0). No usar con `gunicorn --preload`: las conexiones
+abiertas en el proceso maestro se compartirían entre workers.
+
+Solo se abre la conexión 'default' (réplicas y shards se abren al usarse), y
+no bajo ASGI, donde las conexiones son por hilo o tarea y la abierta al
+importar no la reutilizaría ninguna solicitud. Una etapa que falla (por
+ejemplo, la base de datos o la caché todavía no responden) se registra en el
+log y no impide que el worker arranque.
+"""
+import importlib
+import io
+import logging
+import time
+from contextlib import contextmanager
+from wsgiref.util import setup_testing_defaults
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+logger = logging.getLogger(__name__)
+
+MODULOS = (
+    'rest_framework.views',
+    'rest_framework.viewsets',
+    'rest_framework.renderers',
+    'rest_framework.pagination',
+    'django_filters.rest_framework',
+    'rest_framework_simplejwt.authentication',
+    'rest_framework_simplejwt.tokens',
+    'rest_framework_simplejwt.serializers',
+    'api.serializers',
+    'api.views',
+    'api.urls',
+)
+
+
+@contextmanager
+def _etapa(tiempos, nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        logger.warning('Falló la etapa %s del precalentamiento', nombre, exc_info=True)
+    finally:
+        tiempos[nombre] = (time.perf_counter() - inicio) * 1000
+
+
+def _importar_modulos():
+    for modulo in MODULOS:
+        importlib.import_module(modulo)
+
+
+def _poblar_rutas():
+    from django.urls import get_resolver, reverse
+    
+    resolver = get_resolver()
+    # Las propiedades se calculan al leerlas y quedan cacheadas en el resolver
+    _ = resolver.url_patterns  # importa las URLconf
+    _ = resolver.reverse_dict  # compila los patrones del router
+    resolver.resolve('/api/info/')
+    reverse('api_info')
+
+
+def _construir_serializers():
+    from rest_framework import serializers as drf_serializers
+    from . import serializers
+    
+    for nombre in dir(serializers):
+        clase = getattr(serializers, nombre)
+        if (
+            isinstance(clase, type)
+            and issubclass(clase, drf_serializers.Serializer)
+            and clase.__module__ == serializers.__name__
+        ):
+            _ = clase().fields  # construye los campos del ModelSerializer
+
+
+def _abrir_conexion():
+    connections[DEFAULT_DB_ALIAS].ensure_connection()
+
+
+def _inicializar_autenticacion():
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.settings import api_settings
+    
+    JWTAuthentication()
+    _ = api_settings.AUTH_HEADER_TYPES  # carga y cachea la configuración de simplejwt
+
+
+def _primar_caches():
+    from . import cache as respuestas
+    
+    respuestas.versiones(sorted(set(respuestas.ETIQUETAS_MODELO.values())))
+
+
+def _solicitud_interna(application, ruta='/api/info/'):
+    """Ejecuta una solicitud GET a través de toda la pila WSGI (middlewares, DRF, render)"""
+    environ = {'PATH_INFO': ruta, 'REQUEST_METHOD': 'GET', 'wsgi.input': io.BytesIO()}
+    setup_testing_defaults(environ)
+    estado = []
+    cuerpo = application(environ, lambda status, headers, exc_info=None: estado.append(status))
+    try:
+        b''.join(cuerpo)
+    finally:
+        if hasattr(cuerpo, 'close'):
+            cuerpo.close()
+    return estado[0] if estado else None
+
+
+def precalentar(application=None, conexion=True):
+    """
+    Precalienta el proceso actual y retorna los milisegundos por etapa.
+    Si se entrega la aplicación WSGI, además ejecuta una solicitud interna.
+    Con conexion=False (ASGI) no se abre la conexión a la base de datos.
+    """
+    tiempos = {}
+    with _etapa(tiempos, 'importaciones'):
+        _importar_modulos()
+    with _etapa(tiempos, 'rutas'):
+        _poblar_rutas()
+    with _etapa(tiempos, 'serializers'):
+        _construir_serializers()
+    with _etapa(tiempos, 'autenticacion'):
+        _inicializar_autenticacion()
+    if conexion:
+        with _etapa(tiempos, 'base_de_datos'):
+            _abrir_conexion()
+    with _etapa(tiempos, 'caches'):
+        _primar_caches()
+    if application is not None:
+        with _etapa(tiempos, 'solicitud_interna'):
+            _solicitud_interna(application)
+    
+    logger.info('Worker precalentado en %.1f ms: %s', sum(tiempos.values()), tiempos)
+    return tiempos
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_asgi_application()
+
+# Precalentar el worker antes de aceptar tráfico (ver api/warmup.py). Las
+# conexiones de ASGI son por hilo o tarea: no se abre la de la base de datos
+if os.environ.get('PRECALENTAR', '1') == '1':
+    from api.warmup import precalentar
+    precalentar(conexion=False)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.salud.SaludMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -52,6 +54,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.db_routers.PrimariaTrasEscrituraMiddleware',
+    'api.perfilado.PerfiladoMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -80,9 +84,62 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexiones persistentes por worker (abiertas al precalentar, ver api/warmup.py)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Caché: memoria local por proceso por defecto. Con CACHE_URL (por ejemplo
+# redis://127.0.0.1:6379/1) se usa una caché compartida entre workers, que
+# requiere el paquete `redis`.
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'smartconnect',
+        }
+    }
+
+# Segundos que se conserva una respuesta cacheada (ver api/cache.py)
+RESPUESTAS_CACHE_TIMEOUT = int(os.environ.get('RESPUESTAS_CACHE_TIMEOUT', 300))
+
+# Réplicas de lectura (ver api/db_routers.py). Se definen con la variable de
+# entorno DB_REPLICAS, por ejemplo DB_REPLICAS=replica1,replica2. En local cada
+# alias usa un archivo SQLite propio (replica1.sqlite3) como sustituto de una
+# réplica real; en producción reemplazar por la configuración del motor.
+DATABASE_REPLICAS = [alias for alias in os.environ.get('DB_REPLICAS', '').split(',') if alias]
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Shards de Evento por departamento (ver api/sharding.py). Se definen con la
+# variable de entorno DB_EVENTO_SHARDS, por ejemplo DB_EVENTO_SHARDS=eventos0,eventos1.
+# En local cada alias usa un archivo SQLite propio; cada shard se migra con
+# `python manage.py migrate --database=<alias>`.
+EVENTO_SHARDS = [alias for alias in os.environ.get('DB_EVENTO_SHARDS', '').split(',') if alias]
+for _alias in EVENTO_SHARDS:
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'{_alias}.sqlite3',
+    }
+
+DATABASE_ROUTERS = ['api.db_routers.EventoShardRouter', 'api.db_routers.ReplicaRouter']
+
+# Segundos durante los cuales las lecturas de un usuario se mantienen en la
+# primaria después de que escribe (tolerancia al lag de replicación)
+REPLICA_LAG_TOLERANCIA = int(os.environ.get('REPLICA_LAG_TOLERANCIA', 5))
+
 
 
 
@@ -139,6 +196,53 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Perfilado de solicitudes (ver api/perfilado.py). PERFILADO_MUESTREO = N
+# perfila 1 de cada N solicitudes (0 lo desactiva); los perfiles se guardan en
+# un anillo de PERFILADO_MAX_ARCHIVOS archivos.
+PERFILADO_DIR = os.environ.get('PERFILADO_DIR', str(BASE_DIR / 'perfiles'))
+PERFILADO_MUESTREO = int(os.environ.get('PERFILADO_MUESTREO', 0))
+PERFILADO_MAX_ARCHIVOS = int(os.environ.get('PERFILADO_MAX_ARCHIVOS', 200))
+
+# Jobs en segundo plano (ver api/jobs.py): procesos del trabajador, segundos
+# sin latido tras los cuales un job se considera abandonado y se reanuda, y
+# directorio de los archivos generados (exportaciones)
+JOBS_PROCESOS = int(os.environ.get('JOBS_PROCESOS', 2))
+JOBS_TIEMPO_MUERTO = int(os.environ.get('JOBS_TIEMPO_MUERTO', 300))
+JOBS_DIR = os.environ.get('JOBS_DIR', str(BASE_DIR / 'jobs'))
+
+# Segundos entre puestas al día de los contadores de filas de Evento en cada
+# proceso (ver api/contadores.py)
+CONTADORES_INTERVALO = int(os.environ.get('CONTADORES_INTERVALO', 10))
+
+# Segundos que debe tener una entrada de CambioSync antes de entregarla en el
+# feed de sync, para no saltar ids de transacciones que confirman tarde
+# (ver api/sync.py)
+SYNC_ASENTAMIENTO = int(os.environ.get('SYNC_ASENTAMIENTO', 2))
+
+# Snapshots binarios de allowlist por departamento (ver api/allowlist.py)
+ALLOWLIST_DIR = os.environ.get('ALLOWLIST_DIR', str(BASE_DIR / 'allowlists'))
+ALLOWLIST_BLOOM_FALSOS_POSITIVOS = 0.01
+
+# Detección de anomalías en el flujo de eventos (ver api/anomalias.py)
+ANOMALIAS = {
+    'ACTIVO': True,
+    'DENEGADOS_MAXIMO': 5,               # N eventos denegados...
+    'DENEGADOS_VENTANA': 60,             # ...dentro de M segundos
+    'CAMBIO_DEPARTAMENTO_VENTANA': 120,  # mismo sensor en barreras de dos departamentos
+    'ACCION': 'bloquear',                # 'bloquear' o 'marcar'
+    'MAX_SENSORES': 50000,               # sensores con estado en memoria
+    'INACTIVIDAD': 3600,                 # segundos sin eventos antes de descartar un sensor
+}
+
+# Endpoints de salud del balanceador (ver api/salud.py). /readyz responde 503
+# cuando se supera alguno de estos umbrales (0 lo desactiva)
+SALUD = {
+    'CACHE_SEGUNDOS': 2,                 # reutilizar el chequeo de bases de datos y cola
+    'LATENCIA_BD_MS': 250,               # SELECT 1 más lento que esto
+    'EN_CURSO': 64,                      # solicitudes simultáneas en el worker
+    'LATENCIA_SOLICITUDES_MS': 2000,     # latencia media del worker en los últimos 10 s
+}
+
 # Simple JWT Configuration
 from datetime import timedelta
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Precalentar el worker antes de aceptar tráfico (ver api/warmup.py)
+if os.environ.get('PRECALENTAR', '1') == '1':
+    from api.warmup import precalentar
+    precalentar(application)